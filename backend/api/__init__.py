@@ -23,7 +23,7 @@ api = Api(
     title='Gate of Memory API',
     description='A RESTful API for the Gate of Memory application',
     doc='/docs/',  # Disable the default Swagger UI
-    prefix='/api/v1',
+    prefix='/v1',  # after the blueprint's API_PREFIX
     authorizations=authorizations,
     security='Bearer Auth'
 )
@@ -35,15 +35,3 @@ def swagger_ui():
 
 # Import resources to register routes
 from . import resources  # noqa
-
-# Add namespaces to the API
-from .user import api as user_ns
-from .memorial import api as memorial_ns
-from .memory import api as memory_ns
-from .image import api as image_ns
-
-# Register namespaces
-api.add_namespace(user_ns)
-api.add_namespace(memorial_ns)
-api.add_namespace(memory_ns)
-api.add_namespace(image_ns)
@@ -2,18 +2,20 @@
 Base resource class for API endpoints.
 """
 from flask_restful import Resource, reqparse
-from flask import current_app, jsonify, request
+from flask import current_app, request
 from functools import wraps
 import json
 
 class BaseResource(Resource):    
     # Common parser for pagination
     pagination_parser = reqparse.RequestParser()
-    pagination_parser.add_argument('page', type=int, default=1, help='Page number')
-    pagination_parser.add_argument('per_page', type=int, default=10, help='Items per page')
+    pagination_parser.add_argument('page', type=int, location='args', default=1, help='Page number')
+    pagination_parser.add_argument('per_page', type=int, location='args', default=10, help='Items per page')
     
-    def __init__(self):
+    def __init__(self, api=None, *args, **kwargs):
+        # flask_restx hands its Api to every resource it instantiates
         super().__init__()
+        self.api = api
         self.logger = current_app.logger
     
     @classmethod
@@ -30,7 +32,9 @@ class BaseResource(Resource):
             'data': data,
             'message': message
         }
-        return jsonify({k: v for k, v in response.items() if v is not None}), status_code
+        # A plain dict: the Api serializes it (a Response here would be
+        # serialized again and fail)
+        return {k: v for k, v in response.items() if v is not None}, status_code
     
     @staticmethod
     def error_response(message, status_code=400, errors=None):
@@ -40,7 +44,7 @@ class BaseResource(Resource):
             'message': message,
             'errors': errors
         }
-        return jsonify({k: v for k, v in response.items() if v is not None}), status_code
+        return {k: v for k, v in response.items() if v is not None}, status_code
     
     def paginate_query(self, query):
         """Paginate a SQLAlchemy query."""
@@ -6,9 +6,9 @@ import uuid
 from flask_restful import reqparse
 from flask import current_app, request, send_from_directory, url_for
 from werkzeug.utils import secure_filename
-from PIL import Image as PILImage
 from datetime import datetime
-from ..models import Image as ImageModel, MemoryImage, db, Memorial, Memory
+from models import Image as ImageModel, MemoryImage, db, Memorial, Memory
+from monitoring.tracing import tracer
 from .base import BaseResource
 
 class ImageResource(BaseResource):
@@ -157,13 +157,16 @@ class ImageListResource(BaseResource):
     
     def _create_thumbnail(self, filepath, size=(300, 300)):
         """Create a thumbnail version of the image."""
+        from PIL import Image as PILImage  # imported on the first upload, not at boot
         try:
-            with PILImage.open(filepath) as img:
-                img.thumbnail(size)
+            with tracer.span('image.open', path=filepath), PILImage.open(filepath) as img:
+                with tracer.span('image.thumbnail', width=size[0], height=size[1]):
+                    img.thumbnail(size)
                 # Save thumbnail with _thumb suffix
                 base, ext = os.path.splitext(filepath)
                 thumb_path = f"{base}_thumb{ext}"
-                img.save(thumb_path)
+                with tracer.span('image.save', path=thumb_path):
+                    img.save(thumb_path)
         except Exception as e:
             current_app.logger.error(f"Error creating thumbnail: {e}")
             # Don't fail the request if thumbnail creation fails
@@ -1,19 +1,130 @@
 """
 Memorial API resources.
 """
-from flask_restful import reqparse
-from flask import current_app
+import io
+from flask_restful import reqparse, inputs
+from sqlalchemy import func, select
+from sqlalchemy.orm import lazyload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from flask import current_app, request
 from datetime import datetime
-from ..models import Memorial, db, Image as ImageModel
+from models import Memorial, Memory, MemoryImage, db, Image as ImageModel, memorial_memories
+from importer import import_memorials, detect_format, FORMATS
+from security import admin_required, optional_user
 from .base import BaseResource
 
 class MemorialResource(BaseResource):
     """API Resource for single memorial operations."""
     
+    INCLUDES = ('images', 'memories')
+    DEFAULT_INCLUDE_LIMIT = 20
+    MAX_INCLUDE_LIMIT = 100
+    DEFAULT_MEMORY_IMAGES_LIMIT = 4
+    MAX_MEMORY_IMAGES_LIMIT = 10
+    
     def get(self, memorial_id):
-        """Get a single memorial by ID with its relationships."""
-        memorial = Memorial.query.get_or_404(memorial_id)
-        return self.success_response(memorial.to_dict())
+        """Get a single memorial by ID, optionally with its images and memories.
+        
+        ``include=images,memories`` embeds the newest related rows, up to
+        ``images_limit``/``memories_limit`` each, and each embedded memory
+        carries at most ``memory_images_limit`` of its images, so a memorial
+        page needs a single request. However many rows are included this costs
+        at most four queries: the memorial, its images, its memories, and the
+        images of those memories.
+        
+        Includes of a private memorial are only served to its owner and to
+        admins; anyone else gets a 404, as for an unknown ID.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument('include', type=str, location='args', default='')
+        parser.add_argument('images_limit', type=int, location='args', default=self.DEFAULT_INCLUDE_LIMIT)
+        parser.add_argument('memories_limit', type=int, location='args', default=self.DEFAULT_INCLUDE_LIMIT)
+        parser.add_argument('memory_images_limit', type=int, location='args',
+                            default=self.DEFAULT_MEMORY_IMAGES_LIMIT)
+        args = parser.parse_args()
+        
+        include = {part.strip() for part in args['include'].split(',') if part.strip()}
+        unknown = include - set(self.INCLUDES)
+        if unknown:
+            return self.error_response(
+                f"Unknown include: {', '.join(sorted(unknown))}; expected {', '.join(self.INCLUDES)}", 400)
+        
+        options = [lazyload(Memorial.memories)]
+        if 'images' not in include:
+            # Only the profile image is needed for to_dict()
+            options.append(selectinload(Memorial.images.and_(ImageModel.is_profile == True)))  # noqa: E712
+        memorial = Memorial.query.options(*options).filter_by(id=memorial_id).first_or_404()
+        if include and not memorial.is_public and not self._can_view(memorial):
+            return self.error_response('Memorial not found', 404)
+        
+        included = {}
+        if 'images' in include:
+            limit = self._limit(args['images_limit'])
+            # Profile image first, so to_dict() finds it within the page
+            images = ImageModel.query.filter_by(memorial_id=memorial.id).order_by(
+                ImageModel.is_profile.desc(), ImageModel.created_at.desc(), ImageModel.id.desc()
+            ).limit(limit + 1).all()
+            set_committed_value(memorial, 'images', images[:limit])
+            included['images'] = {'limit': limit, 'has_more': len(images) > limit}
+        
+        data = memorial.to_dict()
+        
+        if 'images' in include:
+            data['images'] = [image.to_dict() for image in memorial.images]
+        if 'memories' in include:
+            limit = self._limit(args['memories_limit'])
+            memories = Memory.query.join(
+                memorial_memories, memorial_memories.c.memory_id == Memory.id
+            ).filter(
+                memorial_memories.c.memorial_id == memorial.id
+            ).options(
+                lazyload(Memory.images)
+            ).order_by(Memory.created_at.desc(), Memory.id.desc()).limit(limit + 1).all()
+            has_more, memories = len(memories) > limit, memories[:limit]
+            images_limit = max(0, min(args['memory_images_limit'], self.MAX_MEMORY_IMAGES_LIMIT))
+            images = self._memory_images([memory.id for memory in memories], images_limit)
+            data['memories'] = []
+            for memory in memories:
+                page = images.get(memory.id, [])
+                set_committed_value(memory, 'images', page[:images_limit])
+                data['memories'].append(dict(memory.to_dict(), has_more_images=len(page) > images_limit))
+            included['memories'] = {'limit': limit, 'has_more': has_more,
+                                    'images_limit': images_limit}
+        
+        if included:
+            data['included'] = included
+        return self.success_response(data)
+    
+    def _limit(self, value):
+        return max(0, min(value, self.MAX_INCLUDE_LIMIT))
+    
+    @staticmethod
+    def _can_view(memorial):
+        user = optional_user()
+        return user is not None and (user['id'] == memorial.user_id or user['is_admin'])
+    
+    @staticmethod
+    def _memory_images(memory_ids, limit):
+        """Return up to ``limit + 1`` newest images of each memory, by memory id,
+        in one windowed query."""
+        if not memory_ids or not limit:
+            return {}
+        position = func.row_number().over(
+            partition_by=MemoryImage.memory_id,
+            order_by=(MemoryImage.created_at.desc(), MemoryImage.id.desc())
+        ).label('position')
+        ranked = select(MemoryImage.id, position).where(
+            MemoryImage.memory_id.in_(memory_ids)
+        ).subquery()
+        rows = db.session.execute(
+            select(MemoryImage).join(ranked, ranked.c.id == MemoryImage.id)
+            .where(ranked.c.position <= limit + 1)
+            .order_by(MemoryImage.memory_id, ranked.c.position)
+        ).scalars()
+        images = {}
+        for image in rows:
+            images.setdefault(image.memory_id, []).append(image)
+        return images
     
     def put(self, memorial_id):
         """Update a memorial."""
@@ -66,15 +177,25 @@ class MemorialResource(BaseResource):
 class MemorialListResource(BaseResource):
     """API Resource for memorial collection operations."""
     
+    MAX_IDS = 100
+    
     def get(self):
-        """Get all memorials with optional filtering and pagination."""
+        """Get all memorials with optional filtering and pagination.
+        
+        With ``ids=1,2,3`` the listed memorials are returned instead, in
+        request order (see ``_get_by_ids``).
+        """
         parser = reqparse.RequestParser()
-        parser.add_argument('user_id', type=int, required=False)
-        parser.add_argument('is_public', type=bool, required=False)
-        parser.add_argument('religion', type=str, required=False)
+        parser.add_argument('ids', type=str, location='args', required=False)
+        parser.add_argument('user_id', type=int, location='args', required=False)
+        parser.add_argument('is_public', type=bool, location='args', required=False)
+        parser.add_argument('religion', type=str, location='args', required=False)
         
         args = parser.parse_args()
         
+        if args['ids'] is not None:
+            return self._get_by_ids(args['ids'])
+        
         # Build query with filters
         query = Memorial.query
         
@@ -85,8 +206,40 @@ class MemorialListResource(BaseResource):
         if args['religion'] is not None:
             query = query.filter_by(religion=args['religion'])
         
+        # Newest first; served by the (is_public|religion, created_at) indexes
+        query = query.order_by(Memorial.created_at.desc())
+        
         return self.success_response(self.paginate_query(query))
     
+    def _get_by_ids(self, raw_ids):
+        """Fetch up to MAX_IDS public memorials in two queries, in request order.
+        
+        Unknown and private IDs get a ``{"id": ..., "status": "not_found"}``
+        marker in their place; the two are indistinguishable so that private
+        memorials are not revealed.
+        """
+        try:
+            ids = list(dict.fromkeys(int(part) for part in raw_ids.split(',') if part.strip()))
+        except ValueError:
+            return self.error_response('ids must be a comma-separated list of integers', 400)
+        if not ids:
+            return self.error_response('ids must not be empty', 400)
+        if len(ids) > self.MAX_IDS:
+            return self.error_response(f'At most {self.MAX_IDS} ids per request', 400)
+        
+        # One query for the memorials and one for their profile images. The
+        # memories collection (lazy='subquery' by default) is not needed here.
+        memorials = Memorial.query.options(
+            lazyload(Memorial.memories),
+            selectinload(Memorial.images.and_(ImageModel.is_profile == True))  # noqa: E712
+        ).filter(Memorial.id.in_(ids), Memorial.is_public == True).all()  # noqa: E712
+        
+        by_id = {memorial.id: memorial for memorial in memorials}
+        items = [by_id[memorial_id].to_dict() if memorial_id in by_id
+                 else {'id': memorial_id, 'status': 'not_found'}
+                 for memorial_id in ids]
+        return self.success_response({'items': items, 'found': len(by_id), 'requested': len(ids)})
+    
     def post(self):
         """Create a new memorial."""
         # Parse and validate request data
@@ -120,3 +273,42 @@ class MemorialListResource(BaseResource):
         db.session.commit()
         
         return self.success_response(memorial.to_dict(), 'Memorial created successfully', 201)
+
+class MemorialImportResource(BaseResource):
+    """API Resource for bulk memorial import (admin only)."""
+    
+    method_decorators = [admin_required]
+    
+    def post(self):
+        """Import memorials from a CSV or NDJSON upload or request body.
+        
+        Rows are validated and inserted in batches as the body is read; rows
+        that fail are reported by line number and the rest are still imported.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument('format', type=str, location='args', choices=FORMATS)
+        parser.add_argument('user_id', type=int, location='args')
+        parser.add_argument('batch_size', type=int, location='args')
+        parser.add_argument('dry_run', type=inputs.boolean, location='args', default=False)
+        args = parser.parse_args()
+        
+        upload = request.files.get('file')
+        if upload is not None:
+            raw, fmt = upload.stream, args['format'] or detect_format(upload.filename, upload.mimetype)
+        elif request.content_length:
+            raw, fmt = request.stream, args['format'] or detect_format(content_type=request.mimetype)
+        else:
+            return self.error_response('Send a CSV or NDJSON file as "file" or as the request body', 400)
+        
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        result = import_memorials(
+            stream, fmt,
+            user_id=args['user_id'] or request.current_user['id'],
+            batch_size=args['batch_size'],
+            dry_run=args['dry_run']
+        ).to_dict()
+        
+        if not result['imported'] and result['failed']:
+            return self.error_response('No memorials were imported', 400, errors=result)
+        message = f"{result['imported']} memorials imported, {result['failed']} rows failed"
+        return self.success_response(result, message, 200 if args['dry_run'] else 201)
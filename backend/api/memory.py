@@ -2,9 +2,13 @@
 Memory API resources.
 """
 from flask_restful import reqparse
-from flask import current_app, request
+from flask import current_app, request, abort
 from datetime import datetime
-from ..models import Memory, db, MemoryImage, Memorial
+from sqlalchemy import select
+from sqlalchemy.orm import lazyload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from models import Memory, db, MemoryImage, Memorial, memorial_memories
+from counters import track
 from .base import BaseResource
 
 class MemoryResource(BaseResource):
@@ -48,46 +52,122 @@ class MemoryResource(BaseResource):
 class MemoryListResource(BaseResource):
     """API Resource for memory collection operations."""
     
+    MAX_BATCH = 1000
+    
     def get(self):
         """Get all memories with optional filtering and pagination."""
         parser = reqparse.RequestParser()
-        parser.add_argument('memorial_id', type=int, required=False)
+        parser.add_argument('memorial_id', type=int, location='args', required=False)
         
         args = parser.parse_args()
         
-        # Build query with filters
-        query = Memory.query
+        # Build query with filters; each page's images load in one extra query
+        query = Memory.query.options(selectinload(Memory.images))
         
         if args['memorial_id'] is not None:
-            # Only return memories associated with the specified memorial
-            memorial = Memorial.query.get_or_404(args['memorial_id'])
-            query = query.filter(Memory.memorials.any(id=memorial.id))
+            # Only return memories associated with the specified memorial. Check
+            # the id alone: loading the Memorial would subquery-load all of
+            # its memories. A join on the association's primary key replaces
+            # the correlated EXISTS from Memory.memorials.any().
+            if db.session.get(Memorial, args['memorial_id'], options=[lazyload('*')]) is None:
+                abort(404)
+            query = query.join(
+                memorial_memories, memorial_memories.c.memory_id == Memory.id
+            ).filter(memorial_memories.c.memorial_id == args['memorial_id'])
         
         return self.success_response(self.paginate_query(query))
     
     def post(self):
-        """Create a new memory and optionally associate it with memorials."""
-        # Parse and validate request data
-        parser = reqparse.RequestParser()
-        parser.add_argument('title', type=str, required=True, help='Title is required')
-        parser.add_argument('content', type=str, required=True, help='Content is required')
-        parser.add_argument('memorial_ids', type=int, action='append', required=True, 
-                          help='At least one memorial ID is required')
+        """Create one memory, or a batch of memories, and associate them with memorials.
         
-        args = parser.parse_args()
+        Accepts ``{"title", "content", "memorial_ids"}`` for a single memory,
+        or ``{"memories": [...]}`` (or a bare JSON array) of such objects. All
+        memorial IDs are checked with one query, the memories are inserted
+        together, and their memorial links go in as one bulk insert, so a
+        batch costs a handful of statements however large it is.
+        """
+        payload = request.get_json(silent=True)
+        if payload is None:
+            # Form-encoded single memory
+            payload = {
+                'title': request.values.get('title'),
+                'content': request.values.get('content'),
+                'memorial_ids': request.values.getlist('memorial_ids')
+            }
+        elif not isinstance(payload, (dict, list)):
+            return self.error_response('Expected a JSON object or array', 400)
+        
+        is_batch = isinstance(payload, list) or 'memories' in payload
+        items = payload if isinstance(payload, list) else payload.get('memories', [payload])
+        if not isinstance(items, list) or not items:
+            return self.error_response('Provide a memory or a non-empty "memories" array', 400)
+        if len(items) > self.MAX_BATCH:
+            return self.error_response(f'At most {self.MAX_BATCH} memories per request', 400)
         
-        # Create new memory
-        memory = Memory(
-            title=args['title'],
-            content=args['content']
-        )
+        entries, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                entries.append(self._validate(item))
+            except ValueError as e:
+                errors[str(index) if is_batch else 'memory'] = [str(e)]
+        if errors:
+            return self.error_response('Invalid memory data', 400, errors=errors)
         
-        # Associate with memorials
-        for memorial_id in args['memorial_ids']:
-            memorial = Memorial.query.get_or_404(memorial_id)
-            memory.memorials.append(memorial)
+        # One IN query validates every referenced memorial
+        requested = {memorial_id for _, _, memorial_ids in entries for memorial_id in memorial_ids}
+        found = set(db.session.execute(
+            select(Memorial.id).where(Memorial.id.in_(requested))
+        ).scalars())
+        missing = sorted(requested - found)
+        if missing:
+            return self.error_response('Memorial not found', 404, errors={'memorial_ids': missing})
         
-        db.session.add(memory)
+        memories = [Memory(title=title, content=content) for title, content, _ in entries]
+        db.session.add_all(memories)
+        db.session.flush()  # a single multi-row INSERT ... RETURNING assigns the ids
+        
+        links = [{'memorial_id': memorial_id, 'memory_id': memory.id}
+                 for memory, (_, _, memorial_ids) in zip(memories, entries)
+                 for memorial_id in memorial_ids]
+        db.session.execute(memorial_memories.insert(), links)
+        for link in links:
+            # Core insert: the counter session events do not see these links
+            track(db.session, link['memorial_id'], 'memory_count')
+        
+        # Serialize before commit expires the objects; new memories have no
+        # images, so mark that as loaded rather than querying for each one
+        data = []
+        for memory, (_, _, memorial_ids) in zip(memories, entries):
+            set_committed_value(memory, 'images', [])
+            data.append(dict(memory.to_dict(), memorial_ids=memorial_ids))
         db.session.commit()
         
-        return self.success_response(memory.to_dict(), 'Memory created successfully', 201)
+        if not is_batch:
+            return self.success_response(data[0], 'Memory created successfully', 201)
+        return self.success_response(data, f'{len(data)} memories created successfully', 201)
+    
+    @staticmethod
+    def _validate(item):
+        """Return ``(title, content, memorial_ids)`` for one memory or raise ValueError."""
+        if not isinstance(item, dict):
+            raise ValueError('Each memory must be an object')
+        title = item.get('title')
+        content = item.get('content')
+        if not isinstance(title, str) or not title.strip():
+            raise ValueError('Title is required')
+        if len(title) > 200:
+            raise ValueError('Title is longer than 200 characters')
+        if not isinstance(content, str) or not content.strip():
+            raise ValueError('Content is required')
+        
+        memorial_ids = item.get('memorial_ids', item.get('memorial_id'))
+        if not isinstance(memorial_ids, list):
+            memorial_ids = [memorial_ids] if memorial_ids is not None else []
+        try:
+            # Deduplicate, keeping order; the association has a composite primary key
+            memorial_ids = list(dict.fromkeys(int(memorial_id) for memorial_id in memorial_ids))
+        except (TypeError, ValueError):
+            raise ValueError('memorial_ids must be integers')
+        if not memorial_ids:
+            raise ValueError('At least one memorial ID is required')
+        return title, content, memorial_ids
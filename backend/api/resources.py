@@ -5,10 +5,11 @@ from .base import BaseResource
 from . import api
 
 # Import all resource classes here
-from .user import UserResource, UserListResource
-from .memorial import MemorialResource, MemorialListResource
+from .user import UserResource, UserListResource, UserExportResource
+from .memorial import MemorialResource, MemorialListResource, MemorialImportResource
 from .memory import MemoryResource, MemoryListResource
 from .image import ImageResource, ImageListResource
+from .search import SearchResource, AutocompleteResource
 
 # Register all resources
 def init_resources():
@@ -16,10 +17,12 @@ def init_resources():
     # User resources
     UserListResource.register(api, '/users')
     UserResource.register(api, '/users/<int:user_id>')
+    UserExportResource.register(api, '/users/<int:user_id>/export')
     
     # Memorial resources
     MemorialListResource.register(api, '/memorials')
     MemorialResource.register(api, '/memorials/<int:memorial_id>')
+    MemorialImportResource.register(api, '/memorials/import')
     
     # Memory resources
     MemoryListResource.register(api, '/memories')
@@ -28,3 +31,7 @@ def init_resources():
     # Image resources
     ImageListResource.register(api, '/images')
     ImageResource.register(api, '/images/<int:image_id>')
+    
+    # Search resources
+    SearchResource.register(api, '/search')
+    AutocompleteResource.register(api, '/search/autocomplete')
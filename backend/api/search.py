@@ -0,0 +1,55 @@
+"""
+Search API resources.
+"""
+from flask_restful import reqparse
+from search import search
+from autocomplete import suggest
+from .base import BaseResource
+
+class SearchResource(BaseResource):
+    """API Resource for full-text search over memorials and memories."""
+    
+    MAX_LIMIT = 50
+    
+    def get(self):
+        """Search public memorials and memories by name, biography or content."""
+        parser = reqparse.RequestParser()
+        parser.add_argument('q', type=str, location='args', required=True, help='Search query is required')
+        parser.add_argument('type', type=str, location='args', default='all', choices=('all', 'memorials', 'memories'))
+        parser.add_argument('limit', type=int, location='args', default=20)
+        parser.add_argument('offset', type=int, location='args', default=0)
+        
+        args = parser.parse_args()
+        query = args['q'].strip()
+        if not query:
+            return self.error_response('Search query is required', 400)
+        
+        limit = max(1, min(args['limit'], self.MAX_LIMIT))
+        offset = max(0, args['offset'])
+        
+        results = {'query': query}
+        if args['type'] in ('all', 'memorials'):
+            results['memorials'] = search('memorial', query, limit, offset)
+        if args['type'] in ('all', 'memories'):
+            results['memories'] = search('memory', query, limit, offset)
+        
+        return self.success_response(results)
+
+class AutocompleteResource(BaseResource):
+    """API Resource for memorial name suggestions as the visitor types."""
+    
+    MAX_LIMIT = 20
+    
+    def get(self):
+        """Suggest public memorials whose name starts with, or resembles, the query."""
+        parser = reqparse.RequestParser()
+        parser.add_argument('q', type=str, location='args', default='')
+        parser.add_argument('limit', type=int, location='args', default=10)
+        
+        args = parser.parse_args()
+        query = args['q'].strip()
+        if not query:
+            return self.success_response([])
+        
+        limit = max(1, min(args['limit'], self.MAX_LIMIT))
+        return self.success_response(suggest(query, limit))
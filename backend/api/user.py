@@ -2,8 +2,10 @@
 User API resources.
 """
 from flask_restful import reqparse
-from flask import current_app
-from ..models import User, db
+from flask import current_app, request, Response, stream_with_context
+from models import User, db
+from exporter import export_user, export_filename, acquire_slot, FORMATS
+from security import token_required, export_limiter
 from .base import BaseResource
 
 class UserResource(BaseResource):
@@ -84,3 +86,38 @@ class UserListResource(BaseResource):
         db.session.commit()
         
         return self.success_response(user.to_dict(), 'User created successfully', 201)
+
+class UserExportResource(BaseResource):
+    """API Resource for streaming a user's full data export."""
+    
+    method_decorators = [export_limiter, token_required]
+    
+    MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'zip': 'application/zip'}
+    
+    def get(self, user_id):
+        """Stream the user's memorials, images and memories as NDJSON, or as a
+        ZIP that also contains the image files."""
+        current_user = request.current_user
+        if current_user['id'] != user_id and not current_user.get('is_admin', False):
+            return self.error_response('You can only export your own data', 403)
+        
+        parser = reqparse.RequestParser()
+        parser.add_argument('format', type=str, location='args', default='ndjson', choices=FORMATS)
+        fmt = parser.parse_args()['format']
+        
+        if db.session.get(User, user_id) is None:
+            return self.error_response('User not found', 404)
+        
+        slot = acquire_slot()
+        if slot is None:
+            body, status = self.error_response('Too many exports in progress, try again shortly', 429)
+            return body, status, {'Retry-After': '30'}
+        
+        # GET requests are routed to a read replica when one is configured
+        engine = db.session.get_bind()
+        response = Response(stream_with_context(export_user(user_id, fmt, engine)),
+                            mimetype=self.MEDIA_TYPES[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(user_id, fmt)}"'
+        response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass chunks straight through
+        response.call_on_close(slot.release)
+        return response
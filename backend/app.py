@@ -1,11 +1,6 @@
 import os
-import io
-import base64
-import qrcode
-import requests
 from datetime import datetime, timedelta
-from PIL import Image
-from flask import Flask, jsonify, request, send_from_directory, url_for, g
+from flask import Flask, jsonify, request, send_from_directory, url_for, g, redirect
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from flask_jwt_extended import (
@@ -15,15 +10,24 @@ from flask_jwt_extended import (
 
 # Import configuration and models
 from config import get_config
-from models import db, User, Memorial, Memory, Image as ImageModel, MemoryModel
+from routing import init_routing, STICKY_HEADER
+from counters import init_counters
+from scans import init_scans, record_scan
+from autocomplete import init_autocomplete
+from models import db, User, Memorial, Memory, Image as ImageModel, MemoryImage
+from monitoring import setup_logging
+from monitoring.middleware import setup_monitoring
+from monitoring.tracing import tracer
+from monitoring.querytags import init_query_tags
 from security import (
     limiter, token_required, admin_required, validate_email,
     validate_password, hash_password, check_password, sanitize_input
 )
-import logging
-from logging.handlers import RotatingFileHandler
 from werkzeug.exceptions import HTTPException, InternalServerError
 
+# qrcode (with PIL) and requests are imported where they are used: together
+# they cost more import time than Flask itself, on every worker boot.
+
 # Template constants
 CHRISTIAN_TEMPLATE = {
     'name': 'Christian Memorial',
@@ -39,17 +43,34 @@ MUSLIM_TEMPLATE = {
     'fonts': ['Traditional Arabic', 'Arial', 'Tahoma']
 }
 
-def create_app(config_name=None):
-    """Application factory function"""
+_resources_registered = False
+
+def create_app(config_name=None, overrides=None):
+    """Application factory function
+    
+    Args:
+        config_name: 'development', 'production' or 'testing'
+        overrides: Settings applied on top of that configuration
+    """
     app = Flask(__name__)
     
     # Load configuration
     config = get_config(config_name)
     app.config.from_object(config)
-    
+    app.config.update(overrides or {})
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
     # Initialize extensions
     db.init_app(app)
-    CORS(app)  # Enable CORS for all routes
+    init_routing(app)
+    init_counters(app)
+    init_scans(app)
+    init_autocomplete(app)
+    # Enable CORS for all routes. Cross-origin API clients get the
+    # read-your-writes deadline as a header; with explicit origins the
+    # cookie works too.
+    origins = app.config.get('CORS_ORIGINS', '*')
+    CORS(app, origins=origins, supports_credentials=origins != '*', expose_headers=[STICKY_HEADER])
     
     # Initialize JWT
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -60,22 +81,32 @@ def create_app(config_name=None):
     # Initialize rate limiter
     limiter.init_app(app)
     
-    # Configure logging
+    # Initialize request tracing (no-op unless TRACING_ENABLED)
+    tracer.init_app(app)
+    
+    # Tag SQL with the code that issued it, for pg_stat_statements reports
+    init_query_tags(app)
+    
+    # Configure logging (queued: file I/O happens off the request thread)
     if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/memorial_api.log', maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
+        setup_logging(app)
         app.logger.info('Memorial API startup')
     
+    # API resources are added to the shared Api object once per process,
+    # before its blueprint is registered so that their routes carry the
+    # blueprint and Api prefixes (/api/v1)
+    global _resources_registered
+    if not _resources_registered:
+        from api.resources import init_resources
+        init_resources()
+        _resources_registered = True
+
     # Register blueprints
-    from .api import api_bp
+    from api import api_bp
     app.register_blueprint(api_bp, url_prefix=config.API_PREFIX)
-    
+
+    register_routes(app)
+
     # Template data
     app.config['CHRISTIAN_TEMPLATE'] = {
         "title": "In Loving Memory",
@@ -178,179 +209,136 @@ def create_app(config_name=None):
             'code': 500
         }), 500
     
-    # Health check endpoint
-    @app.route('/health')
-    def health_check():
-        return jsonify({
-            'status': 'healthy',
-            'database': 'connected' if db.session.bind is not None else 'disconnected',
-            'environment': app.config.get('FLASK_ENV', 'development')
-        })
+    # Metrics, profiling and the /health liveness and readiness probes
+    setup_monitoring(app)
     
-    # Initialize database
-    @app.before_first_request
-    def initialize_database():
-        try:
-            # Create database tables if they don't exist
-            db.create_all()
-            app.logger.info('Database initialized')
-        except Exception as e:
-            app.logger.error(f'Error initializing database: {str(e)}')
-            raise
+    # No database work here: the schema is migrated before deployment and
+    # checked once by whoever serves the app (database.check_schema)
     
     return app
 
-# Create the Flask application
-app = create_app()
-
-# Initialize API resources
-from .api.resources import init_resources
-init_resources()
+def register_routes(app):
+    """Template, QR and upload routes served outside the versioned API"""
+    @app.route('/api/christian-template', methods=['GET'])
+    def christian_template():
+        """Get Christian memorial template"""
+        return jsonify(CHRISTIAN_TEMPLATE)
 
-@app.route('/api/christian-template', methods=['GET'])
-def christian_template():
-    """Get Christian memorial template"""
-    return jsonify(CHRISTIAN_TEMPLATE)
+    @app.route('/api/muslim-template', methods=['GET'])
+    def muslim_template():
+        """Get Muslim memorial template"""
+        return jsonify(MUSLIM_TEMPLATE)
 
-@app.route('/api/muslim-template', methods=['GET'])
-def muslim_template():
-    """Get Muslim memorial template"""
-    return jsonify(MUSLIM_TEMPLATE)
+    @app.route('/q/<int:memorial_id>', methods=['GET'])
+    @limiter.exempt
+    def scan_redirect(memorial_id):
+        """Record a QR scan and redirect to the memorial page"""
+        # Buffered in memory; no database work on the redirect path
+        record_scan(memorial_id)
+        response = redirect(app.config['MEMORIAL_PAGE_URL'].format(memorial_id=memorial_id), code=302)
+        response.headers['Cache-Control'] = 'no-store'  # every scan must reach us
+        return response
 
-@app.route('/api/generate-qr', methods=['POST'])
-def generate_qr():
-    """Generate QR code for memorial"""
-    data = request.get_json()
-    memorial_id = data.get('memorial_id', 'default')
-    
-    # Create QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(f"https://gateofmemory.com/memorial/{memorial_id}")
-    qr.make(fit=True)
-    
-    # Create image
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    
-    return jsonify({
-        "qr_code": f"data:image/png;base64,{img_str}",
-        "memorial_id": memorial_id
-    })
+    @app.route('/api/generate-qr', methods=['POST'])
+    def generate_qr():
+        """Generate QR code for memorial"""
+        import io
+        import base64
+        import qrcode
 
-@app.route('/api/upload-photo', methods=['POST'])
-def upload_photo():
-    """Upload memorial photo"""
-    if 'photo' not in request.files:
-        return jsonify({"error": "No photo provided"}), 400
-    
-    file = request.files['photo']
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-    
-    # Save file (in production, you'd want to use cloud storage)
-    filename = f"memorial_photo_{file.filename}"
-    file.save(os.path.join('static/uploads', filename))
-    
-    return jsonify({
-        "success": True,
-        "filename": filename,
-        "url": f"/static/uploads/{filename}"
-    })
-
-@app.route('/api/save-memorial', methods=['POST'])
-def save_memorial():
-    """Save memorial details"""
-    data = request.get_json()
-    
-    # In production, you'd save to a database
-    memorial_data = {
-        "name": data.get('name'),
-        "date": data.get('date'),
-        "message": data.get('message'),
-        "template_type": data.get('template_type', 'christian'),
-        "id": f"memorial_{len(data)}"  # Simple ID generation
-    }
-    
-    return jsonify({
-        "success": True,
-        "memorial": memorial_data
-    })
-
-@app.route('/api/health')
-@limiter.limit("10 per minute")
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0'
-    })
-
-@app.route('/api/auth/refresh', methods=['POST'])
-@jwt_required(refresh=True)
-def refresh_token():
-    """Refresh access token"""
-    current_user = get_jwt_identity()
-    access_token = create_access_token(identity=current_user)
-    return jsonify({
-        'access_token': access_token,
-        'message': 'Token refreshed successfully'
-    }), 200
-
-@app.errorhandler(429)
-def ratelimit_handler(e):
-    """Handle rate limit exceeded errors"""
-    return jsonify({
-        'error': 'rate_limit_exceeded',
-        'message': 'Too many requests. Please try again later.'
-    }), 429
-
-@app.errorhandler(400)
-def bad_request_handler(e):
-    """Handle bad request errors"""
-    return jsonify({
-        'error': 'bad_request',
-        'message': str(e) if str(e) else 'Invalid request data'
-    }), 400
+        data = request.get_json()
+        memorial_id = data.get('memorial_id', 'default')
+        
+        # Real memorials get the scan redirect, so that scans are counted
+        url = app.config['QR_SCAN_URL'] if str(memorial_id).isdigit() else app.config['MEMORIAL_PAGE_URL']
+        
+        # Create QR code
+        with tracer.span('qr.make', memorial_id=str(memorial_id)):
+            qr = qrcode.QRCode(version=1, box_size=10, border=5)
+            qr.add_data(url.format(memorial_id=memorial_id))
+            qr.make(fit=True)
+        
+        # Create image
+        with tracer.span('qr.render'):
+            img = qr.make_image(fill_color="black", back_color="white")
+        
+        # Convert to base64
+        with tracer.span('qr.encode'):
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            img_str = base64.b64encode(buffer.getvalue()).decode()
+        
+        return jsonify({
+            "qr_code": f"data:image/png;base64,{img_str}",
+            "memorial_id": memorial_id
+        })
 
-@app.errorhandler(401)
-def unauthorized_handler(e):
-    """Handle unauthorized errors"""
-    return jsonify({
-        'error': 'unauthorized',
-        'message': 'Authentication required'
-    }), 401
+    @app.route('/api/upload-photo', methods=['POST'])
+    def upload_photo():
+        """Upload memorial photo"""
+        if 'photo' not in request.files:
+            return jsonify({"error": "No photo provided"}), 400
+        
+        file = request.files['photo']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        
+        # Save file (in production, you'd want to use cloud storage)
+        filename = f"memorial_photo_{file.filename}"
+        file.save(os.path.join('static/uploads', filename))
+        
+        return jsonify({
+            "success": True,
+            "filename": filename,
+            "url": f"/static/uploads/{filename}"
+        })
 
-@app.errorhandler(403)
-def forbidden_handler(e):
-    """Handle forbidden errors"""
-    return jsonify({
-        'error': 'forbidden',
-        'message': 'You do not have permission to access this resource'
-    }), 403
+    @app.route('/api/save-memorial', methods=['POST'])
+    def save_memorial():
+        """Save memorial details"""
+        data = request.get_json()
+        
+        # In production, you'd save to a database
+        memorial_data = {
+            "name": data.get('name'),
+            "date": data.get('date'),
+            "message": data.get('message'),
+            "template_type": data.get('template_type', 'christian'),
+            "id": f"memorial_{len(data)}"  # Simple ID generation
+        }
+        
+        return jsonify({
+            "success": True,
+            "memorial": memorial_data
+        })
 
-@app.errorhandler(404)
-def not_found_handler(e):
-    """Handle not found errors"""
-    return jsonify({
-        'error': 'not_found',
-        'message': 'The requested resource was not found'
-    }), 404
+    @app.route('/api/auth/refresh', methods=['POST'])
+    @jwt_required(refresh=True)
+    def refresh_token():
+        """Refresh access token"""
+        current_user = get_jwt_identity()
+        access_token = create_access_token(identity=current_user)
+        return jsonify({
+            'access_token': access_token,
+            'message': 'Token refreshed successfully'
+        }), 200
 
-@app.errorhandler(500)
-def internal_error_handler(e):
-    """Handle internal server errors"""
-    app.logger.error(f'Internal Server Error: {str(e)}')
-    return jsonify({
-        'error': 'internal_server_error',
-        'message': 'An unexpected error occurred'
-    }), 500
+    @app.errorhandler(429)
+    def ratelimit_handler(e):
+        """Handle rate limit exceeded errors"""
+        return jsonify({
+            'error': 'rate_limit_exceeded',
+            'message': 'Too many requests. Please try again later.'
+        }), 429
 
 if __name__ == '__main__':
+    import requests
+    
+    from database import check_schema
+    
+    app = create_app()
+    check_schema(app)
+    
     # Create static directories if they don't exist
     os.makedirs('static/images', exist_ok=True)
     os.makedirs('static/qr', exist_ok=True)
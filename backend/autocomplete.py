@@ -0,0 +1,292 @@
+"""
+Name autocomplete for public memorials.
+
+Each process keeps a sorted array of ``(key, memorial_id)`` entries, one per
+word of every public memorial name, so typing "moh" finds "Ahmed Mohammed" at
+any word boundary with a binary search. Keys are normalized: case-folded, with
+diacritics and Arabic tashkeel removed, tatweel dropped, and alef, ya and ta
+marbuta variants folded, so "احمد" finds "أحمد".
+
+The index follows committed ORM writes in this process through session
+events. Writes from other workers (or Core bulk inserts) are picked up by a
+background thread that delta-loads on ``Memorial.updated_at`` every
+``AUTOCOMPLETE_REFRESH_INTERVAL`` seconds, and rebuilds the index from
+scratch every ``AUTOCOMPLETE_REBUILD_INTERVAL`` seconds so deletions
+elsewhere are eventually dropped. ``updated_at`` is set when a row is
+flushed, not when it commits, so each delta load reaches back
+``AUTOCOMPLETE_REFRESH_OVERLAP`` seconds before the newest row it has seen;
+a transaction open longer than that waits for the next rebuild. Requests
+never load the index: until the first build finishes, suggestions come from
+a plain prefix query.
+
+When the prefix index returns fewer suggestions than requested on
+PostgreSQL, a pg_trgm similarity query fills the remainder with fuzzy matches,
+so "mohamad" still finds "Mohammed".
+"""
+import re
+import time
+import logging
+import threading
+import unicodedata
+from datetime import timedelta
+from bisect import bisect_left, insort
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from models import db, Memorial
+from background import BackgroundWorker, hold_until_commit
+
+logger = logging.getLogger(__name__)
+
+# Prefix ranges longer than this are not scanned further; short prefixes
+# such as "a" only need the first few hits.
+MAX_SCAN = 500
+
+_ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,  # tatweel
+})
+
+
+def normalize(value):
+    """Fold a name or query to the form stored in the index."""
+    value = unicodedata.normalize('NFKD', value or '').translate(_ARABIC_FOLDING)
+    # NFKD splits accents and Arabic harakat into combining marks (category M*)
+    value = ''.join(ch for ch in value if not unicodedata.category(ch).startswith('M'))
+    return ' '.join(re.findall(r'\w+', value.casefold()))
+
+
+class NameIndex:
+    """Sorted-array prefix index over public memorial names."""
+
+    def __init__(self):
+        self._entries = []  # sorted (key, memorial_id)
+        self._names = {}    # memorial_id -> (name, [keys])
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one load at a time
+        self._loaded_at = None  # monotonic time of the last full build
+        self._watermark = None  # newest updated_at seen
+
+    def __len__(self):
+        return len(self._names)
+
+    def _keys(self, name):
+        words = normalize(name).split()
+        # The key for each word runs to the end of the name, so "ahmed mo"
+        # matches "Ahmed Mohammed" as well as "mo" alone
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def add(self, memorial_id, name):
+        """Insert or replace the entries for one memorial."""
+        with self._lock:
+            self._discard(memorial_id)
+            keys = self._keys(name)
+            for key in keys:
+                insort(self._entries, (key, memorial_id))
+            self._names[memorial_id] = (name, keys)
+
+    def remove(self, memorial_id):
+        """Drop a memorial from the index."""
+        with self._lock:
+            self._discard(memorial_id)
+
+    def _discard(self, memorial_id):
+        previous = self._names.pop(memorial_id, None)
+        if previous is None:
+            return
+        for key in previous[1]:
+            i = bisect_left(self._entries, (key, memorial_id))
+            if i < len(self._entries) and self._entries[i] == (key, memorial_id):
+                del self._entries[i]
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ``(memorial_id, name)`` pairs whose name has
+        a word starting with ``query``; matches at the start of the name first."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        entries = self._entries
+        hits = {}
+        i = bisect_left(entries, (prefix,))
+        for key, memorial_id in entries[i:i + MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            entry = self._names.get(memorial_id)
+            if entry is None:
+                continue
+            # 0 when the query matched from the first word of the name
+            position = entry[1].index(key) if key in entry[1] else len(entry[1])
+            best = hits.get(memorial_id)
+            if best is None or position < best[0]:
+                hits[memorial_id] = (position, entry[0])
+        ranked = sorted(hits.items(), key=lambda hit: (hit[1][0], len(hit[1][1]), hit[1][1]))
+        return [(memorial_id, name) for memorial_id, (_, name) in ranked[:limit]]
+
+    def load(self, since=None):
+        """Rebuild from every public memorial, or, given ``since``, apply the
+        memorials updated after it."""
+        query = db.session.query(Memorial.id, Memorial.name, Memorial.is_public, Memorial.updated_at)
+        watermark = self._watermark
+        if since is None:
+            # Build off to the side and swap, so readers never see a half-built index
+            entries, names, watermark = [], {}, None
+            for memorial_id, name, is_public, updated_at in query.yield_per(1000):
+                if updated_at and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+                if is_public:
+                    keys = self._keys(name)
+                    entries.extend((key, memorial_id) for key in keys)
+                    names[memorial_id] = (name, keys)
+            entries.sort()
+            with self._lock:
+                self._entries, self._names = entries, names
+        else:
+            for memorial_id, name, is_public, updated_at in \
+                    query.filter(Memorial.updated_at > since).yield_per(1000):
+                if watermark is None or updated_at > watermark:
+                    watermark = updated_at
+                if is_public:
+                    self.add(memorial_id, name)
+                else:
+                    self.remove(memorial_id)
+        self._watermark = watermark
+
+    @property
+    def built(self):
+        return self._loaded_at is not None
+
+    def refresh(self):
+        """Rebuild or delta-load the index if it is due; run by the refresher.
+
+        Returns:
+            bool: False if another thread was already refreshing
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            config = current_app.config
+            now = time.monotonic()
+            if (self._loaded_at is None or
+                    now - self._loaded_at >= config.get('AUTOCOMPLETE_REBUILD_INTERVAL', 3600)):
+                self.load()
+                self._loaded_at = now
+                logger.info(f"Autocomplete index built with {len(self)} memorials")
+            elif self._watermark is not None:
+                overlap = timedelta(seconds=config.get('AUTOCOMPLETE_REFRESH_OVERLAP', 60))
+                self.load(since=self._watermark - overlap)
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def reset(self):
+        """Forget everything; the next refresh rebuilds the index."""
+        with self._lock:
+            self._entries, self._names = [], {}
+        self._loaded_at = None
+        self._watermark = None
+
+
+name_index = NameIndex()
+
+
+def _refresh():
+    name_index.refresh()
+
+
+refresher = BackgroundWorker('autocomplete-refresher', _refresh, interval=30)
+
+
+def init_autocomplete(app):
+    """Keep the name index loaded in the background for ``app``."""
+    refresher.init_app(app, app.config.get('AUTOCOMPLETE_REFRESH_INTERVAL', 30))
+
+
+# pg_trgm can be installed while the app runs: a missing extension is
+# checked again after TRIGRAM_RECHECK seconds
+TRIGRAM_RECHECK = 300
+
+_trigram_available = {}  # engine url -> (installed, monotonic time checked)
+
+
+def _has_trigram():
+    url = str(db.engine.url)
+    available, checked_at = _trigram_available.get(url, (False, None))
+    if checked_at is None or (not available and time.monotonic() - checked_at >= TRIGRAM_RECHECK):
+        available = bool(db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar())
+        _trigram_available[url] = (available, time.monotonic())
+    return available
+
+
+def _sql_prefix_matches(query, limit):
+    """Names with a word starting with ``query``, for while the index is loading."""
+    prefix = query.strip().lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    rows = db.session.query(Memorial.id, Memorial.name).filter(
+        Memorial.is_public,
+        db.or_(db.func.lower(Memorial.name).like(f'{prefix}%', escape='\\'),
+               db.func.lower(Memorial.name).like(f'% {prefix}%', escape='\\')),
+    ).order_by(Memorial.name).limit(limit)
+    return [(row.id, row.name) for row in rows]
+
+
+def _fuzzy_matches(query, limit, exclude):
+    """pg_trgm similarity matches, best first, skipping ids in ``exclude``."""
+    rows = db.session.execute(text(
+        'SELECT id, name, similarity(name, :query) AS score FROM memorial '
+        'WHERE is_public AND name % :query '
+        'ORDER BY score DESC, id LIMIT :limit'
+    ), {'query': query, 'limit': limit + len(exclude)})
+    return [(row.id, row.name, round(float(row.score), 3))
+            for row in rows if row.id not in exclude][:limit]
+
+
+def suggest(query, limit=10):
+    """Autocomplete suggestions for ``query``.
+
+    Returns:
+        list: Dicts with ``id``, ``name`` and ``match`` (``'prefix'`` or
+        ``'fuzzy'``; fuzzy matches also carry a similarity ``score``)
+    """
+    refresher.start()
+    if name_index.built:
+        matches = name_index.search(query, limit)
+    else:
+        matches = _sql_prefix_matches(query, limit) if normalize(query) else []
+    results = [{'id': memorial_id, 'name': name, 'match': 'prefix'} for memorial_id, name in matches]
+
+    if (len(results) < limit and len(normalize(query)) >= 3
+            and db.engine.dialect.name == 'postgresql' and _has_trigram()):
+        seen = {result['id'] for result in results}
+        # Transaction-local, so the "%" operator (which the trigram index
+        # serves) uses the configured threshold without leaking to the pool
+        db.session.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+                           {'threshold': str(current_app.config.get('AUTOCOMPLETE_FUZZY_THRESHOLD', 0.3))})
+        results.extend({'id': memorial_id, 'name': name, 'match': 'fuzzy', 'score': score}
+                       for memorial_id, name, score in _fuzzy_matches(query, limit - len(results), seen))
+    return results
+
+
+# Incremental refresh: record Memorial changes at flush time and apply them
+# only once the transaction commits, so rolled-back writes never show up.
+
+@event.listens_for(Session, 'after_flush')
+def _record_memorial_changes(session, flush_context):
+    pending = session.info.setdefault('autocomplete_pending', {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Memorial):
+            pending[obj.id] = (obj.name, obj.is_public)
+    for obj in session.deleted:
+        if isinstance(obj, Memorial):
+            pending[obj.id] = None
+
+
+def _apply_memorial_changes(pending):
+    for memorial_id, change in pending.items():
+        if change is None or not change[1]:
+            name_index.remove(memorial_id)
+        else:
+            name_index.add(memorial_id, change[0])
+
+
+hold_until_commit('autocomplete_pending', _apply_memorial_changes)
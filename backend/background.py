@@ -0,0 +1,125 @@
+"""
+Per-process background work shared by the buffered writers.
+
+The counter flusher, the QR scan writer, the autocomplete refresher and the
+readiness probe each keep state in memory and hand the slow part to a daemon
+thread. ``BackgroundWorker`` is that thread: it runs its task in an app
+context every ``interval`` seconds (or as soon as it is woken), logs failures
+instead of dying on them, and is started once per process, so a worker
+forked from a preloaded Gunicorn master starts its own.
+
+``hold_until_commit`` is the matching piece for ORM writes: changes recorded
+in ``session.info`` while a transaction is open are handed over once it
+commits and dropped if it rolls back.
+"""
+import os
+import atexit
+import logging
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """A daemon thread, one per process, running ``task()`` periodically."""
+
+    def __init__(self, name, task, interval=5, at_exit=None):
+        self.name = name
+        self.task = task
+        self.interval = interval
+        self.at_exit = at_exit  # run once more at interpreter exit
+        self.app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._exit_registered = False
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def init_app(self, app, interval=None):
+        """Run the task for ``app``; the thread starts on ``start()``."""
+        self.app = app
+        if interval is not None:
+            self.interval = interval
+        if self.at_exit and not self._exit_registered:
+            atexit.register(self._run_at_exit)
+            self._exit_registered = True
+
+    def start(self):
+        """Start this process's thread, unless it is already running."""
+        if self.app is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            stop = self._stop
+        threading.Thread(target=self._loop, args=(stop,), name=self.name, daemon=True).start()
+
+    def stop(self):
+        """End this process's thread after its current run and detach from
+        the app; ``init_app()`` attaches it again."""
+        with self._lock:
+            self.app = None
+            self._pid = None
+            stop, self._stop = self._stop, threading.Event()
+        stop.set()
+        self._wakeup.set()
+
+    def wake(self):
+        """Run the task now rather than at the end of the interval."""
+        self._wakeup.set()
+
+    def run(self, task=None):
+        """Run ``task`` (default: the worker's task) on the calling thread.
+
+        Returns:
+            bool: False if it raised, the error is logged, or if the worker
+            has no app
+        """
+        app = self.app
+        if app is None:
+            return False
+        try:
+            with app.app_context():
+                (task or self.task)()
+            return True
+        except Exception as e:
+            logger.warning(f"{self.name} failed: {e}")
+            return False
+
+    def _loop(self, stop):
+        while not stop.is_set():
+            self.run()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def _run_at_exit(self):
+        # Only a process whose thread ran has anything of its own left over
+        if self.app is not None and self._pid == os.getpid():
+            self.run(self.at_exit)
+
+    def _after_fork(self):
+        # Fresh primitives: another thread may have held them at fork time
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+
+def hold_until_commit(key, apply):
+    """Apply ``session.info[key]`` after the session commits; drop it on rollback.
+
+    Flush-time listeners add to ``session.info[key]``; ``apply(pending)`` is
+    called with whatever they collected once the transaction commits.
+    """
+    @event.listens_for(Session, 'after_commit')
+    def _apply_pending(session):
+        pending = session.info.pop(key, None)
+        if pending:
+            apply(pending)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_pending(session):
+        session.info.pop(key, None)
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from routing import replica_binds
 
 # Load environment variables from .env file
 load_dotenv()
@@ -8,6 +9,53 @@ load_dotenv()
 # Base directory of the project
 BASE_DIR = Path(__file__).resolve().parent
 
+# Gunicorn's process model; gunicorn.conf.py reads the same values
+def web_concurrency():
+    """Worker processes per node (``WEB_CONCURRENCY``, default 4)."""
+    return max(int(os.getenv('WEB_CONCURRENCY', 4)), 1)
+
+def worker_threads():
+    """Request threads per worker (``GUNICORN_THREADS``, default 1)."""
+    return max(int(os.getenv('GUNICORN_THREADS', 1)), 1)
+
+# Threads in every worker that take a connection of their own from the
+# primary's pool: the health refresher, the counter flusher, the QR scan
+# writer and the autocomplete refresher (background.BackgroundWorker)
+BACKGROUND_CONNECTIONS = 4
+
+def engine_options():
+    """Derive SQLAlchemy pool sizing from the Gunicorn process model.
+    
+    Every worker process has its own pool, so the budget is
+    ``DB_MAX_CONNECTIONS`` (default 100; set it to the server's
+    ``SHOW max_connections``, it is not read from the server) minus
+    ``DB_RESERVED_CONNECTIONS`` for admin and maintenance sessions, split
+    across ``WEB_CONCURRENCY`` workers.
+    
+    Within a worker, each of the ``GUNICORN_THREADS`` request threads and
+    each background thread (``BACKGROUND_CONNECTIONS``) gets a persistent
+    connection. Overflow covers the streaming exports, which hold a second
+    connection each (``EXPORT_MAX_CONCURRENT``), and one more per request
+    thread, up to what is left of the worker's share.
+    """
+    workers = web_concurrency()
+    threads = worker_threads()
+    exports = max(int(os.getenv('EXPORT_MAX_CONCURRENT', 2)), 0)
+    max_connections = int(os.getenv('DB_MAX_CONNECTIONS', 100))
+    reserved = int(os.getenv('DB_RESERVED_CONNECTIONS', 10))
+    
+    per_worker = max((max_connections - reserved) // workers, 1)
+    pool_size = min(threads + BACKGROUND_CONNECTIONS, per_worker)
+    max_overflow = min(exports + threads, per_worker - pool_size)
+    
+    return {
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 300)),
+        'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10))
+    }
+
 class Config:
     # Flask configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
@@ -26,12 +74,14 @@ class Config:
         f'postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'pool_size': 5,
-        'max_overflow': 10
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
+    
+    # Read replicas: GET requests read from these; writes always go to the primary
+    DATABASE_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    SQLALCHEMY_BINDS = replica_binds(DATABASE_REPLICA_URLS)
+    READ_YOUR_WRITES_WINDOW = float(os.getenv('READ_YOUR_WRITES_WINDOW', 5))  # seconds
+    # Comma-separated frontend origins; '*' allows any origin, without cookies
+    CORS_ORIGINS = [origin for origin in os.getenv('CORS_ORIGINS', '').split(',') if origin] or '*'
     
     # File upload configuration
     UPLOAD_FOLDER = os.path.join(BASE_DIR, os.getenv('UPLOAD_FOLDER', 'static/uploads'))
@@ -41,12 +91,68 @@ class Config:
     # API configuration
     API_PREFIX = os.getenv('API_PREFIX', '/api')
     
-    # Ensure upload folder exists
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    # Bulk memorial import: rows per transaction (one COPY or executemany each)
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+    
+    # Account data export: kept from starving interactive traffic
+    EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', 2))  # per process
+    EXPORT_MAX_BYTES_PER_SECOND = int(os.getenv('EXPORT_MAX_BYTES_PER_SECOND', 5 * 1024 * 1024))
+    EXPORT_RATE_LIMIT = os.getenv('EXPORT_RATE_LIMIT', '5 per hour')  # per client
+    
+    # Name autocomplete: in-process prefix index, pg_trgm fuzzy fallback
+    AUTOCOMPLETE_REFRESH_INTERVAL = float(os.getenv('AUTOCOMPLETE_REFRESH_INTERVAL', 30))  # delta load
+    AUTOCOMPLETE_REBUILD_INTERVAL = float(os.getenv('AUTOCOMPLETE_REBUILD_INTERVAL', 3600))  # full rebuild
+    AUTOCOMPLETE_REFRESH_OVERLAP = float(os.getenv('AUTOCOMPLETE_REFRESH_OVERLAP', 60))  # re-read window
+    AUTOCOMPLETE_FUZZY_THRESHOLD = float(os.getenv('AUTOCOMPLETE_FUZZY_THRESHOLD', 0.3))
+    
+    # Memorial counters: buffered increments, flushed in one statement per interval
+    COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', 5))  # seconds
+    COUNTER_FLUSH_THRESHOLD = int(os.getenv('COUNTER_FLUSH_THRESHOLD', 1000))  # memorials pending
+    
+    # QR codes encode the scan redirect, which records the scan and forwards to the memorial page
+    QR_SCAN_URL = os.getenv('QR_SCAN_URL', 'https://gateofmemory.com/q/{memorial_id}')
+    MEMORIAL_PAGE_URL = os.getenv('MEMORIAL_PAGE_URL', 'https://gateofmemory.com/memorial/{memorial_id}')
+    SCAN_BUFFER_SIZE = int(os.getenv('SCAN_BUFFER_SIZE', 100000))  # scans held per process before dropping
+    SCAN_FLUSH_INTERVAL = float(os.getenv('SCAN_FLUSH_INTERVAL', 1))  # seconds
+    SCAN_AGGREGATE_INTERVAL = float(os.getenv('SCAN_AGGREGATE_INTERVAL', 60))  # seconds
+    
+    # Readiness probe: background DB ping interval and max snapshot age (seconds)
+    HEALTH_REFRESH_INTERVAL = float(os.getenv('HEALTH_REFRESH_INTERVAL', 5))
+    HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', 30))
+    
+    # Logging pipeline: records are queued and written in batches by one thread
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records beyond this are dropped
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 256))
+    LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', 1.0))
+    LOG_SAMPLE_RATES = {'werkzeug': float(os.getenv('LOG_ACCESS_SAMPLE_RATE', 1.0))}  # e.g. 0.1 to keep 10% of access logs
+    
+    # Sampling profiler (opt-in): keeps stacks of requests slower than the threshold
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))  # seconds between samples
+    PROFILER_THRESHOLD_MS = int(os.getenv('PROFILER_THRESHOLD_MS', 500))
+    PROFILER_ENDPOINT_THRESHOLDS = {}  # e.g. {'api.memorialresource': 200}
+    PROFILER_MAX_PROFILES = int(os.getenv('PROFILER_MAX_PROFILES', 50))
+    
+    # Request tracing: OTLP JSON spans written to a file or sent to a collector
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+    TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 1.0))
+    TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'file')  # 'file' or 'otlp'
+    TRACING_FILE = os.path.join(BASE_DIR, os.getenv('TRACING_FILE', 'logs/traces.jsonl'))
+    TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318')
+    TRACING_QUEUE_SIZE = int(os.getenv('TRACING_QUEUE_SIZE', 1000))  # traces beyond this are dropped
+    
+    # Append /* callsite=module:function:line */ to SQL sent to PostgreSQL, so
+    # pg_stat_statements entries can be traced back to code (slow-queries report)
+    SQL_CALLSITE_COMMENTS = os.getenv('SQL_CALLSITE_COMMENTS', 'true').lower() == 'true'
+    
+    # Startup check that the database is at the latest migration:
+    # 'strict' refuses to serve, 'warn' logs, 'off' skips it (database.check_schema)
+    SCHEMA_CHECK = os.getenv('SCHEMA_CHECK', 'strict')
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    SCHEMA_CHECK = os.getenv('SCHEMA_CHECK', 'warn')  # create-db databases have no revision
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -59,10 +165,20 @@ class ProductionConfig(Config):
             raise ValueError("DATABASE_URL environment variable must be set in production")
         return db_url
 
+class TestingConfig(Config):
+    TESTING = True
+    DEBUG = False
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    RATELIMIT_ENABLED = False
+    SCHEMA_CHECK = 'off'
+
 # Select configuration based on environment
 config = {
     'development': DevelopmentConfig(),
     'production': ProductionConfig(),
+    'testing': TestingConfig(),
     'default': DevelopmentConfig()
 }
 
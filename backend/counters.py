@@ -0,0 +1,259 @@
+"""
+Denormalized memorial counters: ``memory_count``, ``image_count`` and
+``qr_view_count`` on the memorial table.
+
+Writers never update the counters directly. Increments are summed per
+memorial in an in-process buffer and written out by a background thread every
+``COUNTER_FLUSH_INTERVAL`` seconds (or sooner once ``COUNTER_FLUSH_THRESHOLD``
+memorials are pending), as one statement for the whole buffer. A hot memorial
+scanned a thousand times between flushes costs one row update, not a
+thousand.
+
+Memory and image counts follow committed ORM writes through session events,
+the same way the autocomplete index does, so rolled-back writes are never
+counted. Code that writes links with Core statements calls ``track()``
+instead. Counts can still drift: a worker killed before it flushes loses its
+buffer, and raw SQL bypasses the events. ``scripts/maintenance.py
+--reconcile-counters`` recomputes the counts and repairs them.
+
+The flush is a plain SQL UPDATE, so it does not bump ``updated_at``.
+"""
+import os
+import logging
+import threading
+from collections import defaultdict
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from models import db, Image, Memorial, Memory
+from background import BackgroundWorker, hold_until_commit
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('memory_count', 'image_count', 'qr_view_count')
+
+_UPDATE = text(
+    "UPDATE memorial SET memory_count = memory_count + :memory_count, "
+    "image_count = image_count + :image_count, "
+    "qr_view_count = qr_view_count + :qr_view_count WHERE id = :id"
+)
+
+
+class CounterBuffer:
+    """Per-process sums of counter increments, keyed by memorial id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(lambda: dict.fromkeys(COLUMNS, 0))
+        self.threshold = None
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def increment(self, memorial_id, column, delta=1):
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown counter '{column}'")
+        with self._lock:
+            self._deltas[memorial_id][column] += delta
+            pending = len(self._deltas)
+        if self.threshold and pending >= self.threshold:
+            flusher.wake()
+
+    def merge(self, deltas):
+        """Add ``{memorial_id: {column: delta}}`` back into the buffer."""
+        with self._lock:
+            for memorial_id, values in deltas.items():
+                for column, delta in values.items():
+                    self._deltas[memorial_id][column] += delta
+
+    def take(self):
+        """Swap the buffer out and return what it held, without zero rows."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(lambda: dict.fromkeys(COLUMNS, 0))
+        return {memorial_id: values for memorial_id, values in deltas.items() if any(values.values())}
+
+    def flush(self, engine):
+        """Write every buffered increment in one transaction.
+
+        Returns:
+            int: Number of memorials updated
+        """
+        deltas = self.take()
+        if not deltas:
+            return 0
+        # Sorted so concurrent flushes from several workers lock rows in the same order
+        rows = [dict(values, id=memorial_id) for memorial_id, values in sorted(deltas.items())]
+        try:
+            with engine.begin() as conn:
+                if conn.dialect.name == 'postgresql':
+                    _update_from_values(conn, rows)
+                else:
+                    conn.execute(_UPDATE, rows)
+        except Exception:
+            # Keep the increments for the next attempt rather than losing them
+            self.merge(deltas)
+            raise
+        return len(rows)
+
+    def reset(self):
+        # Fresh lock too: after a fork, another thread may have held the old one
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(lambda: dict.fromkeys(COLUMNS, 0))
+
+
+def _update_from_values(conn, rows):
+    """One UPDATE ... FROM unnest(arrays) for the whole buffer: four bind
+    parameters however many memorials are pending."""
+    conn.execute(text(
+        "UPDATE memorial AS m SET memory_count = m.memory_count + v.memories, "
+        "image_count = m.image_count + v.images, qr_view_count = m.qr_view_count + v.views "
+        "FROM unnest(CAST(:ids AS integer[]), CAST(:memories AS integer[]), "
+        "CAST(:images AS integer[]), CAST(:views AS integer[])) AS v(id, memories, images, views) "
+        "WHERE m.id = v.id"
+    ), {
+        'ids': [row['id'] for row in rows],
+        'memories': [row['memory_count'] for row in rows],
+        'images': [row['image_count'] for row in rows],
+        'views': [row['qr_view_count'] for row in rows],
+    })
+
+
+counter_buffer = CounterBuffer()
+
+
+# Drift repair (scripts/maintenance.py --reconcile-counters)
+
+_ACTUAL = {
+    'memory_count': '(SELECT count(*) FROM memorial_memories mm WHERE mm.memorial_id = memorial.id)',
+    'image_count': '(SELECT count(*) FROM image i WHERE i.memorial_id = memorial.id)',
+}
+_DRIFTED = ' OR '.join(f'{column} <> {actual}' for column, actual in _ACTUAL.items())
+
+
+def reconcile(engine, batch_size=5000, fix=True):
+    """Recompute memory and image counts and repair the rows that drifted.
+
+    Works through memorial in id ranges of ``batch_size``, one short
+    transaction each, with set-based statements. QR view counts have no
+    source to recompute from and are left alone. Increments still buffered in
+    running workers are not visible here; a row repaired while one is pending
+    is off by that increment until the next run.
+
+    Returns:
+        dict: ``checked`` memorials and ``drifted`` ones (repaired if ``fix``)
+    """
+    with engine.connect() as conn:
+        low, high = conn.execute(text('SELECT min(id), max(id) FROM memorial')).one()
+    result = {'checked': 0, 'drifted': 0}
+    if low is None:
+        return result
+
+    bounds = 'id >= :low AND id < :high'
+    count = text(f'SELECT count(*), count(CASE WHEN {_DRIFTED} THEN 1 END) FROM memorial WHERE {bounds}')
+    repair = text(f"UPDATE memorial SET {', '.join(f'{c} = {a}' for c, a in _ACTUAL.items())} "
+                  f'WHERE {bounds} AND ({_DRIFTED})')
+    for start in range(low, high + 1, batch_size):
+        params = {'low': start, 'high': start + batch_size}
+        with engine.begin() as conn:
+            checked, drifted = conn.execute(count, params).one()
+            if drifted and fix:
+                drifted = conn.execute(repair, params).rowcount
+        result['checked'] += checked
+        result['drifted'] += drifted
+    return result
+
+
+def record_view(memorial_id, count=1):
+    """Count QR views of a memorial; written out on the next flush."""
+    counter_buffer.increment(memorial_id, 'qr_view_count', count)
+    flusher.start()
+
+
+def track(session, memorial_id, column, delta=1):
+    """Buffer a counter change once ``session`` commits (for Core writes)."""
+    pending = session.info.setdefault('counter_pending', defaultdict(int))
+    pending[memorial_id, column] += delta
+
+
+# Background flusher, started in each process on its first increment (workers
+# forked from a preloaded master start their own)
+
+def _flush():
+    counter_buffer.flush(db.engine)
+
+
+flusher = BackgroundWorker('counter-flusher', _flush, at_exit=_flush)
+
+
+def init_counters(app):
+    """Flush buffered counter increments in the background for ``app``."""
+    flusher.init_app(app, app.config.get('COUNTER_FLUSH_INTERVAL', 5))
+    counter_buffer.threshold = app.config.get('COUNTER_FLUSH_THRESHOLD', 1000)
+
+
+# A forked worker must not flush increments buffered by its parent
+os.register_at_fork(after_in_child=counter_buffer.reset)
+
+
+# Memory and image counts: record changes at flush time, buffer them only
+# once the transaction commits.
+
+def _link_changes(obj, attr, pair):
+    history = inspect(obj).attrs[attr].history
+    for other in history.added:
+        yield pair(obj, other), 1
+    for other in history.deleted:
+        yield pair(obj, other), -1
+
+
+@event.listens_for(Session, 'before_flush')
+def _record_deleted_memories(session, flush_context, instances):
+    # The links of a deleted memory are gone by after_flush; read them now
+    for obj in session.deleted:
+        if isinstance(obj, Memory):
+            pending = session.info.setdefault('counter_pending', defaultdict(int))
+            for memorial in obj.memorials:
+                pending[memorial.id, 'memory_count'] -= 1
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_counter_changes(session, flush_context):
+    links = {}
+    images = defaultdict(int)
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Memorial):
+            links.update(_link_changes(obj, 'memories', lambda m, o: (m.id, o.id)))
+        elif isinstance(obj, Memory):
+            links.update(_link_changes(obj, 'memorials', lambda m, o: (o.id, m.id)))
+    for obj in session.new:
+        if isinstance(obj, Image):
+            images[obj.memorial_id] += 1
+    for obj in session.dirty:
+        if isinstance(obj, Image):
+            # An image moved to another memorial
+            history = inspect(obj).attrs.memorial_id.history
+            for memorial_id in history.added:
+                images[memorial_id] += 1
+            for memorial_id in history.deleted:
+                images[memorial_id] -= 1
+    for obj in session.deleted:
+        if isinstance(obj, Image):
+            images[obj.memorial_id] -= 1
+    if not links and not images:
+        return
+
+    pending = session.info.setdefault('counter_pending', defaultdict(int))
+    # A link changed from both sides (backref) appears once in ``links``
+    for (memorial_id, _), delta in links.items():
+        pending[memorial_id, 'memory_count'] += delta
+    for memorial_id, delta in images.items():
+        pending[memorial_id, 'image_count'] += delta
+
+
+def _buffer_counter_changes(pending):
+    for (memorial_id, column), delta in pending.items():
+        if delta:
+            counter_buffer.increment(memorial_id, column, delta)
+    flusher.start()
+
+
+hold_until_commit('counter_pending', _buffer_counter_changes)
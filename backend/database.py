@@ -65,7 +65,7 @@ def run_migrations(app):
 
 def check_database_connection():
     """Check if the database connection is working."""
-    from app import db
+    from models import db
     
     try:
         db.session.execute(text('SELECT 1'))
@@ -135,3 +135,61 @@ def reset_database(app):
         except Exception as e:
             current_app.logger.error(f'Error resetting database: {str(e)}')
             return False, f'Error resetting database: {str(e)}'
+
+# Startup schema gate
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+class SchemaOutOfDate(RuntimeError):
+    """The database is not at the revision the migrations in this release end at."""
+
+def migration_heads(directory=MIGRATIONS_DIR):
+    """Head revisions of the migration scripts, read from disk."""
+    from alembic.script import ScriptDirectory
+    return set(ScriptDirectory(directory).get_heads())
+
+def database_revisions(engine):
+    """Revisions recorded in the database's ``alembic_version`` table."""
+    from alembic.runtime.migration import MigrationContext
+    with engine.connect() as conn:
+        return set(MigrationContext.configure(conn).get_current_heads())
+
+def check_schema(app):
+    """Refuse to serve ``app`` from a database that is not fully migrated.
+    
+    Called once by the process that loads the app (wsgi.py), which under
+    Gunicorn's ``preload_app`` is the master: workers fork from it without
+    touching the catalog, and no request ever waits on a schema check or
+    DDL. Migrations are applied before the deployment starts
+    (``flask db upgrade``), never by the app itself.
+    
+    ``SCHEMA_CHECK`` is ``strict`` (raise SchemaOutOfDate), ``warn`` (log and
+    serve anyway) or ``off``.
+    
+    Returns:
+        set: The database's revisions, or None if the check is off
+    """
+    from models import db
+    
+    mode = app.config.get('SCHEMA_CHECK', 'strict')
+    if mode == 'off':
+        return None
+    
+    heads = migration_heads()
+    with app.app_context():
+        try:
+            current = database_revisions(db.engine)
+        finally:
+            # Forked workers open their own connections
+            db.engine.dispose()
+    
+    if current == heads:
+        app.logger.info(f"Database schema is at {', '.join(sorted(heads))}")
+        return current
+    
+    message = (f"Database schema is at {', '.join(sorted(current)) or 'no revision'} but this release "
+               f"expects {', '.join(sorted(heads))}: run 'flask db upgrade' before starting the app")
+    if mode == 'strict':
+        raise SchemaOutOfDate(message)
+    app.logger.warning(message)
+    return current
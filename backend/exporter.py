@@ -0,0 +1,212 @@
+"""
+Streaming export of a user's memorials, memories and images.
+
+Records are read through server-side cursors (``stream_results`` with
+``yield_per``) and written out one at a time, either as NDJSON or as a ZIP
+holding ``data.ndjson`` plus the original image files. Memory use stays
+constant however large the account is. Rows are built from plain Core rows
+rather than ``to_dict()``, so no relationship is ever loaded.
+
+Exports are throttled so they cannot starve interactive traffic:
+- ``EXPORT_MAX_CONCURRENT`` exports at a time per process, each holding one
+  pooled connection for its duration (further requests get a 429)
+- ``EXPORT_MAX_BYTES_PER_SECOND`` paces each stream
+- ``EXPORT_RATE_LIMIT`` per client, applied by the API resource
+"""
+import os
+import json
+import time
+import zipfile
+import logging
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from models import db, User, Memorial, Memory, Image, MemoryImage, memorial_memories
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'zip')
+YIELD_PER = 500
+FILE_CHUNK_SIZE = 256 * 1024
+
+_slots = {}  # max concurrent -> BoundedSemaphore, per process
+_slots_lock = threading.Lock()
+
+
+def acquire_slot():
+    """Reserve an export slot without blocking.
+
+    Returns:
+        The semaphore to release when the export ends, or None when all
+        ``EXPORT_MAX_CONCURRENT`` slots are busy
+    """
+    limit = current_app.config.get('EXPORT_MAX_CONCURRENT', 2)
+    with _slots_lock:
+        semaphore = _slots.setdefault(limit, threading.BoundedSemaphore(limit))
+    return semaphore if semaphore.acquire(blocking=False) else None
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _record(kind, row, columns):
+    record = {'type': kind}
+    record.update((column, _value(getattr(row, column))) for column in columns)
+    return record
+
+
+def _stream(conn, statement):
+    return conn.execution_options(stream_results=True, yield_per=YIELD_PER).execute(statement)
+
+
+def iter_records(conn, user_id):
+    """Yield export records for one user, memorial by memorial.
+
+    Memories linked to several of the user's memorials appear once per
+    memorial, each with its ``memorial_id``.
+    """
+    user = conn.execute(select(User.id, User.username, User.email, User.created_at)
+                        .where(User.id == user_id)).first()
+    if user is None:
+        return
+    yield _record('user', user, ('id', 'username', 'email', 'created_at'))
+
+    memorial_columns = ('id', 'title', 'subtitle', 'name', 'birth_date', 'death_date', 'biography',
+                        'religion', 'is_public', 'created_at', 'updated_at')
+    yield from (_record('memorial', row, memorial_columns) for row in _stream(conn,
+        select(*(getattr(Memorial, c) for c in memorial_columns))
+        .where(Memorial.user_id == user_id).order_by(Memorial.id)))
+
+    yield from (_record('image', row, ('id', 'memorial_id', 'filename', 'caption', 'is_profile', 'created_at'))
+                for row in _stream(conn, select(
+                    Image.id, Image.memorial_id, Image.filename, Image.caption, Image.is_profile, Image.created_at
+                ).join(Memorial, Memorial.id == Image.memorial_id)
+                 .where(Memorial.user_id == user_id).order_by(Image.memorial_id, Image.id)))
+
+    yield from (_record('memory', row, ('id', 'memorial_id', 'title', 'content', 'created_at', 'updated_at'))
+                for row in _stream(conn, select(
+                    Memory.id, memorial_memories.c.memorial_id, Memory.title, Memory.content,
+                    Memory.created_at, Memory.updated_at
+                ).join(memorial_memories, memorial_memories.c.memory_id == Memory.id)
+                 .join(Memorial, Memorial.id == memorial_memories.c.memorial_id)
+                 .where(Memorial.user_id == user_id)
+                 .order_by(memorial_memories.c.memorial_id, Memory.id)))
+
+    yield from (_record('memory_image', row, ('id', 'memory_id', 'filename', 'caption', 'created_at'))
+                for row in _stream(conn, _memory_images(user_id)))
+
+
+def _memory_images(user_id):
+    # IN rather than a join, so a memory shared by two of the user's memorials
+    # has its images exported once
+    return select(
+        MemoryImage.id, MemoryImage.memory_id, MemoryImage.filename, MemoryImage.caption, MemoryImage.created_at
+    ).where(MemoryImage.memory_id.in_(
+        select(memorial_memories.c.memory_id)
+        .join(Memorial, Memorial.id == memorial_memories.c.memorial_id)
+        .where(Memorial.user_id == user_id)
+    )).order_by(MemoryImage.id)
+
+
+def _image_files(conn, user_id):
+    """Yield ``(archive name, filename)`` for every image file of the user."""
+    for (filename,) in _stream(conn, select(Image.filename)
+                               .join(Memorial, Memorial.id == Image.memorial_id)
+                               .where(Memorial.user_id == user_id).order_by(Image.id)):
+        yield f'images/{filename}', filename
+    for row in _stream(conn, _memory_images(user_id)):
+        yield f'memory_images/{row.filename}', row.filename
+
+
+def _ndjson_chunks(conn, user_id):
+    buffer = []
+    size = 0
+    for record in iter_records(conn, user_id):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= FILE_CHUNK_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+class _ZipSink:
+    """Unseekable file object that collects ZIP output for the generator to drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _zip_chunks(conn, user_id, upload_folder):
+    sink = _ZipSink()
+    # zipfile writes data descriptors instead of seeking back when the sink is unseekable
+    with zipfile.ZipFile(sink, 'w') as archive:
+        info = zipfile.ZipInfo('data.ndjson', time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, 'w', force_zip64=True) as entry:
+            for chunk in _ndjson_chunks(conn, user_id):
+                entry.write(chunk)
+                yield sink.drain()
+
+        for arcname, filename in _image_files(conn, user_id):
+            path = os.path.join(upload_folder, os.path.basename(filename))
+            try:
+                source = open(path, 'rb')
+            except OSError:
+                logger.warning(f"Export: image file missing: {filename}")
+                continue
+            with source:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = zipfile.ZIP_STORED  # images are already compressed
+                with archive.open(info, 'w', force_zip64=True) as entry:
+                    for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b''):
+                        entry.write(chunk)
+                        yield sink.drain()
+    yield sink.drain()
+
+
+def export_user(user_id, fmt='ndjson', engine=None):
+    """Generate the export for ``user_id`` as a stream of byte chunks.
+
+    Runs inside the caller's app context (use ``stream_with_context``).
+    """
+    config = current_app.config
+    max_rate = config.get('EXPORT_MAX_BYTES_PER_SECOND', 5 * 1024 * 1024)
+    engine = engine or db.engine
+    started = time.monotonic()
+    sent = 0
+    with engine.connect() as conn:
+        chunks = (_zip_chunks(conn, user_id, config['UPLOAD_FOLDER']) if fmt == 'zip'
+                  else _ndjson_chunks(conn, user_id))
+        for chunk in chunks:
+            if not chunk:
+                continue
+            sent += len(chunk)
+            yield chunk
+            if max_rate:
+                # Sleep off any lead over the allowed rate
+                ahead = sent / max_rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+    logger.info(f"Export of user {user_id} ({fmt}): {sent} bytes in "
+                f"{time.monotonic() - started:.1f}s")
+
+
+def export_filename(user_id, fmt):
+    return f"gate-of-memory-export-{user_id}-{datetime.utcnow():%Y%m%d}.{fmt}"
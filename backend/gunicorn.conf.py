@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for the Gate of Memory backend.
+
+Gunicorn reads this file from the working directory, so from ``backend/``::
+
+    gunicorn wsgi:application
+
+The app is imported and built once, in the master, and workers are forked
+from it (``preload_app``): they skip the imports and share the master's
+memory pages until they write to them. ``GUNICORN_PRELOAD=false`` builds the
+app in every worker instead, which allows ``--reload`` during development.
+
+The cyclic garbage collector writes to the header of every object it
+scans, which would copy the shared pages into each worker one by one.
+Freezing it before each fork moves everything the master built into a
+generation the collector never scans.
+"""
+import gc
+import os
+
+from config import web_concurrency, worker_threads
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = web_concurrency()
+threads = worker_threads()  # both also size the DB pools (config.engine_options)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # Connections opened by the master must not be shared by the workers:
+    # forget them (without closing the parent's sockets) and open new ones.
+    from wsgi import application
+    from models import db
+    with application.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # The master never starts the readiness refresher; each worker starts its
+    # own now rather than on the first probe
+    application.extensions['health'].start()
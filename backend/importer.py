@@ -0,0 +1,277 @@
+"""
+Bulk memorial import from CSV or NDJSON.
+
+Rows are parsed and validated one at a time as the input is read, so memory
+use depends on the batch size, not the file size. Valid rows are written in
+batches of ``IMPORT_BATCH_SIZE``, each in its own transaction: with COPY on
+PostgreSQL, with a single executemany INSERT elsewhere. A row that fails
+validation is reported with its line number and skipped. If the database
+rejects a batch, that batch is retried row by row under savepoints, so only
+the offending rows are lost.
+
+The inserts bypass the ORM, so the autocomplete index picks the new
+memorials up on its next delta load rather than immediately.
+"""
+import io
+import csv
+import json
+import time
+import logging
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Memorial, User
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+
+# Columns written by the importer, in COPY order
+COLUMNS = ('title', 'subtitle', 'name', 'birth_date', 'death_date', 'biography',
+           'religion', 'is_public', 'user_id', 'created_at', 'updated_at')
+
+_TRUE = {'1', 'true', 't', 'yes', 'y'}
+_FALSE = {'0', 'false', 'f', 'no', 'n', ''}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported."""
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the input format from a file name or content type, default CSV."""
+    hint = f'{filename or ""} {content_type or ""}'.lower()
+    return 'ndjson' if 'ndjson' in hint or 'jsonl' in hint or 'json' in hint else 'csv'
+
+
+def iter_rows(stream, fmt):
+    """Yield ``(line_number, row)`` pairs from a text stream.
+
+    Unparseable NDJSON lines are yielded as ``(line_number, RowError)`` so
+    the caller can report them and carry on.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowError('Each line must be a JSON object')
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def _text(row, field, max_length=None, required=False):
+    value = row.get(field)
+    if value is not None and not isinstance(value, str):
+        value = str(value)
+    value = value.strip() if value else None
+    if required and not value:
+        raise RowError(f'{field} is required')
+    if value and max_length and len(value) > max_length:
+        raise RowError(f'{field} is longer than {max_length} characters')
+    return value or None
+
+
+def _date(row, field):
+    value = row.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        raise RowError(f'{field} must be an ISO date (YYYY-MM-DD)')
+
+
+def _bool(row, field, default):
+    value = row.get(field)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return default if value == '' else False
+    raise RowError(f'{field} must be true or false')
+
+
+def validate_row(row, user_id=None, now=None):
+    """Turn a raw CSV/NDJSON row into column values for the memorial table.
+
+    Args:
+        row: Mapping of field name to raw value
+        user_id: Owner for rows that do not name one
+        now: Timestamp for created_at/updated_at
+
+    Raises:
+        RowError: If the row is invalid
+    """
+    values = {
+        'title': _text(row, 'title', 200, required=True),
+        'subtitle': _text(row, 'subtitle', 200),
+        'name': _text(row, 'name', 200, required=True),
+        'birth_date': _date(row, 'birth_date'),
+        'death_date': _date(row, 'death_date'),
+        'biography': _text(row, 'biography'),
+        'religion': _text(row, 'religion', 50) or 'christian',
+        'is_public': _bool(row, 'is_public', True),
+    }
+    if values['birth_date'] and values['death_date'] and values['death_date'] < values['birth_date']:
+        raise RowError('death_date is before birth_date')
+
+    owner = row.get('user_id') or user_id
+    try:
+        values['user_id'] = int(owner)
+    except (TypeError, ValueError):
+        raise RowError('user_id is required' if owner in (None, '') else 'user_id must be an integer')
+
+    values['created_at'] = values['updated_at'] = now or datetime.utcnow()
+    return values
+
+
+class ImportResult:
+    """Counts and per-row errors for one import run."""
+
+    def __init__(self, max_errors=1000):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.imported / seconds) if seconds else None,
+        }
+
+
+def _copy(conn, rows):
+    """Write rows with COPY FROM STDIN on a psycopg2 connection."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for values in rows:
+        # None becomes an unquoted empty field, which COPY reads as NULL;
+        # validate_row never produces empty strings
+        writer.writerow([values[col] for col in COLUMNS])
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY memorial ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_batch(engine, batch, result):
+    """Insert one batch of ``(line, values)`` in its own transaction."""
+    rows = [values for _, values in batch]
+    use_copy = engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2'
+    try:
+        with engine.begin() as conn:
+            if use_copy:
+                _copy(conn, rows)
+            else:
+                conn.execute(Memorial.__table__.insert(), rows)
+        result.imported += len(rows)
+        return
+    except (SQLAlchemyError, engine.dialect.loaded_dbapi.Error) as e:
+        # COPY runs on the raw cursor, so its errors arrive unwrapped
+        logger.warning(f"Import batch of {len(rows)} rows failed, retrying row by row: {e}")
+
+    # Isolate the rows the database rejects; the rest of the batch still lands
+    with engine.begin() as conn:
+        for line, values in batch:
+            try:
+                with conn.begin_nested():
+                    conn.execute(Memorial.__table__.insert(), values)
+                result.imported += 1
+            except SQLAlchemyError as e:
+                result.error(line, str(getattr(e, 'orig', e)).strip().splitlines()[0])
+
+
+def _missing_users(engine, user_ids):
+    if not user_ids:
+        return set()
+    with engine.connect() as conn:
+        found = set(conn.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+    return set(user_ids) - found
+
+
+def import_memorials(stream, fmt='csv', user_id=None, batch_size=None, dry_run=False, max_errors=1000):
+    """Import memorials from a text stream of CSV or NDJSON rows.
+
+    Args:
+        stream: Text file-like object
+        fmt: ``'csv'`` or ``'ndjson'``
+        user_id: Owner for rows without a ``user_id`` column
+        batch_size: Rows per transaction (defaults to ``IMPORT_BATCH_SIZE``)
+        dry_run: Validate only, write nothing
+        max_errors: Per-row errors to keep in the report; all are counted
+
+    Returns:
+        ImportResult: Imported and failed counts, with per-row errors
+    """
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 5000)
+    engine = db.engine
+    result = ImportResult(max_errors)
+    known_users = set()
+    now = datetime.utcnow()
+    batch = []
+
+    def flush():
+        # One IN query per batch checks every owner, instead of relying on the
+        # foreign key to fail the batch and fall back to row-by-row inserts
+        unknown = _missing_users(engine, {v['user_id'] for _, v in batch} - known_users)
+        known_users.update(v['user_id'] for _, v in batch if v['user_id'] not in unknown)
+        valid = []
+        for line, values in batch:
+            if values['user_id'] in unknown:
+                result.error(line, f"user {values['user_id']} does not exist")
+            else:
+                valid.append((line, values))
+        if dry_run:
+            result.imported += len(valid)
+        elif valid:
+            _insert_batch(engine, valid, result)
+        batch.clear()
+
+    for line, row in iter_rows(stream, fmt):
+        if isinstance(row, RowError):
+            result.error(line, str(row))
+            continue
+        try:
+            batch.append((line, validate_row(row, user_id, now)))
+        except RowError as e:
+            result.error(line, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    logger.info(f"Memorial import{' (dry run)' if dry_run else ''}: "
+                f"{result.imported} imported, {result.failed} failed")
+    return result
@@ -14,6 +14,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # Import the app after the path is set
 from app import create_app, db
 from models import User, Memorial, Memory, Image as ImageModel, MemoryImage
+from importer import import_memorials, detect_format, FORMATS
 
 # Create the Flask application
 app = create_app()
@@ -75,6 +76,40 @@ def upgrade_database():
         upgrade()
         click.echo("Database upgraded to latest migration.")
 
+@app.cli.command("check-schema")
+def check_schema_command():
+    """Check that the database is at the latest migration."""
+    from database import migration_heads, database_revisions
+    heads = migration_heads()
+    with app.app_context():
+        current = database_revisions(db.engine)
+    click.echo(f"Database revision: {', '.join(sorted(current)) or 'none'}")
+    click.echo(f"Latest migration:  {', '.join(sorted(heads))}")
+    if current != heads:
+        click.echo("Schema is out of date: run 'flask db upgrade'", err=True)
+        sys.exit(1)
+
+@app.cli.command("import-memorials")
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Input format (default: from the file extension)')
+@click.option('--user-id', type=int, help='Owner for rows without a user_id column')
+@click.option('--batch-size', type=int, help='Rows per transaction (default: IMPORT_BATCH_SIZE)')
+@click.option('--dry-run', is_flag=True, help='Validate every row without writing anything')
+def import_memorials_command(path, fmt, user_id, batch_size, dry_run):
+    """Bulk import memorials from a CSV or NDJSON file ('-' for stdin)."""
+    with app.app_context(), click.open_file(path, encoding='utf-8-sig', newline='') as stream:
+        result = import_memorials(stream, fmt or detect_format(path), user_id=user_id,
+                                  batch_size=batch_size, dry_run=dry_run).to_dict()
+    for error in result['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    if result['errors_truncated']:
+        click.echo(f"... {result['failed'] - len(result['errors'])} more errors", err=True)
+    click.echo(f"{'Validated' if dry_run else 'Imported'} {result['imported']} memorials, "
+               f"{result['failed']} rows failed in {result['seconds']}s "
+               f"({result['rows_per_second']} rows/s)")
+    if result['failed']:
+        sys.exit(1)
+
 if __name__ == '__main__':
     app.cli()
 
@@ -0,0 +1,85 @@
+"""
+Create the base tables.
+
+The schema as it stood before migrations were introduced: user, memorial,
+image, memory, memory_image and the memorial_memories association. Every
+later revision builds on it, so ``flask db upgrade`` brings an empty
+database to the current schema.
+
+Databases created earlier with ``db.create_all()`` already have these
+tables and no ``alembic_version``. Record this revision without running it,
+then apply the rest:
+
+    flask db stamp 9c1e5b7a3d20
+    flask db upgrade
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = '9c1e5b7a3d20'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Create the tables, parents first."""
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(length=80), nullable=False, unique=True),
+        sa.Column('email', sa.String(length=120), nullable=False, unique=True),
+        sa.Column('password_hash', sa.String(length=256), nullable=False),
+        sa.Column('is_admin', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_table(
+        'memorial',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('subtitle', sa.String(length=200)),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('birth_date', sa.Date()),
+        sa.Column('death_date', sa.Date()),
+        sa.Column('biography', sa.Text()),
+        sa.Column('religion', sa.String(length=50)),
+        sa.Column('is_public', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+    )
+    op.create_table(
+        'image',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('caption', sa.String(length=255)),
+        sa.Column('is_profile', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('memorial_id', sa.Integer(), sa.ForeignKey('memorial.id'), nullable=False),
+    )
+    op.create_table(
+        'memory',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+    op.create_table(
+        'memory_image',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('caption', sa.String(length=255)),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('memory_id', sa.Integer(), sa.ForeignKey('memory.id'), nullable=False),
+    )
+    op.create_table(
+        'memorial_memories',
+        sa.Column('memorial_id', sa.Integer(), sa.ForeignKey('memorial.id'), primary_key=True),
+        sa.Column('memory_id', sa.Integer(), sa.ForeignKey('memory.id'), primary_key=True),
+    )
+
+def downgrade():
+    """Drop the tables, children first."""
+    for table in ('memorial_memories', 'memory_image', 'memory', 'image', 'memorial', 'user'):
+        op.drop_table(table)
@@ -0,0 +1,75 @@
+"""
+Add foreign-key and filter indexes.
+
+Covers the filters used by MemorialListResource.get (user_id, is_public,
+religion, newest first), ImageListResource.get (memorial_id), the memory
+lookups through memorial_memories.memory_id, and memory image loading.
+
+On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY so that
+writes to these tables are not blocked while they build. CONCURRENTLY cannot
+run inside a transaction, hence the autocommit block. Other dialects (SQLite
+in development) get plain CREATE INDEX.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = 'a1f3c9d2e7b4'
+down_revision = '9c1e5b7a3d20'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ('idx_memorial_user_id', 'memorial', ['user_id'], None),
+    ('idx_memorial_is_public_created_at', 'memorial', ['is_public', 'created_at'], None),
+    ('idx_memorial_religion_created_at', 'memorial', ['religion', 'created_at'], None),
+    ('idx_image_memorial_id', 'image', ['memorial_id'], None),
+    ('idx_image_memorial_id_profile', 'image', ['memorial_id'], 'is_profile'),
+    ('idx_memory_image_memory_id', 'memory_image', ['memory_id'], None),
+    ('idx_memorial_memories_memory_id', 'memorial_memories', ['memory_id'], None),
+]
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+def upgrade():
+    """Create the indexes without blocking writes."""
+    if not _is_postgresql():
+        for name, table, columns, where in INDEXES:
+            kwargs = {'sqlite_where': sa.text(f'{where} = 1')} if where else {}
+            op.create_index(name, table, columns, if_not_exists=True, **kwargs)
+        return
+    
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            # A failed concurrent build leaves an INVALID index behind; drop it
+            # so that IF NOT EXISTS does not skip the rebuild
+            if _is_invalid(name):
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+            cols = ', '.join(columns)
+            predicate = f' WHERE {where}' if where else ''
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                       f'ON "{table}" ({cols}){predicate}')
+    
+    # Refresh planner statistics so the new indexes are picked up right away
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f'ANALYZE "{table}"')
+
+def downgrade():
+    """Drop the indexes without blocking writes."""
+    if not _is_postgresql():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
+        return
+    
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+def _is_invalid(name):
+    """Whether a previous concurrent build of ``name`` was left INVALID."""
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {'name': name}).scalar())
@@ -0,0 +1,89 @@
+"""
+Add full-text search columns to memorial and memory.
+
+Adds a weighted ``search_vector`` tsvector column to each table, kept up to
+date by a BEFORE INSERT/UPDATE trigger, and a GIN index built CONCURRENTLY.
+A generated column would rewrite the whole table under an exclusive lock,
+so instead the new column is nullable (a catalog-only change) and existing
+rows are backfilled in committed batches.
+
+PostgreSQL only: SQLite databases get FTS5 tables from db.create_all().
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = 'b7d2e4f1c8a3'
+down_revision = 'a1f3c9d2e7b4'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# table: [(column, weight), ...] -- keep in sync with models.SEARCH_DOCUMENTS
+DOCUMENTS = {
+    'memorial': [('name', 'A'), ('title', 'B'), ('subtitle', 'B'), ('biography', 'C')],
+    'memory': [('title', 'A'), ('content', 'B')],
+}
+
+def _vector(columns, prefix=''):
+    return ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce({prefix}{col}, '')), '{weight}')"
+        for col, weight in columns
+    )
+
+def upgrade():
+    """Add the columns and triggers, backfill in batches, then index."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    for table, columns in DOCUMENTS.items():
+        names = ', '.join(col for col, _ in columns)
+        op.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector')
+        op.execute(
+            f'CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$ '
+            f'BEGIN NEW.search_vector := {_vector(columns, "NEW.")}; RETURN NEW; END $$ LANGUAGE plpgsql'
+        )
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        op.execute(
+            f'CREATE TRIGGER {table}_search_vector_trigger BEFORE INSERT OR UPDATE OF {names} '
+            f'ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()'
+        )
+    
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        for table, columns in DOCUMENTS.items():
+            # Backfill by primary key range so each batch is a short transaction
+            max_id = bind.execute(sa.text(f'SELECT coalesce(max(id), 0) FROM {table}')).scalar()
+            for start in range(0, max_id + 1, BATCH_SIZE):
+                bind.execute(sa.text(
+                    f'UPDATE {table} SET search_vector = {_vector(columns)} '
+                    f'WHERE id >= :start AND id < :end AND search_vector IS NULL'
+                ), {'start': start, 'end': start + BATCH_SIZE})
+            
+            if _is_invalid(f'idx_{table}_search_vector'):
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS idx_{table}_search_vector')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_{table}_search_vector '
+                       f'ON {table} USING GIN (search_vector)')
+            op.execute(f'ANALYZE {table}')
+
+def downgrade():
+    """Drop the indexes, triggers, functions and columns."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    with op.get_context().autocommit_block():
+        for table in DOCUMENTS:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS idx_{table}_search_vector')
+    
+    for table in DOCUMENTS:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        op.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update()')
+        op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+
+def _is_invalid(name):
+    """Whether a previous concurrent build of ``name`` was left INVALID."""
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {'name': name}).scalar())
@@ -0,0 +1,67 @@
+"""
+Add indexes for memorial name autocomplete.
+
+``idx_memorial_name_trgm`` is a pg_trgm GIN index on memorial.name that
+serves the fuzzy ``name % :query`` fallback. ``idx_memorial_updated_at``
+serves the periodic delta load of the in-process prefix index, which would
+otherwise scan the whole table on every worker every refresh interval.
+
+Both indexes are built CONCURRENTLY on PostgreSQL. The trigram index is
+skipped when the server does not ship pg_trgm (it is part of contrib); the
+fuzzy fallback is then disabled. Other dialects only get the updated_at index.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = 'c4e8a1b6d2f9'
+down_revision = 'b7d2e4f1c8a3'
+branch_labels = None
+depends_on = None
+
+# (name, index definition)
+INDEXES = [
+    ('idx_memorial_updated_at', 'ON memorial (updated_at)'),
+    ('idx_memorial_name_trgm', 'ON memorial USING GIN (name gin_trgm_ops)'),
+]
+
+def upgrade():
+    """Enable pg_trgm and build the indexes without blocking writes."""
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('idx_memorial_updated_at', 'memorial', ['updated_at'], if_not_exists=True)
+        return
+    
+    indexes = INDEXES
+    if _trigram_available():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    else:
+        indexes = [index for index in INDEXES if index[0] != 'idx_memorial_name_trgm']
+    
+    with op.get_context().autocommit_block():
+        for name, definition in indexes:
+            if _is_invalid(name):
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}')
+    op.execute('ANALYZE memorial')
+
+def downgrade():
+    """Drop the indexes; the pg_trgm extension is left installed."""
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('idx_memorial_updated_at', table_name='memorial', if_exists=True)
+        return
+    
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+def _trigram_available():
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )).scalar())
+
+def _is_invalid(name):
+    """Whether a previous concurrent build of ``name`` was left INVALID."""
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {'name': name}).scalar())
@@ -0,0 +1,49 @@
+"""
+Add denormalized counters to memorial.
+
+``memory_count``, ``image_count`` and ``qr_view_count`` are kept up to date
+by counters.py. The columns are added with a constant server default, which
+PostgreSQL 11+ records in the catalog without rewriting the table. Existing
+counts are then backfilled in id ranges, each in its own transaction, so no
+long lock is held on memorial while the counts are computed.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = 'd5f2a9c3e7b1'
+down_revision = 'c4e8a1b6d2f9'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('memory_count', 'image_count', 'qr_view_count')
+
+# Memorials per backfill transaction
+BATCH_SIZE = 5000
+
+BACKFILL = sa.text(
+    "UPDATE memorial SET "
+    "memory_count = (SELECT count(*) FROM memorial_memories mm WHERE mm.memorial_id = memorial.id), "
+    "image_count = (SELECT count(*) FROM image i WHERE i.memorial_id = memorial.id) "
+    "WHERE id >= :low AND id < :high"
+)
+
+def upgrade():
+    """Add the counter columns and backfill memory and image counts."""
+    for column in COLUMNS:
+        op.add_column('memorial', sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+    
+    bind = op.get_bind()
+    low, high = bind.execute(sa.text('SELECT min(id), max(id) FROM memorial')).one()
+    if low is None:
+        return
+    # Autocommit: each batch UPDATE commits on its own
+    with op.get_context().autocommit_block():
+        for start in range(low, high + 1, BATCH_SIZE):
+            bind.execute(BACKFILL, {'low': start, 'high': start + BATCH_SIZE})
+
+def downgrade():
+    """Drop the counter columns."""
+    with op.batch_alter_table('memorial') as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column)
@@ -0,0 +1,40 @@
+"""
+Add QR scan analytics tables.
+
+``qr_scan`` stages individual scans written in bulk by the redirect's
+background writer. It is UNLOGGED on PostgreSQL: no WAL, and emptied after a
+crash, which only loses scans not yet aggregated. ``qr_scan_hourly`` holds
+the per-memorial hourly totals the staged scans are rolled up into; its
+primary key serves both the aggregation upsert and per-memorial reads.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic.
+revision = 'e8b3c6d1f4a2'
+down_revision = 'd5f2a9c3e7b1'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Create the staging and hourly tables."""
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    op.create_table(
+        'qr_scan',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True),
+        sa.Column('memorial_id', sa.Integer(), nullable=False),
+        sa.Column('scanned_at', sa.DateTime(), nullable=False),
+        prefixes=['UNLOGGED'] if postgresql else [],
+    )
+    op.create_table(
+        'qr_scan_hourly',
+        sa.Column('memorial_id', sa.Integer(), sa.ForeignKey('memorial.id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('hour', sa.DateTime(), primary_key=True),
+        sa.Column('scans', sa.Integer(), nullable=False),
+    )
+
+def downgrade():
+    """Drop the tables; staged scans that were not aggregated are lost."""
+    op.drop_table('qr_scan_hourly')
+    op.drop_table('qr_scan')
@@ -1,15 +1,19 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from werkzeug.security import generate_password_hash, check_password_hash
 from config import Config
+from routing import RoutingSession
 
-# Initialize SQLAlchemy
-db = SQLAlchemy()
+# Initialize SQLAlchemy; reads may be routed to replicas (see routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Association table for many-to-many relationship between Memorial and Memory
+# (the primary key covers lookups by memorial_id; memory_id needs its own index)
 memorial_memories = db.Table('memorial_memories',
     db.Column('memorial_id', db.Integer, db.ForeignKey('memorial.id'), primary_key=True),
-    db.Column('memory_id', db.Integer, db.ForeignKey('memory.id'), primary_key=True)
+    db.Column('memory_id', db.Integer, db.ForeignKey('memory.id'), primary_key=True),
+    db.Index('idx_memorial_memories_memory_id', 'memory_id')
 )
 
 class User(db.Model):
@@ -35,6 +39,12 @@ class User(db.Model):
 class Memorial(db.Model):
     """Memorial model to store memorial information"""
     __tablename__ = 'memorial'
+    __table_args__ = (
+        db.Index('idx_memorial_user_id', 'user_id'),
+        db.Index('idx_memorial_is_public_created_at', 'is_public', 'created_at'),
+        db.Index('idx_memorial_religion_created_at', 'religion', 'created_at'),
+        db.Index('idx_memorial_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -48,6 +58,11 @@ class Memorial(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Denormalized counts, maintained from buffered increments (see counters.py)
+    memory_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    image_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    qr_view_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -75,12 +90,22 @@ class Memorial(db.Model):
             'is_public': self.is_public,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
+            'memory_count': self.memory_count,
+            'image_count': self.image_count,
+            'qr_view_count': self.qr_view_count,
             'profile_image': self.profile_image.to_dict() if self.profile_image else None
         }
 
 class Image(db.Model):
     """Image model for memorial images"""
     __tablename__ = 'image'
+    __table_args__ = (
+        db.Index('idx_image_memorial_id', 'memorial_id'),
+        # Partial index: only profile images, for the per-memorial profile lookup
+        db.Index('idx_image_memorial_id_profile', 'memorial_id',
+                 postgresql_where=db.text('is_profile'),
+                 sqlite_where=db.text('is_profile = 1')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -134,6 +159,9 @@ class Memory(db.Model):
 class MemoryImage(db.Model):
     """Image model for memory images"""
     __tablename__ = 'memory_image'
+    __table_args__ = (
+        db.Index('idx_memory_image_memory_id', 'memory_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -157,3 +185,106 @@ class MemoryImage(db.Model):
             'caption': self.caption,
             'created_at': self.created_at.isoformat()
         }
+
+class QrScan(db.Model):
+    """Staged QR scan, waiting to be rolled up into QrScanHourly (see scans.py)"""
+    __tablename__ = 'qr_scan'
+    
+    # No foreign key: scans are written in bulk off the request path and
+    # unknown memorials are filtered out when they are aggregated
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    memorial_id = db.Column(db.Integer, nullable=False)
+    scanned_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class QrScanHourly(db.Model):
+    """QR scans of a memorial within one hour (UTC)"""
+    __tablename__ = 'qr_scan_hourly'
+    
+    memorial_id = db.Column(db.Integer, db.ForeignKey('memorial.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    scans = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert an hourly bucket to dictionary for JSON serialization"""
+        return {
+            'hour': self.hour.isoformat(),
+            'scans': self.scans
+        }
+
+# The scan staging table skips the WAL on PostgreSQL: cheaper inserts, and a
+# crash only loses scans that were not aggregated yet
+event.listen(QrScan.__table__, 'after_create',
+             DDL('ALTER TABLE qr_scan SET UNLOGGED').execute_if(dialect='postgresql'))
+
+# Full-text search support (queried by search.py).
+#
+# PostgreSQL: a trigger-maintained, weighted tsvector column with a GIN index
+# on memorial and memory. The 'simple' configuration does no stemming, so
+# Arabic names match as typed. Existing databases get the same objects from
+# migration b7d2e4f1c8a3.
+# SQLite: FTS5 external-content tables kept in sync by triggers, so search
+# works in development and tests.
+SEARCH_DOCUMENTS = {
+    # table: [(column, tsvector weight), ...]
+    'memorial': [('name', 'A'), ('title', 'B'), ('subtitle', 'B'), ('biography', 'C')],
+    'memory': [('title', 'A'), ('content', 'B')],
+}
+
+def _postgresql_search_ddl(table, columns):
+    vector = ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce(NEW.{col}, '')), '{weight}')"
+        for col, weight in columns
+    )
+    names = ', '.join(col for col, _ in columns)
+    return [
+        f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        f'CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$ '
+        f'BEGIN NEW.search_vector := {vector}; RETURN NEW; END $$ LANGUAGE plpgsql',
+        f'CREATE TRIGGER {table}_search_vector_trigger BEFORE INSERT OR UPDATE OF {names} '
+        f'ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()',
+        f'CREATE INDEX IF NOT EXISTS idx_{table}_search_vector ON {table} USING GIN (search_vector)',
+    ]
+
+def _sqlite_search_ddl(table, columns):
+    names = ', '.join(col for col, _ in columns)
+    new_values = ', '.join(f'new.{col}' for col, _ in columns)
+    old_values = ', '.join(f'old.{col}' for col, _ in columns)
+    delete_old = (f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) "
+                  f"VALUES ('delete', old.id, {old_values});")
+    insert_new = f'INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({names}, "
+        f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN {delete_old} END',
+        f'CREATE TRIGGER {table}_fts_au AFTER UPDATE ON {table} BEGIN {delete_old} {insert_new} END',
+    ]
+
+for _model in (Memorial, Memory):
+    _table = _model.__table__
+    _columns = SEARCH_DOCUMENTS[_table.name]
+    for _statement in _postgresql_search_ddl(_table.name, _columns):
+        event.listen(_table, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+    for _statement in _sqlite_search_ddl(_table.name, _columns):
+        event.listen(_table, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    event.listen(_table, 'before_drop',
+                 DDL(f'DROP TABLE IF EXISTS {_table.name}_fts').execute_if(dialect='sqlite'))
+
+# Fuzzy name autocomplete (autocomplete.py): a trigram index on memorial.name
+# for pg_trgm's similarity operator. pg_trgm ships in contrib, which not every
+# server has; without it the fallback is simply disabled. As in migration
+# c4e8a1b6d2f9, which gives existing databases the index, availability is
+# checked first; the handler covers the remaining errors: a missing control
+# file (undefined_file, feature_not_supported on newer servers) and a role
+# that may not create extensions.
+event.listen(Memorial.__table__, 'after_create', DDL(
+    "DO $$ BEGIN "
+    "IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN "
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm; "
+    "CREATE INDEX IF NOT EXISTS idx_memorial_name_trgm ON memorial USING GIN (name gin_trgm_ops); "
+    "ELSE RAISE NOTICE 'pg_trgm unavailable, fuzzy autocomplete disabled'; "
+    "END IF; "
+    "EXCEPTION WHEN undefined_file OR feature_not_supported OR insufficient_privilege THEN "
+    "RAISE NOTICE 'pg_trgm unavailable, fuzzy autocomplete disabled'; "
+    "END $$"
+).execute_if(dialect='postgresql'))
@@ -2,17 +2,156 @@
 Monitoring and logging configuration for the Gate of Memory backend.
 """
 import os
+import queue
+import atexit
+import random
 import logging
 import logging.handlers
 from logging.config import dictConfig
 from datetime import datetime
 
+# Records are handed to the writer thread through this logger's handlers
+LOG_SINK = 'monitoring.sink'
+
+_listener = None
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that leaves flushing to the queue listener.
+    
+    StreamHandler.emit() flushes after every record; here the listener calls
+    flush_batch() once per drained batch instead.
+    """
+    def flush(self):
+        pass
+    
+    def flush_batch(self):
+        self.acquire()
+        try:
+            if self.stream and hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        finally:
+            self.release()
+    
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full."""
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that drains records in batches and flushes once per batch."""
+    def __init__(self, queue, *handlers, batch_size=256):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+    
+    def _monitor(self):
+        q = self.queue
+        has_task_done = hasattr(q, 'task_done')
+        while True:
+            batch = [self.dequeue(True)]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.dequeue(False))
+            except queue.Empty:
+                pass
+            
+            try:
+                for record in batch:
+                    if record is self._sentinel:
+                        return
+                    self.handle(record)
+            finally:
+                self._flush_handlers()
+                if has_task_done:
+                    for _ in batch:
+                        q.task_done()
+    
+    def enqueue_sentinel(self):
+        # The stock put_nowait() raises queue.Full when the queue is at
+        # capacity; the writer thread is still draining, so wait for room.
+        self.queue.put(self._sentinel)
+    
+    def _flush_handlers(self):
+        for handler in self.handlers:
+            getattr(handler, 'flush_batch', handler.flush)()
+
+class InfoSamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO-and-below records from high-volume loggers.
+    
+    ``rates`` maps logger name prefixes to the fraction of records to keep;
+    warnings and errors always pass.
+    """
+    def __init__(self, rates=None, default_rate=1.0):
+        super().__init__()
+        self.rates = rates or {}
+        self.default_rate = default_rate
+    
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.default_rate
+        for prefix, prefix_rate in self.rates.items():
+            if record.name == prefix or record.name.startswith(prefix + '.'):
+                rate = prefix_rate
+                break
+        return rate >= 1.0 or random.random() < rate
+
+def _start_listener(log_queue, handlers, batch_size):
+    """Start the writer thread that owns all log handler I/O."""
+    global _listener
+    _listener = BatchingQueueListener(log_queue, *handlers, batch_size=batch_size)
+    _listener.start()
+    return _listener
+
+def stop_logging():
+    """Flush pending records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _pause_listener():
+    # Threads do not survive fork() and a lock held by the writer thread would
+    # be inherited locked, so drain and join it before forking.
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _resume_listener():
+    if _listener is not None and _listener._thread is None:
+        _listener.start()
+
+atexit.register(stop_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(
+        before=_pause_listener,
+        after_in_parent=_resume_listener,
+        after_in_child=_resume_listener
+    )
+
 def setup_logging(app):
-    """Configure logging for the application."""
+    """Configure logging for the application.
+    
+    Application threads only put records on a bounded in-memory queue; a
+    single listener thread formats them and does all file I/O and rotation.
+    """
     # Create logs directory if it doesn't exist
     logs_dir = os.path.join(app.root_path, 'logs')
     os.makedirs(logs_dir, exist_ok=True)
     
+    # Replace any pipeline from a previous call before dictConfig closes its handlers
+    stop_logging()
+    log_queue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000))
+    
     # Configure logging
     log_config = {
         'version': 1,
@@ -28,7 +167,19 @@ def setup_logging(app):
                 'datefmt': '%Y-%m-%d %H:%M:%S'
             }
         },
+        'filters': {
+            'info_sampling': {
+                '()': InfoSamplingFilter,
+                'rates': app.config.get('LOG_SAMPLE_RATES', {}),
+                'default_rate': app.config.get('LOG_INFO_SAMPLE_RATE', 1.0)
+            }
+        },
         'handlers': {
+            'queue': {
+                '()': DroppingQueueHandler,
+                'queue': log_queue,
+                'filters': ['info_sampling']
+            },
             'console': {
                 'class': 'logging.StreamHandler',
                 'formatter': 'standard',
@@ -36,7 +187,7 @@ def setup_logging(app):
                 'stream': 'ext://sys.stdout'
             },
             'file': {
-                'class': 'logging.handlers.RotatingFileHandler',
+                '()': BatchedRotatingFileHandler,
                 'formatter': 'standard',
                 'filename': os.path.join(logs_dir, 'app.log'),
                 'maxBytes': 10 * 1024 * 1024,  # 10MB
@@ -44,7 +195,7 @@ def setup_logging(app):
                 'encoding': 'utf8'
             },
             'error_file': {
-                'class': 'logging.handlers.RotatingFileHandler',
+                '()': BatchedRotatingFileHandler,
                 'formatter': 'standard',
                 'filename': os.path.join(logs_dir, 'error.log'),
                 'level': 'ERROR',
@@ -53,7 +204,7 @@ def setup_logging(app):
                 'encoding': 'utf8'
             },
             'json_file': {
-                'class': 'logging.handlers.RotatingFileHandler',
+                '()': BatchedRotatingFileHandler,
                 'formatter': 'json',
                 'filename': os.path.join(logs_dir, 'app.json'),
                 'maxBytes': 10 * 1024 * 1024,  # 10MB
@@ -63,23 +214,24 @@ def setup_logging(app):
         },
         'loggers': {
             '': {  # root logger
-                'handlers': ['console', 'file', 'error_file', 'json_file'],
+                'handlers': ['queue'],
                 'level': 'DEBUG' if app.debug else 'INFO',
                 'propagate': True
             },
             'app': {
-                'handlers': ['console', 'file', 'error_file', 'json_file'],
                 'level': 'DEBUG' if app.debug else 'INFO',
-                'propagate': False
+                'propagate': True
             },
             'sqlalchemy': {
-                'handlers': ['file'],
                 'level': 'WARNING',
-                'propagate': False
+                'propagate': True
             },
             'werkzeug': {
-                'handlers': ['file'],
                 'level': 'INFO',
+                'propagate': True
+            },
+            LOG_SINK: {
+                'handlers': ['console', 'file', 'error_file', 'json_file'],
                 'propagate': False
             }
         }
@@ -88,6 +240,13 @@ def setup_logging(app):
     # Apply the logging configuration
     dictConfig(log_config)
     
+    # Move the real handlers off the sink logger and onto the writer thread
+    sink = logging.getLogger(LOG_SINK)
+    handlers = sink.handlers[:]
+    for handler in handlers:
+        sink.removeHandler(handler)
+    _start_listener(log_queue, handlers, app.config.get('LOG_BATCH_SIZE', 256))
+    
     # Log application startup
     logger = logging.getLogger(__name__)
     logger.info("""
@@ -97,7 +256,7 @@ def setup_logging(app):
       Debug: %s
       Time: %s
     ===================================================
-    """, app.env, app.debug, datetime.utcnow().isoformat())
+    """, os.getenv('FLASK_ENV', 'development'), app.debug, datetime.utcnow().isoformat())
     
     return logger
 
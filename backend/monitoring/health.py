@@ -0,0 +1,107 @@
+"""
+Liveness and readiness probes for the Gate of Memory backend.
+
+Liveness answers "is this process serving requests" and touches nothing but
+the response object. Readiness answers "should traffic be routed here" from a
+snapshot that a background thread refreshes every few seconds with
+``database.check_database_connection`` and the engine's pool counters, so a
+load balancer polling it never costs a pooled connection checkout. Both
+probes are exempt from rate limiting.
+"""
+import time
+import logging
+from flask import jsonify
+
+from background import BackgroundWorker
+from security import limiter
+
+logger = logging.getLogger(__name__)
+
+PROBE_ENDPOINTS = ('health_live', 'health_ready')
+
+
+class HealthMonitor:
+    """Registers the probe routes and keeps the readiness snapshot fresh."""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.interval = app.config.get('HEALTH_REFRESH_INTERVAL', 5)
+        self.stale_after = app.config.get('HEALTH_STALE_AFTER', 30)
+        self.version = app.config.get('API_VERSION', '1.0.0')
+        self.snapshot = None
+        self.refresher = BackgroundWorker('health-refresher', self._refresh, self.interval)
+        self.refresher.init_app(app)
+
+        for rule in ('/health', '/health/live', '/api/health'):
+            app.add_url_rule(rule, 'health_live', limiter.exempt(self.live))
+        for rule in ('/health/ready', '/api/health/ready'):
+            app.add_url_rule(rule, 'health_ready', limiter.exempt(self.ready))
+        app.extensions['health'] = self
+
+    def start(self):
+        """Start this process's refresher, unless it is already running.
+
+        Gunicorn's ``post_fork`` calls this in each worker, so the first probe
+        finds a snapshot; otherwise the first probe starts it. It is never
+        started when the app is built, which under ``preload_app`` happens in
+        the master.
+        """
+        self.refresher.start()
+
+    def live(self):
+        """Liveness probe: no database, no limiter, no shared state."""
+        self.start()
+        return jsonify({'status': 'alive', 'version': self.version})
+
+    def ready(self):
+        """Readiness probe served from the last background snapshot."""
+        self.start()
+        snapshot = self.snapshot
+        if snapshot is None:
+            return jsonify({'status': 'starting'}), 503
+
+        age = time.time() - snapshot['checked_at']
+        ready = snapshot['database'] == 'connected' and age <= self.stale_after
+        body = dict(snapshot, status='ready' if ready else 'not_ready', age_seconds=round(age, 3))
+        return jsonify(body), 200 if ready else 503
+
+    def refresh(self):
+        """Ping the database and read pool counters; called off the request path."""
+        from database import check_database_connection
+
+        start = time.perf_counter()
+        with self.app.app_context():
+            try:
+                ok, message = check_database_connection()
+                pool = self._pool_stats()
+            finally:
+                self.db.session.remove()
+        self.snapshot = {
+            'database': 'connected' if ok else 'disconnected',
+            'message': message,
+            'ping_ms': round((time.perf_counter() - start) * 1000, 3),
+            'pool': pool,
+            'checked_at': time.time(),
+        }
+
+    def _pool_stats(self):
+        pool = self.db.engine.pool
+        stats = {'class': type(pool).__name__}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            counter = getattr(pool, name, None)
+            if callable(counter):
+                stats[name] = counter()
+        return stats
+
+    def _refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            self.snapshot = {
+                'database': 'disconnected',
+                'message': str(e),
+                'pool': {},
+                'checked_at': time.time(),
+            }
+            raise  # logged by the worker
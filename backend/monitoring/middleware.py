@@ -37,6 +37,9 @@ DB_QUERY_DURATION = Histogram(
     ['operation', 'table']
 )
 
+# Endpoints excluded from request metrics: scrapes, static files and probes
+SKIPPED_ENDPOINTS = ('metrics', 'static', 'health_live', 'health_ready')
+
 class MonitorMiddleware:
     """Middleware for monitoring request metrics."""
     
@@ -54,7 +57,7 @@ class MonitorMiddleware:
         g.request_id = request.headers.get('X-Request-ID')
         
         # Skip metrics for health checks and static files
-        if request.endpoint in ['metrics', 'static'] or request.path == '/health':
+        if request.endpoint in SKIPPED_ENDPOINTS:
             return
         
         # Track request in progress
@@ -66,7 +69,7 @@ class MonitorMiddleware:
     def after_request(self, response):
         """Record request metrics after response is sent."""
         # Skip metrics for health checks and static files
-        if request.endpoint in ['metrics', 'static'] or request.path == '/health':
+        if request.endpoint in SKIPPED_ENDPOINTS:
             return response
         
         # Calculate request duration
@@ -138,6 +141,10 @@ def setup_monitoring(app):
     # Initialize middleware
     MonitorMiddleware(app)
     
+    # Opt-in sampling profiler for slow requests
+    from .profiler import init_profiler
+    init_profiler(app)
+    
     # Add request ID to all responses
     @app.after_request
     def add_request_id(response):
@@ -145,11 +152,13 @@ def setup_monitoring(app):
             response.headers['X-Request-ID'] = g.request_id
         return response
     
-    # Add health check endpoint
-    @app.route('/health')
-    def health_check():
-        return {
-            'status': 'healthy',
-            'timestamp': time.time(),
-            'version': '1.0.0'
-        }
+    # Connection pool checkout, pre-ping and occupancy metrics
+    from models import db
+    from .pool import instrument_pools
+    instrument_pools(app, db)
+    
+    # Liveness and cached readiness probes. The refresher is not started
+    # here: under preload_app this runs in the Gunicorn master, which must
+    # not keep a thread (and a connection) alive across the forks
+    from .health import HealthMonitor
+    HealthMonitor(app, db)
@@ -0,0 +1,125 @@
+"""
+Connection pool telemetry for the Gate of Memory backend.
+
+Exports, per engine, how long requests wait to check a connection out of the
+pool (including the pre-ping round trip), what the pre-ping itself costs, how
+often checkout times out, how long connections stay checked out, how often
+new ones are opened, and live size/checked-out/overflow gauges, so that
+pool starvation shows up in Prometheus rather than as unexplained latency.
+"""
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from prometheus_client import Counter, Histogram, Gauge
+
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled connection, including pre-ping',
+    ['pool'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+
+POOL_PRE_PING_DURATION = Histogram(
+    'db_pool_pre_ping_seconds',
+    'Duration of pool_pre_ping liveness checks',
+    ['pool'],
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1)
+)
+
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    'db_pool_checkout_timeouts_total',
+    'Checkouts that gave up after pool_timeout',
+    ['pool']
+)
+
+POOL_SIZE = Gauge('db_pool_size', 'Configured persistent pool size', ['pool'])
+POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Connections currently checked out', ['pool'])
+POOL_OVERFLOW = Gauge('db_pool_overflow', 'Overflow connections currently open', ['pool'])
+POOL_MAX_OVERFLOW = Gauge('db_pool_max_overflow', 'Configured max_overflow', ['pool'])
+
+POOL_CONNECTIONS_OPENED = Counter(
+    'db_pool_connections_opened_total',
+    'New database connections opened by the pool',
+    ['pool']
+)
+
+POOL_CHECKOUT_HELD = Histogram(
+    'db_pool_checkout_held_seconds',
+    'Time a connection stayed checked out of the pool',
+    ['pool'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+)
+
+def instrument_engine(engine, name='default'):
+    """Attach checkout, pre-ping and occupancy metrics to ``engine``'s pool.
+
+    ``engine.dispose()`` (run in every forked worker) replaces the pool, so
+    nothing here holds on to a pool object: the pool listeners are attached
+    through the engine, which carries them over to each new pool, and the
+    gauges and checkout timing read ``engine.pool`` when they run.
+    """
+    if getattr(engine, '_gom_instrumented', False):
+        return
+    engine._gom_instrumented = True
+    
+    checkout_wait = POOL_CHECKOUT_WAIT.labels(pool=name)
+    timeouts = POOL_CHECKOUT_TIMEOUTS.labels(pool=name)
+    opened = POOL_CONNECTIONS_OPENED.labels(pool=name)
+    held = POOL_CHECKOUT_HELD.labels(pool=name)
+    raw_connection = engine.raw_connection
+    
+    # Connection() calls engine.raw_connection(), which checks out of
+    # whatever engine.pool is at the time, so this times every checkout made
+    # through the engine
+    def timed_raw_connection():
+        start = time.perf_counter()
+        try:
+            return raw_connection()
+        except PoolTimeoutError:
+            timeouts.inc()
+            raise
+        finally:
+            checkout_wait.observe(time.perf_counter() - start)
+    engine.raw_connection = timed_raw_connection
+    
+    @event.listens_for(engine, 'connect')
+    def _opened(dbapi_connection, connection_record):
+        opened.inc()
+    
+    @event.listens_for(engine, 'checkout')
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['gom_checked_out_at'] = time.perf_counter()
+    
+    @event.listens_for(engine, 'checkin')
+    def _checked_in(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('gom_checked_out_at', None)
+        if checked_out_at is not None:
+            held.observe(time.perf_counter() - checked_out_at)
+    
+    # The dialect outlives the pool, and every pool pings through it
+    if getattr(engine.pool, '_pre_ping', False):
+        pre_ping = POOL_PRE_PING_DURATION.labels(pool=name)
+        dialect = engine.dialect
+        do_ping = dialect.do_ping
+        
+        def timed_ping(dbapi_connection):
+            start = time.perf_counter()
+            try:
+                return do_ping(dbapi_connection)
+            finally:
+                pre_ping.observe(time.perf_counter() - start)
+        dialect.do_ping = timed_ping
+    
+    # QueuePool exposes live counters; SQLite's static pools do not
+    if hasattr(engine.pool, 'checkedout'):
+        POOL_SIZE.labels(pool=name).set_function(lambda: engine.pool.size())
+        POOL_CHECKED_OUT.labels(pool=name).set_function(lambda: engine.pool.checkedout())
+        # overflow() counts up from -pool_size until the pool is exhausted
+        POOL_OVERFLOW.labels(pool=name).set_function(lambda: max(engine.pool.overflow(), 0))
+        POOL_MAX_OVERFLOW.labels(pool=name).set(engine.pool._max_overflow)
+
+def instrument_pools(app, db):
+    """Instrument every engine Flask-SQLAlchemy created for ``app``."""
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            instrument_engine(engine, bind_key or 'default')
@@ -0,0 +1,56 @@
+"""
+SQL call-site comments.
+
+Every statement sent to PostgreSQL gets a trailing comment naming the
+application code that issued it::
+
+    SELECT ... FROM memorial WHERE memorial.user_id = %(user_id_1)s
+    /* callsite=api.memorial:MemorialListResource.get:57 */
+
+pg_stat_statements keeps the text of the first execution of each normalized
+statement, comment included (the comment does not change its queryid), so
+``scripts/database_manager.py slow-queries`` can point each expensive
+statement back at the ORM call that issued it. The call site is the first
+frame outside SQLAlchemy and the session plumbing; comments are cached per
+code location, so the cost is one short frame walk per statement.
+"""
+import sys
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Frames in these modules are plumbing, not call sites
+_PLUMBING = ('sqlalchemy', 'flask_sqlalchemy', 'routing', 'monitoring.querytags', 'monitoring.tracing')
+
+_comments = {}  # (code, line) -> comment
+_installed = False
+
+
+def callsite_comment(depth=1):
+    """The ``/* callsite=... */`` comment for the code calling into SQLAlchemy."""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith(_PLUMBING):
+            key = (frame.f_code, frame.f_lineno)
+            comment = _comments.get(key)
+            if comment is None:
+                name = getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+                comment = _comments[key] = f' /* callsite={module}:{name}:{frame.f_lineno} */'
+            return comment
+        frame = frame.f_back
+    return ''
+
+
+def _tag_statement(conn, cursor, statement, parameters, context, executemany):
+    if conn.dialect.name == 'postgresql':
+        statement += callsite_comment(2)
+    return statement, parameters
+
+
+def init_query_tags(app):
+    """Tag SQL statements with their call site unless SQL_CALLSITE_COMMENTS is off."""
+    global _installed
+    if _installed or not app.config.get('SQL_CALLSITE_COMMENTS', True):
+        return
+    _installed = True
+    event.listen(Engine, 'before_cursor_execute', _tag_statement, retval=True)
@@ -0,0 +1,368 @@
+"""
+Lightweight request tracing for the Gate of Memory backend.
+
+Spans follow the OpenTelemetry data model (trace/span IDs, parent links,
+nanosecond timestamps, attributes) and finished traces are exported as OTLP
+JSON, either appended to a local file or POSTed to an OTLP/HTTP collector.
+Export happens on a background thread so the request path only pays for
+building a few dicts. At most ``TRACING_QUEUE_SIZE`` finished traces wait for
+it; while a slow or unreachable collector keeps the queue full, further
+traces are dropped and counted in ``Tracer.dropped`` instead of growing the
+worker's memory.
+
+Outside an active trace, ``tracer.span()`` is a no-op, so the helpers can be
+called unconditionally from scripts and request code alike.
+"""
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from flask import request, g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'gate-of-memory-api'
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """A single timed operation within a trace."""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'kind', 'start_ns',
+                 'end_ns', 'attributes', 'status', 'trace', 'parent', '_token')
+
+    def __init__(self, name, trace_id, parent_id=None, kind=SPAN_KIND_INTERNAL,
+                 attributes=None, trace=None, parent=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.trace = trace if trace is not None else Trace()
+        self.parent = parent  # the in-process parent Span, if any
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.status = STATUS_ERROR
+        self.attributes['exception.type'] = type(exc).__name__
+        self.attributes['exception.message'] = str(exc)
+
+    def to_otlp(self):
+        """Serialize the span as an OTLP JSON span object."""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            'status': {'code': self.status},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class Trace:
+    """The finished spans of one trace, handed over once when its root ends.
+
+    Spans that finish after that (work the root did not wait for) are dropped
+    rather than appended to a list the exporter thread may be serializing.
+    """
+
+    __slots__ = ('spans', 'closed', 'late', '_lock')
+
+    def __init__(self):
+        self.spans = []
+        self.closed = False
+        self.late = 0
+        self._lock = threading.Lock()
+
+    def add(self, span, close=False):
+        """Record a finished span; returns the spans to export if this closed the trace."""
+        with self._lock:
+            if self.closed:
+                self.late += 1
+                return None
+            self.spans.append(span)
+            if close:
+                self.closed = True
+                return list(self.spans)
+        return None
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class FileSpanExporter:
+    """Append one OTLP JSON ``ExportTraceServiceRequest`` per trace to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, payload):
+        with open(self.path, 'a', encoding='utf8') as f:
+            f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+
+class OTLPHttpSpanExporter:
+    """POST OTLP JSON to a collector's ``/v1/traces`` endpoint."""
+
+    def __init__(self, endpoint, timeout=2.0):
+        self.endpoint = endpoint.rstrip('/') + '/v1/traces'
+        self.timeout = timeout
+
+    def export(self, payload):
+        from urllib.request import Request, urlopen
+        req = Request(self.endpoint, data=json.dumps(payload).encode('utf8'),
+                      headers={'Content-Type': 'application/json'})
+        with urlopen(req, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """Creates spans and hands finished traces to an exporter thread."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.exporter = None
+        self.dropped = 0  # traces lost to a full export queue
+        self._queue = queue.Queue(maxsize=1000)
+        self._worker = None
+
+    def init_app(self, app):
+        """Configure the tracer from ``app.config`` and install request hooks."""
+        self.enabled = app.config.get('TRACING_ENABLED', False)
+        if not self.enabled:
+            return
+
+        self.sample_rate = app.config.get('TRACING_SAMPLE_RATE', 1.0)
+        self._queue = queue.Queue(maxsize=app.config.get('TRACING_QUEUE_SIZE', 1000))
+        if app.config.get('TRACING_EXPORTER', 'file') == 'otlp':
+            self.exporter = OTLPHttpSpanExporter(app.config['TRACING_OTLP_ENDPOINT'])
+        else:
+            self.exporter = FileSpanExporter(app.config.get('TRACING_FILE', 'logs/traces.jsonl'))
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        _instrument_sqlalchemy(self)
+        app.extensions['tracer'] = self
+
+    # Span API
+
+    def current_span(self):
+        return _current_span.get()
+
+    def start_span(self, name, kind=SPAN_KIND_INTERNAL, attributes=None,
+                   trace_id=None, parent_id=None):
+        """Start a span as a child of the current one, or as a new trace root.
+
+        Returns ``None`` when tracing is disabled, or when asked for a child
+        span with no active trace.
+        """
+        if not self.enabled:
+            return None
+        parent = _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, kind, attributes, parent.trace, parent)
+        elif trace_id is not None:
+            span = Span(name, trace_id, parent_id, kind, attributes)
+        else:
+            return None
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span):
+        """Finish ``span``; exports the whole trace once its root ends."""
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # Ended from a different context (e.g. a pooled connection event):
+            # only unwind it if it is what that context considers current
+            if _current_span.get() is span:
+                _current_span.set(span.parent)
+        spans = span.trace.add(span, close=span.parent_id is None or span.kind == SPAN_KIND_SERVER)
+        if spans:
+            self._enqueue(spans)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Context manager that records a child span of the current trace."""
+        span = self.start_span(name, attributes=attributes)
+        if span is None:
+            yield None
+            return
+        try:
+            yield span
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            self.end_span(span)
+
+    # Export
+
+    def _enqueue(self, spans):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._export_loop,
+                                            name='trace-exporter', daemon=True)
+            self._worker.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export_loop(self):
+        while True:
+            spans = self._queue.get()
+            payload = {
+                'resourceSpans': [{
+                    'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                    'scopeSpans': [{
+                        'scope': {'name': __name__},
+                        'spans': [s.to_otlp() for s in spans],
+                    }],
+                }]
+            }
+            try:
+                self.exporter.export(payload)
+            except Exception as e:
+                logger.warning(f"Failed to export trace: {e}")
+
+    # Flask request hooks
+
+    def _before_request(self):
+        trace_id, parent_id, sampled = _parse_traceparent(request.headers.get('traceparent'))
+        if trace_id is not None and not sampled:
+            return  # the caller decided not to record this trace
+        if trace_id is None:
+            if random.random() >= self.sample_rate:
+                return
+            trace_id = f'{random.getrandbits(128):032x}'
+        g.trace_span = self.start_span(
+            f'{request.method} {request.url_rule.rule if request.url_rule else request.path}',
+            kind=SPAN_KIND_SERVER,
+            trace_id=trace_id,
+            parent_id=parent_id,
+            attributes={
+                'http.method': request.method,
+                'http.target': request.path,
+                'http.route': request.url_rule.rule if request.url_rule else '',
+                'flask.endpoint': request.endpoint or '',
+                'request.id': request.headers.get('X-Request-ID', ''),
+            },
+        )
+
+    def _after_request(self, response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = STATUS_ERROR
+            response.headers['traceparent'] = f'00-{span.trace_id}-{span.span_id}-01'
+        return response
+
+    def _teardown_request(self, exc=None):
+        span = g.pop('trace_span', None)
+        if span is not None:
+            if exc is not None:
+                span.record_exception(exc)
+            self.end_span(span)
+
+
+def _parse_traceparent(header):
+    """Parse a W3C ``traceparent`` header into ``(trace_id, parent_span_id, sampled)``.
+
+    Invalid headers give ``(None, None, False)``, and a new trace is started.
+    """
+    if not header:
+        return None, None, False
+    parts = header.strip().lower().split('-')
+    if len(parts) < 4 or parts[0] == 'ff' or len(parts[0]) != 2 or (parts[0] == '00' and len(parts) != 4):
+        return None, None, False
+    trace_id, parent_id, flags = parts[1], parts[2], parts[3]
+    try:
+        valid = (len(trace_id) == 32 and len(parent_id) == 16 and len(flags) == 2
+                 and int(trace_id, 16) != 0 and int(parent_id, 16) != 0)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        valid = False
+    if not valid:
+        return None, None, False
+    return trace_id, parent_id, sampled
+
+
+_sqlalchemy_instrumented = False
+
+
+def _instrument_sqlalchemy(tracer):
+    """Wrap every SQL statement issued on any engine in a client span."""
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return
+    _sqlalchemy_instrumented = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_span('db.query', kind=SPAN_KIND_CLIENT, attributes={
+            'db.system': conn.dialect.name,
+            'db.operation': statement.lstrip().split(None, 1)[0].upper() if statement.strip() else '',
+            'db.statement': statement[:1000],
+            'db.executemany': executemany,
+        })
+        conn.info.setdefault('trace_spans', []).append(span)
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get('trace_spans')
+        if spans:
+            tracer.end_span(spans.pop())
+
+    @event.listens_for(Engine, 'handle_error')
+    def _handle_error(exception_context):
+        spans = exception_context.connection.info.get('trace_spans') if exception_context.connection else None
+        if spans:
+            span = spans.pop()
+            if span is not None:
+                span.record_exception(exception_context.original_exception)
+            tracer.end_span(span)
+
+
+# Global tracer instance, configured by init_app()
+tracer = Tracer()
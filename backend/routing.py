@@ -0,0 +1,104 @@
+"""
+Read/write session routing for the Gate of Memory backend.
+
+Reads issued while handling GET/HEAD requests are sent to one of the read
+replicas configured in ``DATABASE_REPLICA_URLS``; everything else, and every
+flush, goes to the primary. A request reads from a single replica, chosen
+when it first reads, so it never sees two replicas at different points of
+replay.
+
+After a client writes, its reads are pinned to the primary for
+``READ_YOUR_WRITES_WINDOW`` seconds so it never reads back data older than
+its own write. The deadline is returned both as a cookie, for browsers on
+the same site, and as an ``X-Primary-Until`` response header, for API
+clients and cross-origin callers without cookies, which send it back
+unchanged on their next requests. This works across workers and nodes
+because the state lives with the client.
+"""
+import time
+import random
+from contextlib import contextmanager
+from flask import g, request, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_COOKIE = 'gom_primary_until'
+STICKY_HEADER = 'X-Primary-Until'
+
+
+def replica_binds(urls):
+    """Build ``SQLALCHEMY_BINDS`` entries for a list of replica URLs."""
+    return {f'{REPLICA_BIND_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica when the request allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _reads_from_replica():
+            replica = g.get('db_replica')
+            if replica is None:
+                replicas = [engine for key, engine in self._db.engines.items()
+                            if key and key.startswith(REPLICA_BIND_PREFIX)]
+                # One replica per request, not per statement
+                replica = g.db_replica = random.choice(replicas) if replicas else False
+            if replica is not False:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_replica():
+    if not has_app_context():
+        return False
+    return g.get('db_read_replica', False) and not g.get('db_wrote', False)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_write(session, flush_context):
+    # Any later read in this request must see the write, so pin to primary
+    if has_app_context():
+        g.db_wrote = True
+
+
+@contextmanager
+def use_primary():
+    """Force reads inside the block to the primary, e.g. for GET handlers that
+    must not observe replication lag."""
+    previous = g.get('db_read_replica', False)
+    g.db_read_replica = False
+    try:
+        yield
+    finally:
+        g.db_read_replica = previous
+
+
+def init_routing(app):
+    """Install the request hooks that decide between replica and primary."""
+    window = app.config.get('READ_YOUR_WRITES_WINDOW', 5)
+
+    @app.before_request
+    def choose_database():
+        now = time.time()
+        primary_until = max(_deadline(request.cookies.get(STICKY_COOKIE)),
+                            _deadline(request.headers.get(STICKY_HEADER)))
+        # A deadline further out than one window was not issued by us
+        pinned = now <= primary_until <= now + window
+        g.db_read_replica = request.method in SAFE_METHODS and not pinned
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote', False) and response.status_code < 400:
+            primary_until = f'{time.time() + window:.3f}'
+            response.set_cookie(STICKY_COOKIE, primary_until,
+                                max_age=int(window) + 1, httponly=True, samesite='Lax')
+            response.headers[STICKY_HEADER] = primary_until
+        return response
+
+
+def _deadline(value):
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0
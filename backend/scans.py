@@ -0,0 +1,209 @@
+"""
+QR scan analytics.
+
+Printed QR codes point at ``/q/<memorial_id>``, which redirects to the
+memorial page. The redirect never waits on the database: each scan is
+appended to a bounded in-process list, and a background thread in every
+worker writes the list out every ``SCAN_FLUSH_INTERVAL`` seconds, with COPY
+on PostgreSQL and an executemany INSERT elsewhere. If the list is full
+(``SCAN_BUFFER_SIZE``) because the database is unreachable, further scans are
+counted as dropped rather than slowing the redirect.
+
+Scans land in ``qr_scan``, an UNLOGGED staging table on PostgreSQL: no WAL
+is written for it, and its contents are lost on a crash, which costs at most
+the scans not yet aggregated. Every ``SCAN_AGGREGATE_INTERVAL`` seconds the
+same thread moves staged scans into ``qr_scan_hourly`` (one row per memorial
+and hour) with a single DELETE ... RETURNING / upsert statement. Rows are
+claimed with SKIP LOCKED, so the workers of every node can aggregate at once
+without counting a scan twice.
+
+The running total shown on memorials (``qr_view_count``) is fed by the
+counter buffer in counters.py.
+"""
+import io
+import os
+import csv
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from prometheus_client import Counter as MetricCounter
+from sqlalchemy import select, text
+from models import db, Memorial, QrScan, QrScanHourly
+from counters import record_view
+from background import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+SCANS_RECORDED = MetricCounter('qr_scans_recorded_total', 'QR scans accepted by the redirect')
+SCANS_DROPPED = MetricCounter('qr_scans_dropped_total', 'QR scans dropped because the buffer was full')
+
+_AGGREGATE = text("""
+    WITH moved AS (
+        DELETE FROM qr_scan
+        WHERE id IN (SELECT id FROM qr_scan ORDER BY id LIMIT :batch_size FOR UPDATE SKIP LOCKED)
+        RETURNING memorial_id, scanned_at
+    ), rolled AS (
+        INSERT INTO qr_scan_hourly (memorial_id, hour, scans)
+        SELECT moved.memorial_id, date_trunc('hour', moved.scanned_at), count(*)
+        FROM moved JOIN memorial ON memorial.id = moved.memorial_id
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (memorial_id, hour) DO UPDATE SET scans = qr_scan_hourly.scans + EXCLUDED.scans
+    )
+    SELECT count(*) FROM moved
+""")
+
+
+class ScanLog:
+    """Bounded, per-process list of ``(memorial_id, scanned_at)`` pairs."""
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._scans = []
+
+    def __len__(self):
+        return len(self._scans)
+
+    def record(self, memorial_id, scanned_at=None):
+        """Append one scan; returns False if it was dropped."""
+        scan = (memorial_id, scanned_at or datetime.utcnow())
+        with self._lock:
+            if len(self._scans) >= self.capacity:
+                accepted = False
+            else:
+                self._scans.append(scan)
+                accepted = True
+        (SCANS_RECORDED if accepted else SCANS_DROPPED).inc()
+        return accepted
+
+    def flush(self, engine):
+        """Write every buffered scan to ``qr_scan`` in one transaction.
+
+        Returns:
+            int: Number of scans written
+        """
+        with self._lock:
+            scans, self._scans = self._scans, []
+        if not scans:
+            return 0
+        try:
+            with engine.begin() as conn:
+                if conn.dialect.name == 'postgresql' and conn.dialect.driver == 'psycopg2':
+                    _copy(conn, scans)
+                else:
+                    conn.execute(QrScan.__table__.insert(), [
+                        {'memorial_id': memorial_id, 'scanned_at': scanned_at}
+                        for memorial_id, scanned_at in scans
+                    ])
+        except Exception:
+            # Put the scans back in front of newer ones, up to capacity
+            with self._lock:
+                self._scans = (scans + self._scans)[:self.capacity]
+            raise
+        return len(scans)
+
+    def reset(self):
+        # Fresh lock too: after a fork, another thread may have held the old one
+        self._lock = threading.Lock()
+        self._scans = []
+
+
+def _copy(conn, scans):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(scans)
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert('COPY qr_scan (memorial_id, scanned_at) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+scan_log = ScanLog()
+
+
+def record_scan(memorial_id):
+    """Record a QR scan without touching the database.
+
+    Returns:
+        bool: False if the scan was dropped because the buffer is full
+    """
+    writer.start()
+    if not scan_log.record(memorial_id):
+        return False
+    # The view count only counts scans that will reach qr_scan
+    record_view(memorial_id)
+    return True
+
+
+def aggregate(engine, batch_size=50000):
+    """Roll staged scans up into hourly per-memorial buckets.
+
+    Scans of memorials that no longer exist are discarded.
+
+    Returns:
+        int: Number of staged scans consumed
+    """
+    if engine.dialect.name == 'postgresql':
+        total = 0
+        while True:
+            with engine.begin() as conn:
+                moved = conn.execute(_AGGREGATE, {'batch_size': batch_size}).scalar()
+            total += moved
+            if moved < batch_size:
+                return total
+
+    # Development databases: one worker, so read, sum and delete in Python
+    with engine.begin() as conn:
+        rows = conn.execute(QrScan.__table__.select().order_by(QrScan.id).limit(batch_size)).all()
+        if not rows:
+            return 0
+        existing = set(conn.execute(select(Memorial.id).where(
+            Memorial.id.in_({row.memorial_id for row in rows}))).scalars())
+        buckets = Counter((row.memorial_id, row.scanned_at.replace(minute=0, second=0, microsecond=0))
+                          for row in rows if row.memorial_id in existing)
+        hourly = QrScanHourly.__table__
+        for (memorial_id, hour), scans in sorted(buckets.items()):
+            updated = conn.execute(hourly.update().where(
+                (hourly.c.memorial_id == memorial_id) & (hourly.c.hour == hour)
+            ).values(scans=hourly.c.scans + scans)).rowcount
+            if not updated:
+                conn.execute(hourly.insert(), {'memorial_id': memorial_id, 'hour': hour, 'scans': scans})
+        conn.execute(QrScan.__table__.delete().where(QrScan.id <= rows[-1].id))
+    return len(rows)
+
+
+# Background writer, started in each process on its first scan
+
+_next_aggregate = {'at': None}
+
+
+def _write():
+    scan_log.flush(db.engine)  # a failure skips aggregation too; the scans were kept
+    interval = writer.app.config.get('SCAN_AGGREGATE_INTERVAL', 60)
+    now = time.monotonic()
+    if _next_aggregate['at'] is None:
+        _next_aggregate['at'] = now + interval
+    elif now >= _next_aggregate['at']:
+        _next_aggregate['at'] = now + interval
+        aggregate(db.engine)
+
+
+def _flush():
+    scan_log.flush(db.engine)
+
+
+writer = BackgroundWorker('qr-scan-writer', _write, at_exit=_flush)
+
+
+def init_scans(app):
+    """Write recorded scans to the database in the background for ``app``."""
+    writer.init_app(app, app.config.get('SCAN_FLUSH_INTERVAL', 1))
+    scan_log.capacity = app.config.get('SCAN_BUFFER_SIZE', 100000)
+
+
+# A forked worker must not write scans buffered by its parent
+os.register_at_fork(after_in_child=scan_log.reset)
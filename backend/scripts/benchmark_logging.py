@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Logging Latency Benchmark for Gate of Memory Backend
+
+Measures how long a request thread spends inside ``logger.info()`` with the
+old synchronous handler set (console, two rotating files and a JSON file)
+versus the queued pipeline installed by ``monitoring.setup_logging``.
+
+Usage:
+    python scripts/benchmark_logging.py --records 20000 --threads 4
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import logging.handlers
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def configure_sync(logs_dir, stream):
+    """Install the original synchronous handlers on the root logger."""
+    from pythonjsonlogger import jsonlogger
+
+    standard = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+                                 '%Y-%m-%d %H:%M:%S')
+    console = logging.StreamHandler(stream)
+    console.setFormatter(standard)
+    handlers = [console]
+    for name, level in (('app.log', logging.NOTSET), ('error.log', logging.ERROR)):
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(logs_dir, name), maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf8')
+        handler.setFormatter(standard)
+        handler.setLevel(level)
+        handlers.append(handler)
+    json_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(logs_dir, 'app.json'), maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf8')
+    json_handler.setFormatter(jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    handlers.append(json_handler)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    return handlers
+
+
+def configure_queued(logs_dir, stream):
+    """Install the queued pipeline from monitoring.setup_logging."""
+    from flask import Flask
+    from monitoring import setup_logging
+
+    app = Flask('benchmark', root_path=os.path.dirname(logs_dir))
+    app.config['LOG_QUEUE_SIZE'] = 1_000_000  # measure latency, not drops
+    sys_stdout, sys.stdout = sys.stdout, stream
+    try:
+        setup_logging(app)
+    finally:
+        sys.stdout = sys_stdout
+
+
+def measure(records, threads):
+    """Time individual logger.info() calls across ``threads`` threads."""
+    logger = logging.getLogger('app.benchmark')
+    per_thread = records // threads
+    timings = [[] for _ in range(threads)]
+
+    def worker(index):
+        out = timings[index]
+        for i in range(per_thread):
+            start = time.perf_counter_ns()
+            logger.info('memorial %s viewed by %s', i, index)
+            out.append(time.perf_counter_ns() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    wall_start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    wall = time.perf_counter() - wall_start
+
+    samples = sorted(ns for thread_timings in timings for ns in thread_timings)
+    return {
+        'calls': len(samples),
+        'mean_us': statistics.fmean(samples) / 1000,
+        'p50_us': samples[len(samples) // 2] / 1000,
+        'p99_us': samples[int(len(samples) * 0.99)] / 1000,
+        'max_us': samples[-1] / 1000,
+        'calls_per_sec': len(samples) / wall,
+    }
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Gate of Memory Logging Benchmark')
+    parser.add_argument('--records', type=int, default=20000, help='Log calls per run')
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent logging threads')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point for the logging benchmark."""
+    args = parse_arguments()
+    results = {}
+
+    with open(os.devnull, 'w') as devnull:
+        with tempfile.TemporaryDirectory() as tmp:
+            logs_dir = os.path.join(tmp, 'logs')
+            os.makedirs(logs_dir)
+            handlers = configure_sync(logs_dir, devnull)
+            results['sync'] = measure(args.records, args.threads)
+            for handler in handlers:
+                logging.getLogger().removeHandler(handler)
+                handler.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            logs_dir = os.path.join(tmp, 'logs')
+            os.makedirs(logs_dir)
+            configure_queued(logs_dir, devnull)
+            results['queued'] = measure(args.records, args.threads)
+
+            from monitoring import stop_logging
+            drain_start = time.perf_counter()
+            stop_logging()
+            results['queued']['drain_sec'] = time.perf_counter() - drain_start
+
+    print(f"\n=== logger.info() latency ({args.records} calls, {args.threads} threads) ===")
+    print(f"{'pipeline':<8} | {'mean us':>9} | {'p50 us':>8} | {'p99 us':>8} | {'max us':>9} | {'calls/s':>10}")
+    print("-" * 68)
+    for name, r in results.items():
+        print(f"{name:<8} | {r['mean_us']:>9.2f} | {r['p50_us']:>8.2f} | {r['p99_us']:>8.2f} | "
+              f"{r['max_us']:>9.1f} | {r['calls_per_sec']:>10.0f}")
+    print(f"\nQueued writer drained its backlog in {results['queued']['drain_sec']:.3f}s after the run")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
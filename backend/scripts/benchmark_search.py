@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search Benchmark for Gate of Memory Backend
+
+Seeds ``--memories`` memories into a scratch schema on a PostgreSQL server
+and times ``search.search('memory', ...)`` for a word in every memory, a
+word in one memory of ``--rare-every`` and a two-word query, with the
+MAX_CANDIDATES cap and without it. With --explain the capped query plans
+are printed with EXPLAIN (ANALYZE, BUFFERS). The schema is dropped
+afterwards unless --keep is given.
+
+Usage:
+    python scripts/benchmark_search.py postgresql://localhost/gom_bench --memories 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA = 'search_benchmark'
+
+
+def seed(engine, memories, rare_every):
+    """Create the tables and insert ``memories`` memories attached to 1000 public memorials."""
+    from sqlalchemy import text
+    from models import db
+
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO \"user\" (id, username, email, password_hash) "
+                          "VALUES (1, 'benchmark', 'benchmark@example.com', 'x')"))
+        conn.execute(text("INSERT INTO memorial (id, title, name, user_id, is_public) "
+                          "SELECT g, 'In loving memory', 'Person ' || g, 1, true "
+                          "FROM generate_series(1, 1000) g"))
+        conn.execute(text("INSERT INTO memory (id, title, content) "
+                          "SELECT g, 'Memory ' || g, 'We remember the summers by the sea, word' "
+                          "|| (g % :rare_every) || ' and the family stories ' || md5(g::text) "
+                          "FROM generate_series(1, :memories) g"),
+                     {'memories': memories, 'rare_every': rare_every})
+        conn.execute(text("INSERT INTO memorial_memories (memorial_id, memory_id) "
+                          "SELECT 1 + g % 1000, g FROM generate_series(1, :memories) g"),
+                     {'memories': memories})
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('VACUUM ANALYZE'))
+
+
+def time_query(query, runs):
+    """Median and worst milliseconds of ``runs`` searches, after one warm-up."""
+    from search import search
+
+    search('memory', query)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        search('memory', query, limit=20)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def explain(query):
+    """Print the capped query's plan with actual timings."""
+    from sqlalchemy import text
+    from models import db
+    import search
+
+    params = {'query': search._tsquery(query), 'headline_options': search._HEADLINE_OPTIONS,
+              'max_candidates': search.MAX_CANDIDATES, 'limit': 20, 'offset': 0}
+    print(f"\n--- EXPLAIN ANALYZE: {query!r} ---")
+    for (line,) in db.session.execute(text('EXPLAIN (ANALYZE, BUFFERS) ' + search._POSTGRESQL_QUERIES['memory']),
+                                      params):
+        print(line)
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Gate of Memory Search Benchmark')
+    parser.add_argument('database_url', help='PostgreSQL URL; a scratch schema is created in it')
+    parser.add_argument('--memories', type=int, default=1000000, help='Memories to seed')
+    parser.add_argument('--rare-every', type=int, default=1000,
+                        help='The rare word is in one memory of this many')
+    parser.add_argument('--runs', type=int, default=5, help='Timed searches per query')
+    parser.add_argument('--explain', action='store_true', help='Print EXPLAIN ANALYZE of the capped queries')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch schema')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    from flask import Flask
+    from sqlalchemy import create_engine, text
+    from models import db
+    import search
+
+    admin = create_engine(args.database_url)
+    with admin.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+
+    app = Flask('benchmark')
+    app.config.update(SQLALCHEMY_DATABASE_URI=args.database_url,
+                      SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'options': f'-csearch_path={SCHEMA}'}})
+    db.init_app(app)
+    try:
+        with app.app_context():
+            started = time.time()
+            seed(db.engine, args.memories, args.rare_every)
+            print(f"Seeded {args.memories} memories in {time.time() - started:.1f}s")
+
+            queries = ['summers', f'word{args.rare_every // 2}', 'summers sea']
+            cap = search.MAX_CANDIDATES
+            print(f"\n=== search('memory', q, limit=20) over {args.memories} memories ===")
+            print(f"{'query':<14} | {'candidates':>10} | {'median ms':>9} | {'max ms':>8}")
+            print("-" * 51)
+            for query in queries:
+                for limit in (cap, None):
+                    search.MAX_CANDIDATES = limit or args.memories
+                    median, worst = time_query(query, args.runs)
+                    print(f"{query:<14} | {limit or 'all':>10} | {median:>9.1f} | {worst:>8.1f}")
+            search.MAX_CANDIDATES = cap
+
+            if args.explain:
+                for query in queries:
+                    explain(query)
+    finally:
+        if not args.keep:
+            with admin.begin() as conn:
+                conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        admin.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark for Gate of Memory Backend
+
+Boots the app in fresh interpreters under ``python -X importtime`` and reports
+the total import time, the packages it is spent in, and how long
+``create_app()`` takes once everything is imported. Libraries that only one
+endpoint needs (LAZY_MODULES) must not be imported at boot; the run fails if
+one is.
+
+Usage:
+    python scripts/benchmark_startup.py --runs 5
+    python scripts/benchmark_startup.py --budget-ms 800 --output startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported by the code that uses them, never at boot
+LAZY_MODULES = ('qrcode', 'PIL', 'requests')
+
+BOOT = """
+import sys, json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+if {build}:
+    app.create_app({config!r})
+built = time.perf_counter()
+print(json.dumps({{
+    'import_sec': imported - start,
+    'create_app_sec': built - imported,
+    'eager': sorted(m for m in {lazy!r} if m in sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output into ``(self_us, cumulative_us, module)`` rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        rows.append((int(fields[0]), int(fields[1]), fields[2].strip()))
+    return rows
+
+
+def boot(config, build=True):
+    """Boot the app once in a new interpreter.
+
+    Returns:
+        dict: Timings, eagerly imported LAZY_MODULES and import time per package
+    """
+    statement = BOOT.format(build=build, config=config, lazy=LAZY_MODULES)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Booting the app failed:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    packages = Counter()
+    for self_us, _, module in rows:
+        packages[module.split('.')[0]] += self_us
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['import_total_us'] = sum(self_us for self_us, _, _ in rows)
+    report['modules'] = len(rows)
+    report['packages'] = packages
+    return report
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Gate of Memory Startup Benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to boot')
+    parser.add_argument('--config', default='development', help='Configuration passed to create_app()')
+    parser.add_argument('--import-only', action='store_true', help='Import the app without building it')
+    parser.add_argument('--top', type=int, default=15, help='Packages to list by import time')
+    parser.add_argument('--budget-ms', type=float, help='Fail if the median import time exceeds this')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point for the startup benchmark."""
+    args = parse_arguments()
+    runs = [boot(args.config, build=not args.import_only) for _ in range(args.runs)]
+
+    import_ms = statistics.median(r['import_total_us'] for r in runs) / 1000
+    wall_ms = statistics.median(r['import_sec'] for r in runs) * 1000
+    build_ms = statistics.median(r['create_app_sec'] for r in runs) * 1000
+    packages = Counter()
+    for r in runs:
+        packages.update(r['packages'])
+
+    print(f"\n=== App startup ({args.runs} runs, median) ===")
+    print(f"modules imported  : {runs[0]['modules']}")
+    print(f"import time       : {import_ms:.1f} ms (-X importtime total), {wall_ms:.1f} ms wall")
+    if not args.import_only:
+        print(f"create_app()      : {build_ms:.1f} ms")
+    print(f"\n{'package':<24} | {'ms':>8}")
+    print("-" * 35)
+    for package, total_us in packages.most_common(args.top):
+        print(f"{package:<24} | {total_us / len(runs) / 1000:>8.1f}")
+
+    failed = False
+    eager = sorted({m for r in runs for m in r['eager']})
+    if eager:
+        print(f"\nImported at boot, should be lazy: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"\nImport time {import_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'runs': args.runs,
+                'import_ms': import_ms,
+                'import_wall_ms': wall_ms,
+                'create_app_ms': None if args.import_only else build_ms,
+                'modules': runs[0]['modules'],
+                'eager': eager,
+                'packages_ms': {p: us / len(runs) / 1000 for p, us in packages.most_common()},
+            }, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -100,17 +100,22 @@ def check_migrations():
     """Check if database migrations are up to date."""
     try:
         from app import create_app
-        from flask_migrate import current
+        from models import db
+        from database import migration_heads, database_revisions
         
         app = create_app()
         with app.app_context():
-            current_rev = current()
-            if current_rev is None:
-                print("\nNo migrations have been applied")
-                return False
-            
-            print(f"\nCurrent database revision: {current_rev}")
-            return True
+            current = database_revisions(db.engine)
+        if not current:
+            print("\nNo migrations have been applied")
+            return False
+        
+        heads = migration_heads()
+        print(f"\nCurrent database revision: {', '.join(sorted(current))}")
+        if current != heads:
+            print(f"Latest migration is {', '.join(sorted(heads))}: run 'flask db upgrade'")
+            return False
+        return True
     except Exception as e:
         print(f"\nError checking migrations: {str(e)}")
         return False
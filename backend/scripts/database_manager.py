@@ -8,9 +8,16 @@ including optimization, health checks, and maintenance tasks.
 import os
 import sys
 import time
+import re
+import json
+import signal
+import sqlite3
 import logging
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Dict, List, Optional, Any, Union, Tuple
 
 # Third-party imports
@@ -132,7 +139,7 @@ class DatabaseManager:
                 result = conn.execute(
                     text("""
                     SELECT pg_size_pretty(pg_database_size(current_database()))
-                    """
+                    """)
                 )
                 return result.scalar() or "0 B"
         except Exception as e:
@@ -155,17 +162,22 @@ class DatabaseManager:
                     FROM information_schema.tables
                     WHERE table_schema = 'public'
                     ORDER BY pg_total_relation_size(table_schema || '.' || table_name) DESC;
-                    """
+                    """)
                 )
                 return [dict(row) for row in result.mappings()]
         except Exception as e:
             logger.error(f"Error getting table sizes: {str(e)}")
             return []
     
+    def _autocommit(self):
+        """A connection outside any transaction block, as VACUUM and
+        REINDEX CONCURRENTLY require."""
+        return self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+    
     def analyze_tables(self) -> bool:
         """Run ANALYZE on all tables to update statistics."""
         try:
-            with self.engine.connect() as conn:
+            with self._autocommit() as conn:
                 conn.execute(text("ANALYZE"))
                 logger.info("Successfully analyzed all tables")
                 return True
@@ -174,9 +186,13 @@ class DatabaseManager:
             return False
     
     def vacuum_tables(self, full: bool = False, analyze: bool = True) -> bool:
-        """Run VACUUM on all tables to reclaim storage and update statistics."""
+        """Run VACUUM on all tables to reclaim storage and update statistics.
+        
+        VACUUM FULL rewrites every table under an exclusive lock; prefer
+        ``run_maintenance`` on a live database.
+        """
         try:
-            with self.engine.connect() as conn:
+            with self._autocommit() as conn:
                 vacuum_cmd = "VACUUM (VERBOSE, ANALYZE)" if analyze else "VACUUM (VERBOSE)"
                 if full:
                     vacuum_cmd = "VACUUM FULL (VERBOSE, ANALYZE)"
@@ -188,16 +204,205 @@ class DatabaseManager:
             return False
     
     def reindex_database(self) -> bool:
-        """Rebuild all indexes in the database."""
+        """Rebuild all indexes in the database.
+        
+        Blocks writes to each table while its indexes rebuild; prefer
+        ``run_maintenance``, which rebuilds bloated indexes concurrently.
+        """
         try:
-            with self.engine.connect() as conn:
-                conn.execute(text("REINDEX DATABASE " + self.db_params['dbname']))
+            with self._autocommit() as conn:
+                dbname = conn.execute(text("SELECT quote_ident(current_database())")).scalar()
+                conn.execute(text("REINDEX DATABASE " + dbname))
                 logger.info("Successfully reindexed the database")
                 return True
         except Exception as e:
             logger.error(f"Error reindexing database: {str(e)}")
             return False
     
+    def plan_maintenance(self, dead_ratio: float = 0.1, min_dead_rows: int = 1000,
+                         analyze_ratio: float = 0.1, stale_days: int = 7, bloat_ratio: float = 0.3,
+                         min_index_bytes: int = 10 * 1024 * 1024) -> List[Dict[str, Any]]:
+        """Select the tables and indexes that need maintenance now.
+        
+        - VACUUM (with ANALYZE) a table when at least ``dead_ratio`` of its
+          rows, and ``min_dead_rows``, are dead, or when it has dead rows and
+          was last vacuumed more than ``stale_days`` ago (or never)
+        - ANALYZE a table when ``analyze_ratio`` of its rows changed since
+          the last analyze, or it changed and was last analyzed more than
+          ``stale_days`` ago (or never)
+        - REINDEX CONCURRENTLY a btree index of ``min_index_bytes`` or more
+          when ``bloat_ratio`` of it is estimated to be bloat
+        
+        Returns:
+            Tasks as dicts with ``action``, ``target``, ``table`` and
+            ``reason``, worst first within each action
+        """
+        with self.engine.connect() as conn:
+            tables = conn.execute(text("""
+                SELECT
+                    relid::regclass::text AS target,
+                    relname,
+                    n_live_tup,
+                    n_dead_tup,
+                    n_mod_since_analyze,
+                    n_dead_tup::float / greatest(n_live_tup + n_dead_tup, 1) AS dead_ratio,
+                    n_mod_since_analyze::float / greatest(n_live_tup, 1) AS changed_ratio,
+                    extract(epoch FROM now() - greatest(last_vacuum, last_autovacuum)) / 86400 AS vacuum_age_days,
+                    extract(epoch FROM now() - greatest(last_analyze, last_autoanalyze)) / 86400 AS analyze_age_days
+                FROM pg_stat_user_tables
+                ORDER BY n_dead_tup DESC, n_mod_since_analyze DESC
+            """)).mappings().all()
+            indexes = conn.execute(text(INDEX_BLOAT_SQL)).mappings().all()
+        
+        tasks = []
+        for table in tables:
+            reason = None
+            if table['n_dead_tup'] >= min_dead_rows and table['dead_ratio'] >= dead_ratio:
+                reason = f"{table['dead_ratio']:.0%} dead rows ({table['n_dead_tup']})"
+            elif table['n_dead_tup'] and (table['vacuum_age_days'] is None
+                                          or table['vacuum_age_days'] >= stale_days):
+                reason = ('never vacuumed' if table['vacuum_age_days'] is None
+                          else f"last vacuumed {table['vacuum_age_days']:.0f} days ago")
+            if reason:
+                tasks.append({'action': 'vacuum', 'target': table['target'], 'table': table['relname'],
+                              'reason': reason})
+                continue  # VACUUM (ANALYZE) covers the statistics too
+            
+            if not table['n_mod_since_analyze']:
+                continue
+            if table['changed_ratio'] >= analyze_ratio:
+                reason = f"{table['changed_ratio']:.0%} of rows changed since last analyze"
+            elif table['analyze_age_days'] is None:
+                reason = 'never analyzed'
+            elif table['analyze_age_days'] >= stale_days:
+                reason = f"last analyzed {table['analyze_age_days']:.0f} days ago"
+            if reason:
+                tasks.append({'action': 'analyze', 'target': table['target'], 'table': table['relname'],
+                              'reason': reason})
+        
+        bloated = [index for index in indexes
+                   if index['is_valid'] and index['bloat_bytes'] is not None
+                   and index['bytes'] >= min_index_bytes and index['bloat_bytes'] >= bloat_ratio * index['bytes']]
+        for index in sorted(bloated, key=lambda index: index['bloat_bytes'], reverse=True):
+            tasks.append({'action': 'reindex', 'target': index['qualified_name'], 'table': index['relname'],
+                          'reason': f"~{index['bloat_bytes'] / index['bytes']:.0%} bloat "
+                                    f"({self._format_size(index['bloat_bytes'])} of "
+                                    f"{self._format_size(index['bytes'])})"})
+        return tasks
+    
+    def run_maintenance(self, tasks: List[Dict[str, Any]], lock_timeout: str = '5s',
+                        max_wait: float = 600, backoff: float = 5, max_backoff: float = 120) -> List[Dict[str, Any]]:
+        """Run the tasks from plan_maintenance one at a time, in autocommit.
+        
+        Before each task, lock contention is checked; while any session is
+        blocked the scheduler waits, doubling the pause from ``backoff`` up
+        to ``max_backoff`` seconds. A task still waiting after ``max_wait``
+        seconds, or that cannot get its table lock within ``lock_timeout``,
+        is skipped and left to the next run. An interrupted REINDEX
+        CONCURRENTLY leaves an invalid ``_ccnew`` index behind, which is
+        dropped.
+        
+        Returns:
+            The tasks, each with a ``status`` (done, skipped or failed) and
+            the ``seconds`` it took
+        """
+        with self.engine.connect() as conn:
+            concurrent_reindex = int(conn.execute(text("SHOW server_version_num")).scalar()) >= 120000
+        
+        for task in tasks:
+            if not self._wait_for_no_contention(task, max_wait, backoff, max_backoff):
+                task.update(status='skipped', seconds=0, error='lock contention')
+                continue
+            if task['action'] == 'reindex' and not concurrent_reindex:
+                task.update(status='skipped', seconds=0, error='REINDEX CONCURRENTLY needs PostgreSQL 12')
+                continue
+            
+            statement = {
+                'vacuum': 'VACUUM (ANALYZE) {}',
+                'analyze': 'ANALYZE {}',
+                'reindex': 'REINDEX INDEX CONCURRENTLY {}',
+            }[task['action']].format(task['target'])
+            started = time.time()
+            try:
+                with self._autocommit() as conn:
+                    # Session settings outlive the checkout on a pooled
+                    # connection, so they are reset before it goes back
+                    conn.execute(text("SELECT set_config('lock_timeout', :timeout, false), "
+                                      "set_config('statement_timeout', '0', false)"), {'timeout': lock_timeout})
+                    try:
+                        conn.execute(text(statement))
+                    finally:
+                        conn.execute(text("RESET lock_timeout"))
+                        conn.execute(text("RESET statement_timeout"))
+                task.update(status='done', seconds=round(time.time() - started, 3))
+                logger.info(f"{statement} ({task['reason']}): {task['seconds']:.1f}s")
+            except Exception as e:
+                lock_timed_out = getattr(getattr(e, 'orig', None), 'pgcode', None) == '55P03'
+                task.update(status='skipped' if lock_timed_out else 'failed',
+                            seconds=round(time.time() - started, 3),
+                            error='lock timeout' if lock_timed_out else str(e).splitlines()[0])
+                logger.warning(f"{statement} {task['status']}: {task['error']}")
+                if task['action'] == 'reindex':
+                    self._drop_invalid_reindex_leftovers(task['target'])
+        return tasks
+    
+    def _wait_for_no_contention(self, task, max_wait, backoff, max_backoff) -> bool:
+        waited, pause = 0.0, backoff
+        while self.get_lock_contention():
+            if waited >= max_wait:
+                return False
+            sleep = min(pause, max_wait - waited)
+            logger.info(f"Lock contention, pausing {sleep:.0f}s before {task['action']} {task['target']}")
+            time.sleep(sleep)
+            waited += sleep
+            pause = min(pause * 2, max_backoff)
+        return True
+    
+    def _drop_invalid_reindex_leftovers(self, index: str) -> None:
+        try:
+            with self._autocommit() as conn:
+                leftovers = conn.execute(text("""
+                    SELECT i.indexrelid::regclass::text
+                    FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE NOT i.indisvalid
+                    AND i.indrelid = (SELECT indrelid FROM pg_index WHERE indexrelid = CAST(:index AS regclass))
+                    AND c.relname LIKE (SELECT relname FROM pg_class WHERE oid = CAST(:index AS regclass)) || '_ccnew%'
+                """), {'index': index}).scalars().all()
+                for leftover in leftovers:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {leftover}"))
+                    logger.info(f"Dropped invalid index {leftover} left by the failed rebuild")
+        except Exception as e:
+            logger.error(f"Error dropping leftovers of REINDEX {index}: {str(e)}")
+    
+    def maintain(self, interval: Optional[int] = None, dry_run: bool = False, lock_timeout: str = '5s',
+                 max_wait: float = 600, **thresholds) -> List[Dict[str, Any]]:
+        """Plan and run maintenance once, or every ``interval`` seconds until
+        SIGTERM or Ctrl-C when ``interval`` is given (for a long-running
+        container instead of cron). In that mode a failed run, e.g. while the
+        database is unreachable, is logged and retried at the next interval.
+        
+        Returns:
+            The tasks of the last successful run
+        """
+        stop = threading.Event()
+        if interval:
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        tasks = []
+        while True:
+            try:
+                planned = self.plan_maintenance(**thresholds)
+                if not dry_run:
+                    planned = self.run_maintenance(planned, lock_timeout=lock_timeout, max_wait=max_wait)
+                tasks = planned
+                done = sum(task.get('status') == 'done' for task in tasks)
+                logger.info(f"Maintenance: {len(tasks)} tasks planned" + ('' if dry_run else f", {done} done"))
+            except Exception as e:
+                if not interval:
+                    raise
+                logger.error(f"Maintenance run failed, retrying in {interval}s: {str(e)}")
+            if not interval or stop.wait(interval):
+                return tasks
+    
     def check_connection_pool(self) -> Dict[str, Union[int, str]]:
         """Check the database connection pool status."""
         try:
@@ -225,6 +430,9 @@ class DatabaseManager:
     def get_long_running_queries(self, threshold_seconds: int = 60) -> List[Dict]:
         """Get queries that have been running longer than the threshold.
         
+        Only sees queries running right now; see get_statement_report for
+        the cumulative cost of each statement.
+        
         Args:
             threshold_seconds: Minimum duration in seconds to consider a query as long-running
             
@@ -232,20 +440,26 @@ class DatabaseManager:
             List of dictionaries containing query information
         """
         try:
-            return self._execute_sql("""
-                SELECT 
-                    pid,
-                    now() - query_start as duration,
-                    query,
-                    state,
-                    usename,
-                    application_name,
-                    client_addr
-                FROM pg_stat_activity
-                WHERE now() - query_start > interval ':threshold seconds'
-                AND state != 'idle'
-                ORDER BY duration DESC;
-            """, {'threshold': str(threshold_seconds)})
+            with self.engine.connect() as conn:
+                result = conn.execute(
+                    text("""
+                    SELECT 
+                        pid,
+                        now() - query_start as duration,
+                        query,
+                        state,
+                        usename,
+                        application_name,
+                        client_addr
+                    FROM pg_stat_activity
+                    WHERE now() - query_start > make_interval(secs => :threshold)
+                    AND state != 'idle'
+                    AND pid != pg_backend_pid()
+                    ORDER BY duration DESC;
+                    """),
+                    {'threshold': threshold_seconds}
+                )
+                return [dict(row) for row in result.mappings()]
         except Exception as e:
             logger.error(f"Error getting long running queries: {str(e)}")
             return []
@@ -287,9 +501,8 @@ class DatabaseManager:
                         idx_tup_fetch as tuples_fetched,
                         pg_size_pretty(pg_relation_size(indexrelid)) as index_size
                     FROM pg_stat_user_indexes
-                    JOIN pg_statio_user_indexes USING (indexrelid, relid)
                     ORDER BY pg_relation_size(indexrelid) DESC;
-                    """
+                    """)
                 )
                 return [dict(row) for row in result.mappings()]
         except Exception as e:
@@ -354,33 +567,526 @@ class DatabaseManager:
                         AND blocking_locks.pid != blocked_locks.pid
                     JOIN pg_catalog.pg_stat_activity blocking_activity ON blocking_activity.pid = blocking_locks.pid
                     WHERE NOT blocked_locks.GRANTED;
-                    """
+                    """)
                 )
                 return [dict(row) for row in result.mappings()]
         except Exception as e:
             logger.error(f"Error getting lock contention: {str(e)}")
             return []
     
-    def _get_database_health(self):
-        """Get overall database health metrics."""
+    def get_statement_report(self, limit: int = 20, min_calls: int = 5) -> Dict[str, List[Dict]]:
+        """Rank normalized statements from pg_stat_statements.
+        
+        Statements of this database are ranked by total execution time (what
+        costs the server most overall) and, among those called at least
+        ``min_calls`` times, by mean time (what makes single requests slow).
+        Each row carries the application call site from the statement's
+        ``/* callsite=... */`` comment (monitoring/querytags.py), when present.
+        
+        Returns:
+            Dict with ``by_total`` and ``by_mean`` lists, empty if
+            pg_stat_statements is not available
+        """
         try:
-            return {
-                'version': self._get_pg_version(),
-                'database_size': self._get_database_size(),
-                'connection_pool': self._get_connection_pool_stats(),
-                'long_running_queries': self._get_long_running_queries(),
-                'unused_indexes': self._get_unused_indexes(),
-                'lock_contention': self._get_lock_contention(),
-                'table_sizes': self._get_table_sizes(),
-                'index_usage': self._get_index_usage(),
-            }
+            with self.engine.connect() as conn:
+                version = conn.execute(text("SHOW server_version_num")).scalar()
+                # Renamed in PostgreSQL 13
+                total, mean = (('total_exec_time', 'mean_exec_time') if int(version) >= 130000
+                               else ('total_time', 'mean_time'))
+                statement = f"""
+                    SELECT
+                        queryid,
+                        calls,
+                        {total} AS total_ms,
+                        {mean} AS mean_ms,
+                        rows,
+                        100 * {total} / nullif(sum({total}) OVER (), 0) AS percent_of_total,
+                        100.0 * shared_blks_hit / nullif(shared_blks_hit + shared_blks_read, 0) AS cache_hit_percent,
+                        query
+                    FROM pg_stat_statements
+                    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                    AND calls >= :min_calls
+                    ORDER BY {{order}} DESC
+                    LIMIT :limit
+                """
+                return {
+                    'by_total': [_statement_row(row) for row in conn.execute(
+                        text(statement.format(order=total)), {'min_calls': 1, 'limit': limit}).mappings()],
+                    'by_mean': [_statement_row(row) for row in conn.execute(
+                        text(statement.format(order=mean)), {'min_calls': min_calls, 'limit': limit}).mappings()],
+                }
         except Exception as e:
-            logger.error(f"Error getting database health: {str(e)}")
-            return {}
+            logger.error(f"Error reading pg_stat_statements (is it in shared_preload_libraries and "
+                         f"created with CREATE EXTENSION pg_stat_statements?): {str(e)}")
+            return {'by_total': [], 'by_mean': []}
+    
+    def get_index_advice(self, min_rows: int = 10000, min_seq_scans: int = 100,
+                         statements: int = 500) -> List[Dict]:
+        """Suggest indexes for tables that are mostly read by sequential scans.
+        
+        Tables with at least ``min_rows`` live rows and ``min_seq_scans``
+        sequential scans are candidates. For each, the columns compared in
+        the WHERE clauses of the ``statements`` most expensive statements in
+        pg_stat_statements are ranked by the time of those statements, and
+        the top column that does not already lead an index is suggested.
+        Without pg_stat_statements the tables are still listed, without a
+        suggestion.
+        
+        Returns:
+            List of dictionaries, one per candidate table, worst first
+        """
+        try:
+            with self.engine.connect() as conn:
+                tables = [dict(row) for row in conn.execute(
+                    text("""
+                    SELECT
+                        relname AS table_name,
+                        seq_scan,
+                        seq_tup_read / greatest(seq_scan, 1) AS avg_rows_per_seq_scan,
+                        coalesce(idx_scan, 0) AS idx_scan,
+                        n_live_tup AS live_rows
+                    FROM pg_stat_user_tables
+                    WHERE n_live_tup >= :min_rows AND seq_scan >= :min_seq_scans
+                    ORDER BY seq_tup_read DESC
+                    """),
+                    {'min_rows': min_rows, 'min_seq_scans': min_seq_scans}
+                ).mappings()]
+                if not tables:
+                    return []
+                
+                leading = {(table, column) for table, column in conn.execute(text("""
+                    SELECT c.relname, a.attname
+                    FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indrelid
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                """))}
+                
+                top = []
+                if conn.execute(text("SELECT to_regclass('pg_stat_statements') IS NOT NULL")).scalar():
+                    version = int(conn.execute(text("SHOW server_version_num")).scalar())
+                    total = 'total_exec_time' if version >= 130000 else 'total_time'
+                    top = conn.execute(text(f"""
+                        SELECT query, calls, {total} AS total_ms
+                        FROM pg_stat_statements
+                        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                        ORDER BY {total} DESC
+                        LIMIT :statements
+                    """), {'statements': statements}).all()
+        except Exception as e:
+            logger.error(f"Error building index advice: {str(e)}")
+            return []
+        
+        for table in tables:
+            name = table['table_name']
+            columns = {}
+            for query, calls, total_ms in top:
+                for column in set(predicate_columns(query, name)):
+                    entry = columns.setdefault(column, {'column': column, 'statements': 0, 'calls': 0,
+                                                        'total_ms': 0.0})
+                    entry['statements'] += 1
+                    entry['calls'] += calls
+                    entry['total_ms'] += total_ms
+            ranked = sorted(columns.values(), key=lambda entry: entry['total_ms'], reverse=True)
+            for entry in ranked:
+                entry['indexed'] = (name, entry['column']) in leading
+            table['columns'] = ranked
+            unindexed = next((entry['column'] for entry in ranked if not entry['indexed']), None)
+            table['suggestion'] = (f'CREATE INDEX CONCURRENTLY idx_{name}_{unindexed} ON "{name}" ({unindexed})'
+                                   if unindexed else None)
+        return tables
+    
+    def get_version(self) -> str:
+        """Get the PostgreSQL server version."""
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(text("SHOW server_version")).scalar()
+        except Exception as e:
+            logger.error(f"Error getting server version: {str(e)}")
+            return "Unknown"
     
-    def get_database_health(self) -> Dict:
-        """Get a comprehensive health check of the database."""
-        return self._get_database_health()
+    def get_database_health(self, workers: int = 4) -> Dict:
+        """Get a comprehensive health check of the database.
+        
+        The checks run concurrently, each on its own pooled connection.
+        """
+        checks = {
+            'version': self.get_version,
+            'database_size': self.get_database_size,
+            'connection_pool': self.check_connection_pool,
+            'long_running_queries': self.get_long_running_queries,
+            'unused_indexes': self.get_unused_indexes,
+            'lock_contention': self.get_lock_contention,
+            'table_sizes': self.get_table_sizes,
+            'index_usage': self.get_index_usage,
+        }
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(check) for name, check in checks.items()}
+            return {name: future.result() for name, future in futures.items()}
+    
+    def collect_snapshot(self, workers: int = 3, long_query_seconds: int = 60) -> Dict[str, Any]:
+        """Collect numeric health metrics for the time-series history.
+        
+        Each collector in HEALTH_COLLECTORS runs concurrently on its own
+        pooled connection, with a statement timeout so a stuck catalog
+        query cannot stall the snapshot. A failed collector is logged and
+        left out of the snapshot.
+        
+        Args:
+            workers: Collectors to run at once
+            long_query_seconds: Age from which a running query counts as long-running
+            
+        Returns:
+            Dict with the snapshot time ``ts``, its ``samples`` as
+            ``(metric, labels, value)`` tuples, the collection ``seconds``
+            and the collectors that failed under ``errors``
+        """
+        started = time.time()
+        collectors = dict(HEALTH_COLLECTORS)
+        collectors['activity'] = partial(_activity_samples, threshold=long_query_seconds)
+        
+        def run(collector):
+            with self.engine.begin() as conn:
+                conn.execute(text("SET LOCAL statement_timeout = '10s'"))
+                return [(metric, tuple(sorted(labels.items())), float(value or 0))
+                        for metric, labels, value in collector(conn)]
+        
+        samples, errors = [], []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(run, collector) for name, collector in collectors.items()}
+            for name, future in futures.items():
+                try:
+                    samples.extend(future.result())
+                except Exception as e:
+                    logger.error(f"Health collector '{name}' failed: {str(e)}")
+                    errors.append(name)
+        
+        seconds = time.time() - started
+        samples.append(('db_health_collect_seconds', (), seconds))
+        samples.append(('db_health_collector_errors', (), float(len(errors))))
+        return {'ts': int(started), 'samples': samples, 'seconds': seconds, 'errors': errors}
+    
+    def watch(self, history: 'HealthHistory', interval: int = 60, workers: int = 3,
+              retention_days: int = 30, long_query_seconds: int = 60, metrics_port: Optional[int] = None,
+              metrics_file: Optional[str] = None, iterations: Optional[int] = None) -> int:
+        """Collect a health snapshot every ``interval`` seconds until stopped.
+        
+        Snapshots are appended to ``history`` and snapshots older than
+        ``retention_days`` are pruned. The latest snapshot is served as
+        Prometheus gauges on ``metrics_port`` and/or written for the node
+        exporter's textfile collector. Stops on SIGTERM, Ctrl-C or after
+        ``iterations`` snapshots.
+        
+        Returns:
+            Number of snapshots taken
+        """
+        from prometheus_client import CollectorRegistry, start_http_server, write_to_textfile
+        
+        latest = SnapshotCollector()
+        registry = CollectorRegistry()
+        registry.register(latest)
+        if metrics_port:
+            start_http_server(metrics_port, registry=registry)
+            logger.info(f"Serving database health metrics on port {metrics_port}")
+        
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        taken = 0
+        next_run = time.monotonic()
+        while not stop.is_set():
+            snapshot = self.collect_snapshot(workers, long_query_seconds)
+            history.add(snapshot)
+            history.prune(snapshot['ts'] - retention_days * 86400)
+            latest.samples = snapshot['samples']
+            if metrics_file:
+                write_to_textfile(metrics_file, registry)
+            taken += 1
+            logger.info(f"Health snapshot: {len(snapshot['samples'])} samples in {snapshot['seconds']:.2f}s"
+                        + (f", failed: {', '.join(snapshot['errors'])}" if snapshot['errors'] else ''))
+            if iterations and taken >= iterations:
+                break
+            # Keep to the schedule; skip slots missed by a slow snapshot
+            next_run += interval
+            while next_run < time.monotonic():
+                next_run += interval
+            stop.wait(next_run - time.monotonic())
+        return taken
+
+# Statement reports (slow-queries, index-advice)
+
+CALLSITE_PATTERN = re.compile(r'\s*/\* callsite=(\S+) \*/')
+
+def _statement_row(row) -> Dict[str, Any]:
+    """A pg_stat_statements row with its call-site comment split out."""
+    row = dict(row)
+    match = CALLSITE_PATTERN.search(row['query'])
+    row['callsite'] = match.group(1) if match else None
+    row['query'] = CALLSITE_PATTERN.sub('', row['query']).strip()
+    return row
+
+def predicate_columns(query: str, table: str) -> List[str]:
+    """Columns of ``table`` compared in the WHERE clause of a normalized statement.
+    
+    Matches the qualified ``table.column <op>`` form SQLAlchemy emits
+    (quoted or not). Joins and ORDER BY are not considered.
+    """
+    where = re.split(r'\bWHERE\b', query, maxsplit=1, flags=re.IGNORECASE)
+    if len(where) < 2:
+        return []
+    clause = re.split(r'\b(?:GROUP BY|ORDER BY|LIMIT|RETURNING)\b', where[1], maxsplit=1, flags=re.IGNORECASE)[0]
+    pattern = re.compile(
+        rf'(?<![\w.]){re.escape(table)}\."?(\w+)"?\s*(?:=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bILIKE\b|\bIS\b|\bBETWEEN\b)',
+        re.IGNORECASE)
+    return pattern.findall(clause.replace(f'"{table}"', table))
+
+# Health snapshots (health --watch)
+
+HEALTH_METRICS = {
+    'db_size_bytes': 'Size of the database',
+    'db_deadlocks': 'Deadlocks detected since statistics were reset',
+    'db_xact_commit': 'Transactions committed since statistics were reset',
+    'db_xact_rollback': 'Transactions rolled back since statistics were reset',
+    'db_temp_bytes': 'Bytes written to temporary files since statistics were reset',
+    'db_blks_read': 'Blocks read from disk since statistics were reset',
+    'db_blks_hit': 'Blocks found in shared buffers since statistics were reset',
+    'db_connections': 'Connections to the database by state',
+    'db_table_bytes': 'Size of the table, without indexes',
+    'db_table_index_bytes': 'Size of all indexes of the table',
+    'db_table_live_rows': 'Estimated live rows',
+    'db_table_dead_rows': 'Estimated dead rows',
+    'db_table_seq_scans': 'Sequential scans of the table',
+    'db_table_index_scans': 'Index scans of the table',
+    'db_index_bytes': 'Size of the index',
+    'db_index_scans': 'Scans of the index',
+    'db_index_bloat_bytes': 'Estimated bloat of a btree index',
+    'db_lock_waits': 'Lock requests waiting, by lock mode',
+    'db_lock_wait_longest_seconds': 'Age of the oldest query waiting for a lock, by lock mode',
+    'db_blocked_sessions': 'Sessions blocked by another session',
+    'db_long_running_queries': 'Queries running longer than the threshold',
+    'db_longest_query_seconds': 'Age of the oldest running query',
+    'db_oldest_transaction_seconds': 'Age of the oldest open transaction',
+    'db_health_collect_seconds': 'Time taken to collect the snapshot',
+    'db_health_collector_errors': 'Health collectors that failed in the snapshot',
+}
+
+def _database_samples(conn):
+    row = conn.execute(text("""
+        SELECT pg_database_size(current_database()) AS size_bytes,
+               deadlocks, xact_commit, xact_rollback, temp_bytes, blks_read, blks_hit
+        FROM pg_stat_database WHERE datname = current_database()
+    """)).mappings().one()
+    for column, value in row.items():
+        yield f'db_{column}', {}, value
+
+def _connection_samples(conn):
+    for state, count in conn.execute(text("""
+        SELECT coalesce(state, 'unknown'), count(*)
+        FROM pg_stat_activity WHERE datname = current_database()
+        GROUP BY 1
+    """)):
+        yield 'db_connections', {'state': state}, count
+
+def _table_samples(conn):
+    for row in conn.execute(text("""
+        SELECT relname, pg_table_size(relid) AS table_bytes, pg_indexes_size(relid) AS index_bytes,
+               n_live_tup, n_dead_tup, seq_scan, idx_scan
+        FROM pg_stat_user_tables
+    """)).mappings():
+        labels = {'table': row['relname']}
+        yield 'db_table_bytes', labels, row['table_bytes']
+        yield 'db_table_index_bytes', labels, row['index_bytes']
+        yield 'db_table_live_rows', labels, row['n_live_tup']
+        yield 'db_table_dead_rows', labels, row['n_dead_tup']
+        yield 'db_table_seq_scans', labels, row['seq_scan']
+        yield 'db_table_index_scans', labels, row['idx_scan']
+
+# Bloat is estimated from the planner's row count and the average width of
+# the indexed columns: pages beyond what the rows need at the default 90%
+# fillfactor, with 12 bytes of tuple header and line pointer per row. Only
+# meaningful for btree indexes, and only after ANALYZE.
+INDEX_BLOAT_SQL = """
+    SELECT s.relname, s.indexrelname, s.indexrelid::regclass::text AS qualified_name, s.idx_scan,
+           i.indisvalid AS is_valid,
+           pg_relation_size(s.indexrelid) AS bytes,
+           CASE WHEN am.amname = 'btree' THEN greatest(
+               pg_relation_size(s.indexrelid) - current_setting('block_size')::bigint * (1 + ceil(
+                   c.reltuples * (12 + coalesce(w.width, 8)) / (current_setting('block_size')::int * 0.9)
+               )), 0) END AS bloat_bytes
+    FROM pg_stat_user_indexes s
+    JOIN pg_class c ON c.oid = s.indexrelid
+    JOIN pg_am am ON am.oid = c.relam
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    LEFT JOIN LATERAL (
+        SELECT sum(st.avg_width) AS width
+        FROM pg_attribute a
+        JOIN pg_stats st ON st.schemaname = s.schemaname AND st.tablename = s.relname
+            AND st.attname = a.attname
+        WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+    ) w ON true
+"""
+
+def _index_samples(conn):
+    for row in conn.execute(text(INDEX_BLOAT_SQL)).mappings():
+        labels = {'table': row['relname'], 'index': row['indexrelname']}
+        yield 'db_index_bytes', labels, row['bytes']
+        yield 'db_index_scans', labels, row['idx_scan']
+        if row['bloat_bytes'] is not None:
+            yield 'db_index_bloat_bytes', labels, row['bloat_bytes']
+
+def _lock_samples(conn):
+    for mode, waiting, longest in conn.execute(text("""
+        SELECT l.mode, count(*), extract(epoch FROM max(now() - a.query_start))
+        FROM pg_locks l JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE NOT l.granted AND a.datname = current_database()
+        GROUP BY l.mode
+    """)):
+        yield 'db_lock_waits', {'mode': mode}, waiting
+        yield 'db_lock_wait_longest_seconds', {'mode': mode}, longest
+    yield 'db_blocked_sessions', {}, conn.execute(text("""
+        SELECT count(*) FROM pg_stat_activity
+        WHERE datname = current_database() AND cardinality(pg_blocking_pids(pid)) > 0
+    """)).scalar()
+
+def _activity_samples(conn, threshold=60):
+    row = conn.execute(text("""
+        SELECT count(*) FILTER (WHERE now() - query_start > make_interval(secs => :threshold)) AS long_running,
+               extract(epoch FROM max(now() - query_start)) AS longest_query,
+               extract(epoch FROM max(now() - xact_start)) AS oldest_transaction
+        FROM pg_stat_activity
+        WHERE datname = current_database() AND state <> 'idle' AND pid <> pg_backend_pid()
+    """), {'threshold': threshold}).mappings().one()
+    yield 'db_long_running_queries', {}, row['long_running']
+    yield 'db_longest_query_seconds', {}, row['longest_query']
+    yield 'db_oldest_transaction_seconds', {}, row['oldest_transaction']
+
+HEALTH_COLLECTORS = {
+    'database': _database_samples,
+    'connections': _connection_samples,
+    'tables': _table_samples,
+    'indexes': _index_samples,
+    'locks': _lock_samples,
+    'activity': _activity_samples,
+}
+
+class HealthHistory:
+    """Health snapshots in a local SQLite file.
+    
+    Each distinct metric and label set is stored once in ``series``; a
+    snapshot adds one ``(ts, series_id, value)`` row per series to a
+    WITHOUT ROWID table clustered by time, so a snapshot of a few hundred
+    series costs a few kilobytes and range scans and pruning stay cheap.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS series (
+            id INTEGER PRIMARY KEY,
+            metric TEXT NOT NULL,
+            labels TEXT NOT NULL,
+            UNIQUE (metric, labels)
+        );
+        CREATE TABLE IF NOT EXISTS snapshot (
+            ts INTEGER PRIMARY KEY,
+            seconds REAL NOT NULL,
+            errors TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sample (
+            ts INTEGER NOT NULL,
+            series_id INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (ts, series_id)
+        ) WITHOUT ROWID;
+    """
+    
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        self._series = {(metric, labels): series_id for series_id, metric, labels
+                        in self.conn.execute('SELECT id, metric, labels FROM series')}
+    
+    def _series_id(self, metric: str, labels: Tuple) -> int:
+        key = (metric, json.dumps(dict(labels), sort_keys=True))
+        if key not in self._series:
+            self._series[key] = self.conn.execute(
+                'INSERT INTO series (metric, labels) VALUES (?, ?)', key).lastrowid
+        return self._series[key]
+    
+    def add(self, snapshot: Dict[str, Any]) -> None:
+        """Store a snapshot from DatabaseManager.collect_snapshot."""
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO snapshot VALUES (?, ?, ?)',
+                              (snapshot['ts'], snapshot['seconds'], ','.join(snapshot['errors'])))
+            self.conn.executemany('INSERT OR REPLACE INTO sample VALUES (?, ?, ?)', [
+                (snapshot['ts'], self._series_id(metric, labels), value)
+                for metric, labels, value in snapshot['samples']
+            ])
+    
+    def prune(self, before: int) -> int:
+        """Delete snapshots taken before the ``before`` timestamp."""
+        with self.conn:
+            self.conn.execute('DELETE FROM sample WHERE ts < ?', (before,))
+            return self.conn.execute('DELETE FROM snapshot WHERE ts < ?', (before,)).rowcount
+    
+    def snapshot_times(self) -> List[int]:
+        return [ts for (ts,) in self.conn.execute('SELECT ts FROM snapshot ORDER BY ts')]
+    
+    def values(self, ts: int) -> Dict[Tuple[str, str], float]:
+        """``{(metric, labels JSON): value}`` for the snapshot taken at ``ts``."""
+        return {(metric, labels): value for metric, labels, value in self.conn.execute(
+            'SELECT s.metric, s.labels, v.value FROM sample v JOIN series s ON s.id = v.series_id '
+            'WHERE v.ts = ?', (ts,))}
+    
+    def diff(self, since: int, until: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Compare the first snapshot at or after ``since`` with the last one
+        at or before ``until`` (default: the latest).
+        
+        Returns:
+            One dict per series with ``metric``, ``labels``, ``before``,
+            ``after`` and ``change``; a series missing from one side has
+            None there
+        """
+        first = self.conn.execute('SELECT min(ts) FROM snapshot WHERE ts >= ?', (since,)).fetchone()[0]
+        last = self.conn.execute('SELECT max(ts) FROM snapshot WHERE ts <= ?',
+                                 (until if until is not None else 2 ** 62,)).fetchone()[0]
+        if first is None or last is None:
+            return []
+        before, after = self.values(first), self.values(last)
+        rows = []
+        for key in sorted(before.keys() | after.keys()):
+            old, new = before.get(key), after.get(key)
+            rows.append({'metric': key[0], 'labels': json.loads(key[1]), 'before': old, 'after': new,
+                         'change': new - old if old is not None and new is not None else None})
+        return rows
+    
+    def close(self) -> None:
+        self.conn.close()
+
+class SnapshotCollector:
+    """Prometheus collector serving the samples of the latest snapshot.
+    
+    ``samples`` is swapped as a whole, so a scrape never sees half of two
+    snapshots, and series that disappeared (a dropped table) are not kept.
+    """
+    
+    def __init__(self):
+        self.samples = []
+    
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+        
+        families = {}
+        for metric, labels, value in self.samples:
+            family = families.get(metric)
+            if family is None:
+                family = families[metric] = GaugeMetricFamily(
+                    metric, HEALTH_METRICS.get(metric, metric), labels=[name for name, _ in labels])
+            family.add_metric([label for _, label in labels], value)
+        return iter(families.values())
+
+def parse_duration(value: str) -> int:
+    """Parse ``90s``, ``15m``, ``24h`` or ``7d`` into seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -394,6 +1100,28 @@ def parse_arguments():
     
     # Health check command
     health_parser = subparsers.add_parser('health', help='Check database health')
+    health_parser.add_argument('--watch', action='store_true',
+                               help='Keep collecting snapshots into the history file')
+    health_parser.add_argument('--interval', type=int, default=60,
+                               help='Seconds between snapshots (default: 60)')
+    health_parser.add_argument('--history', default=os.getenv('DB_HEALTH_HISTORY', 'db_health.sqlite'),
+                               help='Snapshot history file (default: db_health.sqlite)')
+    health_parser.add_argument('--retention-days', type=int, default=30,
+                               help='Days of snapshots to keep (default: 30)')
+    health_parser.add_argument('--workers', type=int, default=3,
+                               help='Collectors to run concurrently (default: 3)')
+    health_parser.add_argument('--threshold', type=int, default=60,
+                               help='Seconds after which a query counts as long-running (default: 60)')
+    health_parser.add_argument('--metrics-port', type=int, help='Serve the latest snapshot to Prometheus on this port')
+    health_parser.add_argument('--metrics-file', help='Write the latest snapshot for the node exporter textfile collector')
+    
+    # Health history diff command
+    diff_parser = subparsers.add_parser('health-diff', help='Compare health snapshots over time')
+    diff_parser.add_argument('--history', default=os.getenv('DB_HEALTH_HISTORY', 'db_health.sqlite'),
+                             help='Snapshot history file (default: db_health.sqlite)')
+    diff_parser.add_argument('--since', default='24h', help='Compare against this long ago, e.g. 6h or 7d (default: 24h)')
+    diff_parser.add_argument('--metric', help='Only metrics starting with this, e.g. db_table_bytes')
+    diff_parser.add_argument('--limit', type=int, default=20, help='Largest changes to show (default: 20)')
     
     # Analyze command
     analyze_parser = subparsers.add_parser('analyze', help='Analyze database tables')
@@ -403,6 +1131,23 @@ def parse_arguments():
     vacuum_parser.add_argument('--full', action='store_true', help='Run VACUUM FULL')
     vacuum_parser.add_argument('--analyze', action='store_true', help='Run ANALYZE after vacuum')
     
+    # Maintenance scheduler command
+    maintain_parser = subparsers.add_parser('maintain', help='VACUUM/ANALYZE/REINDEX only what needs it, online')
+    maintain_parser.add_argument('--dry-run', action='store_true', help='Only show the planned tasks')
+    maintain_parser.add_argument('--every', help='Keep running, once per period, e.g. 1h (default: run once)')
+    maintain_parser.add_argument('--dead-ratio', type=float, default=0.1,
+                                 help='Dead row fraction that triggers VACUUM (default: 0.1)')
+    maintain_parser.add_argument('--analyze-ratio', type=float, default=0.1,
+                                 help='Changed row fraction that triggers ANALYZE (default: 0.1)')
+    maintain_parser.add_argument('--stale-days', type=int, default=7,
+                                 help='Days after which a changed table is vacuumed/analyzed anyway (default: 7)')
+    maintain_parser.add_argument('--bloat-ratio', type=float, default=0.3,
+                                 help='Estimated index bloat fraction that triggers REINDEX (default: 0.3)')
+    maintain_parser.add_argument('--lock-timeout', default='5s',
+                                 help='Give up on a table lock after this long (default: 5s)')
+    maintain_parser.add_argument('--max-wait', type=float, default=600,
+                                 help='Seconds to wait out lock contention before skipping a task (default: 600)')
+    
     # Reindex command
     reindex_parser = subparsers.add_parser('reindex', help='Reindex database')
     
@@ -417,6 +1162,19 @@ def parse_arguments():
     long_queries_parser.add_argument('--threshold', type=int, default=60, 
                                     help='Threshold in seconds (default: 60)')
     
+    # Statement report command
+    slow_parser = subparsers.add_parser('slow-queries', help='Rank statements from pg_stat_statements')
+    slow_parser.add_argument('--limit', type=int, default=20, help='Statements per ranking (default: 20)')
+    slow_parser.add_argument('--min-calls', type=int, default=5,
+                             help='Minimum calls to rank by mean time (default: 5)')
+    
+    # Index advice command
+    advice_parser = subparsers.add_parser('index-advice', help='Suggest indexes for sequentially scanned tables')
+    advice_parser.add_argument('--min-rows', type=int, default=10000,
+                               help='Minimum live rows of a table (default: 10000)')
+    advice_parser.add_argument('--min-seq-scans', type=int, default=100,
+                               help='Minimum sequential scans of a table (default: 100)')
+    
     # Index usage command
     index_parser = subparsers.add_parser('indexes', help='Show index usage')
     
@@ -474,15 +1232,42 @@ def main():
     args = parse_arguments()
     
     try:
+        if args.command == 'health-diff':
+            history = HealthHistory(args.history)
+            try:
+                rows = history.diff(int(time.time()) - parse_duration(args.since))
+            finally:
+                history.close()
+            rows = [row for row in rows if row['change'] and
+                    (not args.metric or row['metric'].startswith(args.metric))]
+            rows.sort(key=lambda row: abs(row['change']), reverse=True)
+            print(f"\nLargest changes over the last {args.since}:")
+            print_table([{
+                'metric': row['metric'],
+                'labels': ','.join(f'{k}={v}' for k, v in row['labels'].items()),
+                'before': f"{row['before']:g}", 'after': f"{row['after']:g}", 'change': f"{row['change']:+g}",
+            } for row in rows[:args.limit]])
+            return 0
+        
         # Initialize database manager
         db_manager = DatabaseManager(args.db_url)
         if not db_manager.connect():
             return 1
         
         # Execute command
-        if args.command == 'health':
+        if args.command == 'health' and args.watch:
+            history = HealthHistory(args.history)
+            try:
+                db_manager.watch(history, interval=args.interval, workers=args.workers,
+                                 retention_days=args.retention_days, long_query_seconds=args.threshold,
+                                 metrics_port=args.metrics_port, metrics_file=args.metrics_file)
+            finally:
+                history.close()
+        
+        elif args.command == 'health':
             health = db_manager.get_database_health()
             print("\n=== Database Health Check ===")
+            print(f"PostgreSQL Version: {health['version']}")
             print(f"Database Size: {health['database_size']}")
             print("\nConnection Pool:")
             for k, v in health['connection_pool'].items():
@@ -507,6 +1292,15 @@ def main():
             if db_manager.vacuum_tables(full=args.full, analyze=args.analyze):
                 print("Vacuum complete")
         
+        elif args.command == 'maintain':
+            tasks = db_manager.maintain(
+                interval=parse_duration(args.every) if args.every else None, dry_run=args.dry_run,
+                dead_ratio=args.dead_ratio, analyze_ratio=args.analyze_ratio, stale_days=args.stale_days,
+                bloat_ratio=args.bloat_ratio, lock_timeout=args.lock_timeout, max_wait=args.max_wait)
+            print(f"\n{'Planned' if args.dry_run else 'Maintenance'} tasks:")
+            print_table([{key: task.get(key, '') for key in ('action', 'target', 'reason', 'status', 'seconds')}
+                         for task in tasks])
+        
         elif args.command == 'reindex':
             print("Reindexing database...")
             if db_manager.reindex_database():
@@ -532,6 +1326,33 @@ def main():
             else:
                 print("No long running queries found.")
         
+        elif args.command == 'slow-queries':
+            report = db_manager.get_statement_report(args.limit, args.min_calls)
+            for key, title in (('by_total', 'total'), ('by_mean', 'mean')):
+                print(f"\nStatements by {title} time:")
+                print_table([{
+                    'calls': row['calls'],
+                    'total_ms': f"{row['total_ms']:.0f}",
+                    'mean_ms': f"{row['mean_ms']:.2f}",
+                    '% total': f"{row['percent_of_total'] or 0:.1f}",
+                    'callsite': row['callsite'] or '-',
+                    'query': ' '.join(row['query'].split())[:100],
+                } for row in report[key]])
+        
+        elif args.command == 'index-advice':
+            advice = db_manager.get_index_advice(args.min_rows, args.min_seq_scans)
+            if not advice:
+                print("No table is mostly read by sequential scans.")
+            for table in advice:
+                print(f"\n{table['table_name']}: {table['seq_scan']} sequential scans reading "
+                      f"{table['avg_rows_per_seq_scan']} of {table['live_rows']} rows each, "
+                      f"{table['idx_scan']} index scans")
+                for entry in table['columns']:
+                    print(f"  {entry['column']}: {entry['statements']} statements, {entry['calls']} calls, "
+                          f"{entry['total_ms']:.0f} ms{' (indexed)' if entry['indexed'] else ''}")
+                print(f"  Suggested: {table['suggestion']}" if table['suggestion'] else
+                      "  No unindexed filter column found in pg_stat_statements")
+        
         elif args.command == 'indexes':
             print("\nIndex Usage:")
             indexes = db_manager.get_index_usage()
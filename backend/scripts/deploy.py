@@ -144,7 +144,7 @@ def start_application(host='0.0.0.0', port=5000, workers=4):
             print_error("Failed to install Gunicorn")
             return False
     
-    # Start Gunicorn
+    # Start Gunicorn (gunicorn.conf.py preloads the app in the master)
     command = [
         'gunicorn',
         '--bind', f'{host}:{port}',
@@ -153,7 +153,7 @@ def start_application(host='0.0.0.0', port=5000, workers=4):
         '--access-logfile', 'logs/access.log',
         '--error-logfile', 'logs/error.log',
         '--log-level', 'info',
-        'app:create_app()'
+        'wsgi:application'
     ]
     
     print(f"Starting Gunicorn on {host}:{port} with {workers} workers...")
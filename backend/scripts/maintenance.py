@@ -7,16 +7,35 @@ This script handles routine maintenance tasks such as:
 - Log rotation
 - Orphaned file cleanup
 - Data integrity checks
+- Memorial counter reconciliation
 """
 import os
 import sys
 import time
+import heapq
+import itertools
 import shutil
+import hashlib
 import logging
+import re
+import random
+import gzip
+import json
+import zlib
 import argparse
+import threading
 import subprocess
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
 from pathlib import Path
+from sqlalchemy.engine import make_url
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Configure logging
 logging.basicConfig(
@@ -37,17 +56,37 @@ class MaintenanceManager:
         self.config = config or {}
         self.backup_dir = Path(self.config.get('backup_dir', 'backups'))
         self.logs_dir = Path(self.config.get('logs_dir', 'logs'))
-        self.uploads_dir = Path(self.config.get('uploads_dir', 'uploads'))
+        # None: the app's UPLOAD_FOLDER, resolved once the app is created
+        self.uploads_dir = Path(self.config['uploads_dir']) if self.config.get('uploads_dir') else None
         
         # Ensure directories exist
         self.backup_dir.mkdir(parents=True, exist_ok=True)
         self.logs_dir.mkdir(parents=True, exist_ok=True)
     
+    def _uploads_dir(self, app):
+        """The uploads directory: --uploads-dir, or where ``app`` writes uploads."""
+        return self.uploads_dir or Path(app.config['UPLOAD_FOLDER'])
+    
     def backup_database(self, backup_name=None):
-        """Create a database backup."""
+        """Create a database backup and an incremental backup of the uploads.
+        
+        The database is dumped in directory format by ``jobs`` parallel
+        pg_dump workers, compressed, into ``<backup_dir>/database/<name>``;
+        a dump only gets its final name once it completed. A manifest.json
+        next to it records the SHA-256 and size of every file; it is written
+        last, and a backup that fails before it is removed. Upload files
+        are copied into a content-addressed store under
+        ``<backup_dir>/uploads`` so each distinct file is stored once across
+        all backups; the per-backup uploads.ndjson.gz maps paths to hashes.
+        Old backups are then pruned to ``keep_daily`` daily and
+        ``keep_weekly`` weekly ones, and store objects that no retained
+        backup touched are removed. Duration and sizes go to Prometheus through
+        the textfile collector and/or a Pushgateway when configured.
+        """
+        metrics = {'success': 0}
+        started = time.time()
         try:
             from app import create_app
-            from database import db
             
             app = create_app()
             db_url = app.config.get('SQLALCHEMY_DATABASE_URI')
@@ -56,179 +95,278 @@ class MaintenanceManager:
                 logger.warning("Database backup is only supported for PostgreSQL")
                 return False
             
-            # Parse database URL
-            from urllib.parse import urlparse
-            result = urlparse(db_url)
-            db_name = result.path.lstrip('/')
-            
-            # Generate backup filename
+            workers = self.config.get('workers', 8)
+            database_dir = self.backup_dir / 'database'
+            database_dir.mkdir(parents=True, exist_ok=True)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_name = backup_name or f"{db_name}_backup_{timestamp}.sql"
-            backup_path = self.backup_dir / backup_name
-            
-            # Build pg_dump command
-            cmd = [
-                'pg_dump',
-                '-h', result.hostname or 'localhost',
-                '-U', result.username or 'postgres',
-                '-d', db_name,
-                '-f', str(backup_path)
-            ]
+            backup_name = backup_name or f"{make_url(db_url).database}_backup_{timestamp}"
+            backup_path = database_dir / backup_name
             
-            # Set PGPASSWORD if password is provided
-            env = os.environ.copy()
-            if result.password:
-                env['PGPASSWORD'] = result.password
-            
-            # Run pg_dump
             logger.info(f"Creating database backup: {backup_path}")
-            result = subprocess.run(
-                cmd,
-                env=env,
-                capture_output=True,
-                text=True
-            )
+            dump_database(db_url, backup_path, jobs=self.config.get('backup_jobs', 4),
+                          compress=self.config.get('backup_compress', 6))
+            metrics['database_seconds'] = time.time() - started
             
-            if result.returncode != 0:
-                logger.error(f"Backup failed: {result.stderr}")
-                return False
+            # Without its manifest.json the backup is invisible to retention,
+            # so a failure from here on removes it rather than leaving it behind
+            try:
+                uploads_started = time.time()
+                store = UploadStore(self.backup_dir / 'uploads')
+                previous = latest_backup(database_dir, exclude=backup_path)
+                uploads = store.backup(self._uploads_dir(app), backup_path / UPLOADS_MANIFEST,
+                                       previous=previous / UPLOADS_MANIFEST if previous else None,
+                                       workers=workers)
+                metrics['uploads_seconds'] = time.time() - uploads_started
+                
+                manifest = write_manifest(backup_path, {
+                    'started_at': datetime.fromtimestamp(started).isoformat(),
+                    'database': make_url(db_url).database,
+                    'format': 'directory',
+                    'jobs': self.config.get('backup_jobs', 4),
+                    'uploads': uploads,
+                }, workers=workers)
+            except BaseException:
+                logger.info(f"Removing incomplete backup: {backup_path}")
+                shutil.rmtree(backup_path, ignore_errors=True)
+                raise
+            metrics.update(success=1, database_bytes=manifest['bytes'],
+                           uploads_files=uploads['files'], uploads_new_bytes=uploads['new_bytes'])
+            
+            expired = select_expired(list_backups(database_dir),
+                                     self.config.get('keep_daily', 7), self.config.get('keep_weekly', 4))
+            for path in expired:
+                logger.info(f"Removing expired backup: {path}")
+                shutil.rmtree(path)
+            retained = list_backups(database_dir)
+            store.prune(min(_started_at(path) for _, path in retained))
             
-            logger.info(f"Backup created successfully: {backup_path}")
+            logger.info(f"Backup created successfully: {backup_path} "
+                        f"({manifest['bytes'] / 1024 ** 2:.1f} MiB database, {uploads['new_files']} new of "
+                        f"{uploads['files']} upload files, {time.time() - started:.1f}s)")
             return str(backup_path)
             
         except Exception as e:
             logger.error(f"Error creating database backup: {str(e)}")
             return False
+        finally:
+            metrics['seconds'] = time.time() - started
+            report_backup_metrics(metrics, textfile=self.config.get('metrics_file'),
+                                  pushgateway=self.config.get('pushgateway'))
     
-    def rotate_logs(self, days_to_keep=30):
-        """Rotate and compress old log files."""
+    def rotate_logs(self, days_to_keep=30, idle_hours=24):
+        """Compress closed log files and delete archives older than ``days_to_keep``.
+        
+        Covers everything the logging config writes: app.log, error.log,
+        app.json, traces.jsonl and their numbered RotatingFileHandler
+        backups (``app.log.1`` ...). Numbered backups are always closed and
+        are always compressed. Current files held open by a logging handler
+        are never touched: unlinking one would leave the handler writing to
+        a deleted file. traces.jsonl, which is reopened for every write, is
+        compressed once idle for ``idle_hours``.
+        Files are compressed in-process on a thread pool (gzip, or zstd when
+        the zstandard package is installed and selected), each archive is
+        decompressed and checked against the source's CRC and length, and
+        only then is the source removed.
+        """
         try:
-            cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-            rotated_count = 0
+            codec = self.config.get('log_compression', 'gzip')
+            if codec == 'zstd' and zstandard is None:
+                logger.warning("zstandard is not installed, compressing logs with gzip")
+                codec = 'gzip'
+            started = time.perf_counter()
+            now = time.time()
+            idle_before = now - idle_hours * 3600
+            expire_before = now - days_to_keep * 86400
             
-            for log_file in self.logs_dir.glob('*.log'):
-                # Skip already rotated files
-                if log_file.name.endswith('.gz'):
-                    continue
-                
-                # Check file modification time
-                mtime = datetime.fromtimestamp(log_file.stat().st_mtime)
-                if mtime < cutoff_date:
-                    # Compress the log file
-                    compressed_file = log_file.with_suffix('.log.gz')
-                    logger.info(f"Compressing log file: {log_file}")
-                    
-                    # Use gzip to compress the file
-                    subprocess.run(
-                        ['gzip', '-c', str(log_file)],
-                        stdout=open(compressed_file, 'wb')
-                    )
-                    
-                    # Remove the original log file
-                    log_file.unlink()
-                    rotated_count += 1
+            candidates = []
+            expired = 0
+            for path in iter_log_files(self.logs_dir):
+                mtime = path.stat().st_mtime
+                if path.suffix in ARCHIVE_SUFFIXES:
+                    if mtime < expire_before:
+                        path.unlink()
+                        expired += 1
+                elif _is_rotated(path.name) or (path.name in REOPENED_LOG_FILES and mtime < idle_before):
+                    candidates.append(path)
+            
+            # Archive names are picked up front: files rotated within the same
+            # second would otherwise race for one name
+            taken = set()
+            archives = [_archive_path(path, codec, taken) for path in candidates]
             
-            logger.info(f"Rotated {rotated_count} log files")
-            return rotated_count
+            stats = {'files': 0, 'failed': 0, 'bytes_in': 0, 'bytes_out': 0, 'expired': expired}
+            with ThreadPoolExecutor(max_workers=self.config.get('workers', 8)) as pool:
+                for path, result in zip(candidates, pool.map(
+                        lambda job: _compress_log(*job, codec), zip(candidates, archives))):
+                    if isinstance(result, Exception):
+                        logger.error(f"Could not compress {path}: {result}")
+                        stats['failed'] += 1
+                        continue
+                    stats['files'] += 1
+                    stats['bytes_in'] += result[0]
+                    stats['bytes_out'] += result[1]
+            
+            seconds = time.perf_counter() - started
+            stats['seconds'] = round(seconds, 3)
+            stats['mb_per_second'] = round(stats['bytes_in'] / 1024 ** 2 / seconds, 1) if seconds else None
+            logger.info(f"Rotated {stats['files']} log files ({stats['bytes_in'] / 1024 ** 2:.1f} MiB -> "
+                        f"{stats['bytes_out'] / 1024 ** 2:.1f} MiB, {stats['mb_per_second']} MiB/s), "
+                        f"removed {expired} expired archives")
+            return stats
             
         except Exception as e:
             logger.error(f"Error rotating logs: {str(e)}")
-            return 0
+            return None
     
-    def cleanup_orphaned_files(self):
-        """Clean up orphaned files in the uploads directory."""
+    def cleanup_orphaned_files(self, min_age_hours=24):
+        """Delete upload files that no image or memory image references.
+        
+        Referenced filenames are streamed from both tables into a sorted
+        array of 8-byte hashes, and the uploads directory is walked with
+        os.scandir, so memory stays at about 8 bytes per referenced file
+        however many files there are. Only unreferenced files are stat'ed,
+        to skip those younger than ``min_age_hours`` (an upload is written
+        before its row is committed). Deletions run in batches on a thread
+        pool. A thumbnail is kept as long as its original is referenced.
+        With --dry-run nothing is deleted and the reclaimable size is reported.
+        """
         try:
             from app import create_app
-            from models import Image, db
+            from models import db
             
             app = create_app()
-            orphaned_count = 0
-            
+            dry_run = self.config.get('dry_run', False)
             with app.app_context():
-                # Get all referenced image filenames from the database
-                referenced_files = {img.filename for img in Image.query.all()}
-                
-                # Check all files in uploads directory
-                for file_path in self.uploads_dir.rglob('*'):
-                    if file_path.is_file() and file_path.name not in referenced_files:
-                        # Check if file is old enough to be considered orphaned (older than 1 day)
-                        file_mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-                        if datetime.now() - file_mtime > timedelta(days=1):
-                            logger.info(f"Removing orphaned file: {file_path}")
-                            file_path.unlink()
-                            orphaned_count += 1
+                with db.engine.connect() as conn:
+                    referenced = load_referenced_names(conn)
+            
+            report = remove_orphaned_files(self._uploads_dir(app), referenced, min_age_hours, dry_run,
+                                           workers=self.config.get('workers', 8))
             
-            logger.info(f"Cleaned up {orphaned_count} orphaned files")
-            return orphaned_count
+            action = 'reclaimable' if dry_run else 'reclaimed'
+            logger.info(f"Scanned {report['scanned']} files: {report['orphaned']} orphaned, "
+                        f"{report['bytes'] / 1024 ** 2:.1f} MiB {action}"
+                        + ('' if dry_run else f", {report['deleted']} deleted"))
+            return report
             
         except Exception as e:
             logger.error(f"Error cleaning up orphaned files: {str(e)}")
-            return 0
+            return None
     
     def check_database_integrity(self):
-        """Check database integrity and fix common issues."""
+        """Check database integrity and fix common issues.
+        
+        Relationship checks are set-based anti-joins on indexed foreign keys
+        (see integrity_checks), each counted in a single query together with
+        a sample of offending ids. Image and memory image rows are then
+        checked for their upload file. By default the uploads directory is
+        listed once into a sorted array of name hashes and the rows are
+        streamed against it. With --file-check stat each file is os.stat'ed
+        on a thread pool instead, optionally for a random --sample-rate
+        fraction of the rows, which suits network storage where a full
+        listing is slow. With --fix-issues, rows whose file is missing are
+        deleted, unless more than ``max_missing_fraction`` of the checked rows
+        are missing: that points at the wrong uploads directory or an
+        unmounted volume rather than at lost files, so nothing is deleted.
+        The report is logged and, with --report, written as JSON.
+        
+        Returns:
+            dict: The report, or None if the check failed
+        """
         try:
             from app import create_app
-            from models import db, User, Memorial, Memory, Image
+            from models import db, Image, MemoryImage
+            from counters import counter_buffer
             
             app = create_app()
-            issues_found = 0
+            started = time.time()
+            mode = self.config.get('file_check', 'list')
+            sample_rate = self.config.get('sample_rate') or 1.0
+            fix = self.config.get('fix_issues', False)
+            max_missing = self.config.get('max_missing_fraction', MAX_MISSING_FRACTION)
+            uploads_dir = self._uploads_dir(app)
+            report = {'checks': [], 'file_check': mode, 'sample_rate': sample_rate}
+            missing = {}
             
             with app.app_context():
-                # Check for users without memorials
-                users_without_memorials = User.query.filter(
-                    ~User.memorials.any()
-                ).count()
-                
-                if users_without_memorials > 0:
-                    logger.warning(f"Found {users_without_memorials} users without memorials")
-                    issues_found += users_without_memorials
-                
-                # Check for memorials without images
-                memorials_without_images = Memorial.query.filter(
-                    ~Memorial.images.any()
-                ).count()
-                
-                if memorials_without_images > 0:
-                    logger.warning(f"Found {memorials_without_images} memorials without images")
-                    issues_found += memorials_without_images
-                
-                # Check for memories without content
-                empty_memories = Memory.query.filter(
-                    (Memory.content == '') | (Memory.content.is_(None))
-                ).count()
-                
-                if empty_memories > 0:
-                    logger.warning(f"Found {empty_memories} empty memories")
-                    issues_found += empty_memories
-                
-                # Check for orphaned images in the database
-                image_files = {str(p) for p in self.uploads_dir.rglob('*') if p.is_file()}
-                db_images = {img.filename for img in Image.query.all()}
-                
-                orphaned_db_entries = db_images - image_files
-                if orphaned_db_entries:
-                    logger.warning(f"Found {len(orphaned_db_entries)} image entries in database without corresponding files")
-                    issues_found += len(orphaned_db_entries)
+                with db.engine.connect() as conn:
+                    for name, statement in integrity_checks():
+                        report['checks'].append(dict(check=name, **run_check(conn, statement)))
                     
-                    # Optionally clean up orphaned database entries
-                    if self.config.get('fix_issues', False):
-                        logger.info("Cleaning up orphaned database entries...")
-                        Image.query.filter(Image.filename.in_(orphaned_db_entries)).delete(
-                            synchronize_session=False
-                        )
-                        db.session.commit()
-                        logger.info("Cleaned up orphaned database entries")
+                    if mode != 'skip':
+                        present = load_upload_names(uploads_dir) if mode == 'list' else None
+                        for model in (Image, MemoryImage):
+                            result, missing[model] = check_files(
+                                conn, model, uploads_dir, present, sample_rate,
+                                workers=self.config.get('workers', 8))
+                            report['checks'].append(dict(check=f'{model.__tablename__}_files_missing',
+                                                         **result))
+                
+                if fix:
+                    for model, (ids, parents) in missing.items():
+                        check = f'{model.__tablename__}_files_missing'
+                        result = next(c for c in report['checks'] if c['check'] == check)
+                        if not safe_to_fix(result, max_missing):
+                            logger.error(f"{check}: {result['count']} of {result['checked']} rows have no "
+                                         f"file under {uploads_dir}; not deleting them, check the "
+                                         f"uploads directory (or raise --max-missing-fraction)")
+                            result['fixed'] = 0
+                            result['fix_refused'] = True
+                            continue
+                        fixed = delete_rows(db.engine, model, ids)
+                        if model is Image:
+                            # Core deletes bypass the counter session events
+                            for memorial_id, count in parents.items():
+                                counter_buffer.increment(memorial_id, 'image_count', -count)
+                            counter_buffer.flush(db.engine)
+                        result['fixed'] = fixed
+                        if fixed:
+                            logger.info(f"Deleted {fixed} {model.__tablename__} rows without a file")
             
-            if issues_found == 0:
+            for check in report['checks']:
+                if check['count']:
+                    logger.warning(f"{check['check']}: {check['count']} "
+                                   f"(e.g. ids {', '.join(map(str, check['sample_ids']))})")
+            report['issues'] = sum(check['count'] for check in report['checks'])
+            report['seconds'] = round(time.time() - started, 3)
+            
+            if report['issues'] == 0:
                 logger.info("No database integrity issues found")
             else:
-                logger.warning(f"Found {issues_found} potential issues")
-            
-            return issues_found
+                logger.warning(f"Found {report['issues']} potential issues")
+            write_report(report, self.config.get('report_file'))
+            return report
             
         except Exception as e:
             logger.error(f"Error checking database integrity: {str(e)}")
+            return None
+    
+    def reconcile_counters(self, batch_size=5000):
+        """Recompute memorial memory and image counts and repair any drift.
+        
+        The counters are derived data, so drifted rows are always repaired;
+        with --dry-run they are only reported.
+        """
+        try:
+            from app import create_app
+            from models import db
+            from counters import reconcile
+            
+            app = create_app()
+            with app.app_context():
+                result = reconcile(db.engine, batch_size=batch_size,
+                                   fix=not self.config.get('dry_run', False))
+            
+            if result['drifted']:
+                action = 'found' if self.config.get('dry_run', False) else 'repaired'
+                logger.warning(f"Counter drift {action} on {result['drifted']} of "
+                               f"{result['checked']} memorials")
+            else:
+                logger.info(f"Counters consistent on all {result['checked']} memorials")
+            return result['drifted']
+            
+        except Exception as e:
+            logger.error(f"Error reconciling counters: {str(e)}")
             return -1
     
     def run_all_tasks(self):
@@ -240,12 +378,611 @@ class MaintenanceManager:
             'backup': self.backup_database(),
             'log_rotation': self.rotate_logs(),
             'cleanup': self.cleanup_orphaned_files(),
-            'integrity_check': self.check_database_integrity()
+            'integrity_check': self.check_database_integrity(),
+            'counters': self.reconcile_counters()
         }
         
         logger.info("=== Maintenance Tasks Completed ===")
         return results
 
+class ReferencedNames:
+    """Sorted array of 8-byte filename hashes with binary-search membership.
+    
+    A hash collision can only make an orphan look referenced, so the
+    worst case is a file kept, never a file deleted.
+    """
+    
+    def __init__(self, keys):
+        self.keys = keys
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def __contains__(self, key):
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+def _name_key(name):
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def _original_name(name):
+    """Map ``<name>_thumb.<ext>`` to the upload it was made from."""
+    base, ext = os.path.splitext(name)
+    return base[:-len('_thumb')] + ext if base.endswith('_thumb') else name
+
+def _sorted_keys(names, run_size):
+    """Hash ``names`` into one sorted array, sorting runs of ``run_size``
+    and merging them, so the peak is two arrays of 8 bytes per name plus
+    one run of Python ints."""
+    runs = []
+    run = []
+    for name in names:
+        run.append(_name_key(name))
+        if len(run) >= run_size:
+            runs.append(array('Q', sorted(run)))
+            run = []
+    runs.append(array('Q', sorted(run)))
+    return array('Q', heapq.merge(*runs)) if len(runs) > 1 else runs[0]
+
+def load_referenced_names(conn, yield_per=10000, run_size=1000000):
+    """Stream image and memory image filenames into a ReferencedNames."""
+    from sqlalchemy import select
+    from models import Image, MemoryImage
+    
+    def filenames():
+        for model in (Image, MemoryImage):
+            result = conn.execution_options(stream_results=True, yield_per=yield_per).execute(
+                select(model.filename))
+            for (filename,) in result:
+                yield os.path.basename(filename)
+    
+    return ReferencedNames(_sorted_keys(filenames(), run_size))
+
+def iter_upload_files(root):
+    """Yield a DirEntry for every regular file under ``root``, skipping dotfiles.
+    
+    Uses the file type from the directory listing, so no file is stat'ed.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            scanner = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with scanner:
+            for entry in scanner:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+def remove_orphaned_files(root, referenced, min_age_hours=24, dry_run=False, workers=8, batch_size=1000):
+    """Delete files under ``root`` whose name (or original, for thumbnails)
+    is not in ``referenced``.
+    
+    Returns:
+        dict: Files ``scanned``, ``orphaned`` and ``deleted``, and orphaned ``bytes``
+    """
+    cutoff = time.time() - min_age_hours * 3600
+    report = {'scanned': 0, 'orphaned': 0, 'bytes': 0, 'deleted': 0, 'dry_run': dry_run}
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        batch = []
+        
+        def submit():
+            # Bound the in-flight batches so memory stays fixed
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report['deleted'] += future.result()
+                pending.difference_update(done)
+            pending.add(pool.submit(_delete_files, list(batch)))
+            batch.clear()
+        
+        for entry in iter_upload_files(root):
+            report['scanned'] += 1
+            if _name_key(_original_name(entry.name)) in referenced:
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            report['orphaned'] += 1
+            report['bytes'] += stat.st_size
+            if not dry_run:
+                batch.append(entry.path)
+                if len(batch) >= batch_size:
+                    submit()
+        if batch:
+            submit()
+        for future in pending:
+            report['deleted'] += future.result()
+    return report
+
+def _delete_files(paths):
+    deleted = 0
+    for path in paths:
+        try:
+            os.unlink(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete {path}: {e}")
+    return deleted
+
+# Integrity checks
+
+INTEGRITY_SAMPLE_SIZE = 10
+# --fix-issues deletes rows without a file only below this fraction of the
+# checked rows
+MAX_MISSING_FRACTION = 0.5
+
+def integrity_checks():
+    """``(name, statement)`` for each row-level check; each statement
+    selects the ids of the offending rows.
+    
+    The relationship checks are NOT EXISTS anti-joins probing the foreign
+    key indexes (idx_memorial_user_id, idx_image_memorial_id,
+    idx_memorial_memories_memory_id), one pass over the outer table each.
+    """
+    from sqlalchemy import select, exists, or_
+    from models import User, Memorial, Memory, Image, memorial_memories
+    
+    return [
+        ('users_without_memorials',
+         select(User.id).where(~exists().where(Memorial.user_id == User.id))),
+        ('memorials_without_images',
+         select(Memorial.id).where(~exists().where(Image.memorial_id == Memorial.id))),
+        ('memories_without_memorials',
+         select(Memory.id).where(~exists().where(memorial_memories.c.memory_id == Memory.id))),
+        ('empty_memories',
+         select(Memory.id).where(or_(Memory.content == '', Memory.content.is_(None)))),
+    ]
+
+def run_check(conn, statement, sample_size=INTEGRITY_SAMPLE_SIZE):
+    """Count the rows ``statement`` selects and fetch the lowest ids, in one query.
+    
+    Returns:
+        dict: ``count`` and ``sample_ids``
+    """
+    from sqlalchemy import func
+    
+    id_column = statement.selected_columns[0]
+    rows = conn.execute(statement.add_columns(func.count().over())
+                        .order_by(id_column).limit(sample_size)).all()
+    return {'count': rows[0][1] if rows else 0, 'sample_ids': [row[0] for row in rows]}
+
+def load_upload_names(root, run_size=1000000):
+    """Hash the name of every file under ``root`` into a ReferencedNames.
+    
+    A hash collision can only make a missing file look present, so a row
+    is never reported (or deleted) for a file that exists.
+    
+    Raises:
+        FileNotFoundError: ``root`` is not a directory
+    """
+    _require_dir(root)
+    return ReferencedNames(_sorted_keys((entry.name for entry in iter_upload_files(root)), run_size))
+
+def check_files(conn, model, root, present=None, sample_rate=1.0, workers=8, yield_per=10000):
+    """Find ``model`` rows (Image or MemoryImage) whose upload file is missing.
+    
+    Rows are streamed and compared a ``yield_per`` chunk at a time, either
+    by name against ``present`` (from load_upload_names) or, when it is
+    None, by os.stat of ``root/<filename>`` on ``workers`` threads. With a
+    ``sample_rate`` below 1 only that random fraction of rows is stat'ed
+    and the total is estimated from it.
+    
+    Returns:
+        tuple: The check's report dict, and the missing ``(ids, parents)``:
+        an array of row ids and a Counter of missing rows per parent id
+    
+    Raises:
+        FileNotFoundError: ``root`` is not a directory; every row would
+        otherwise be reported missing
+    """
+    from collections import Counter
+    from sqlalchemy import select
+    
+    _require_dir(root)
+    parent = model.memorial_id if hasattr(model, 'memorial_id') else model.memory_id
+    rows = conn.execution_options(stream_results=True, yield_per=yield_per).execute(
+        select(model.id, model.filename, parent.label('parent_id')))
+    
+    checked = 0
+    def counted(rows):
+        nonlocal checked
+        for row in rows:
+            if sample_rate >= 1 or random.random() < sample_rate:
+                checked += 1
+                yield row
+    
+    ids = array('q')
+    parents = Counter()
+    if present is not None:
+        missing = (row for row in counted(rows)
+                   if _name_key(os.path.basename(row.filename)) not in present)
+        _collect_missing(missing, ids, parents)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            found = _bounded_map(pool, lambda row: (row, _file_exists(root, row.filename)),
+                                 counted(rows), chunk_size=yield_per)
+            _collect_missing((row for row, exists in found if not exists), ids, parents)
+    
+    result = {'count': len(ids), 'sample_ids': heapq.nsmallest(INTEGRITY_SAMPLE_SIZE, ids), 'checked': checked}
+    if sample_rate < 1:
+        result['estimated'] = round(len(ids) / sample_rate)
+    return result, (ids, parents)
+
+def safe_to_fix(result, max_fraction=MAX_MISSING_FRACTION):
+    """Whether the missing rows of a check_files ``result`` may be deleted:
+    no more than ``max_fraction`` of the checked rows are missing."""
+    return not result['checked'] or result['count'] <= result['checked'] * max_fraction
+
+def _require_dir(root):
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Uploads directory {root} does not exist")
+
+def _collect_missing(rows, ids, parents):
+    for row in rows:
+        ids.append(row.id)
+        parents[row.parent_id] += 1
+
+def _file_exists(root, filename):
+    try:
+        os.stat(os.path.join(root, os.path.basename(filename)))
+        return True
+    except FileNotFoundError:
+        return False
+
+def delete_rows(engine, model, ids, chunk_size=1000):
+    """Delete ``model`` rows by id, one short transaction per chunk."""
+    deleted = 0
+    for start in range(0, len(ids), chunk_size):
+        with engine.begin() as conn:
+            deleted += conn.execute(model.__table__.delete().where(
+                model.id.in_(ids[start:start + chunk_size].tolist()))).rowcount
+    return deleted
+
+def write_report(report, path):
+    """Write ``report`` as JSON to ``path`` ('-' for stdout), if set."""
+    if not path:
+        return
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+# Log rotation
+
+LOG_FILE_PATTERN = re.compile(r'^.+\.(log|json|jsonl)(\.\d+)?$')
+# Current files whose writer opens them for each write (the tracing file
+# exporter). Logging handlers keep app.log, error.log and app.json open, so
+# those are only ever compressed once the handler has rotated them away.
+REOPENED_LOG_FILES = ('traces.jsonl',)
+ARCHIVE_SUFFIXES = ('.gz', '.zst')
+LOG_CHUNK_SIZE = 1024 * 1024
+
+def _is_rotated(name):
+    """Whether ``name`` is a numbered RotatingFileHandler backup, e.g. app.log.3."""
+    return name.rsplit('.', 1)[-1].isdigit()
+
+def iter_log_files(logs_dir):
+    """Log files and log archives directly under ``logs_dir``."""
+    for entry in os.scandir(logs_dir):
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        name = entry.name
+        for suffix in ARCHIVE_SUFFIXES:
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        if LOG_FILE_PATTERN.match(name) or LOG_FILE_PATTERN.match(name.rsplit('.', 1)[0]):
+            yield Path(entry.path)
+
+def _archive_path(path, codec, taken):
+    """``app.log.2`` -> ``app.log.<mtime>.gz``: RotatingFileHandler reuses the
+    numbered names, so archives are named by when the file was last written.
+    Names in ``taken`` (reserved for other files of this run) are skipped."""
+    base = path.name.rsplit('.', 1)[0] if _is_rotated(path.name) else path.name
+    stamp = datetime.fromtimestamp(path.stat().st_mtime).strftime('%Y%m%d-%H%M%S')
+    suffix = '.zst' if codec == 'zstd' else '.gz'
+    archive = path.with_name(f'{base}.{stamp}{suffix}')
+    counter = 1
+    while archive.exists() or archive in taken:
+        archive = path.with_name(f'{base}.{stamp}-{counter}{suffix}')
+        counter += 1
+    taken.add(archive)
+    return archive
+
+def _open_compressed(path, mode, codec):
+    if codec == 'zstd':
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(open(path, mode), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, mode), closefd=True)
+    return gzip.open(path, mode, compresslevel=6)
+
+def _compress_log(path, archive, codec='gzip'):
+    """Compress one log file into ``archive``, verify it, then remove the source.
+    
+    Returns:
+        ``(bytes_in, bytes_out)``, or the exception if the file was left in place
+    """
+    partial = archive.with_name(archive.name + '.partial')
+    try:
+        crc = size = 0
+        with open(path, 'rb') as source:
+            identity = os.fstat(source.fileno())
+            with _open_compressed(partial, 'wb', codec) as out:
+                for chunk in iter(lambda: source.read(LOG_CHUNK_SIZE), b''):
+                    out.write(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+        
+        check_crc = check_size = 0
+        with _open_compressed(partial, 'rb', codec) as archived:
+            for chunk in iter(lambda: archived.read(LOG_CHUNK_SIZE), b''):
+                check_crc = zlib.crc32(chunk, check_crc)
+                check_size += len(chunk)
+        if (check_crc, check_size) != (crc, size):
+            raise IOError(f"archive verification failed for {path}")
+        
+        os.replace(partial, archive)
+        os.utime(archive, (identity.st_atime, identity.st_mtime))
+        current = os.stat(path)
+        # The handler may have rolled over meanwhile, putting a new file at this
+        # name; only remove the file that was actually archived
+        if (current.st_dev, current.st_ino) == (identity.st_dev, identity.st_ino):
+            os.unlink(path)
+        return size, archive.stat().st_size
+    except Exception as e:
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+        return e
+
+# Database and upload backups
+
+MANIFEST = 'manifest.json'
+UPLOADS_MANIFEST = 'uploads.ndjson.gz'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def _pg_connection_args(db_url):
+    """pg_dump arguments and environment for a SQLAlchemy database URL."""
+    url = make_url(db_url)
+    host = url.host or url.query.get('host')
+    args = ['-d', url.database]
+    if host:
+        args += ['-h', host]
+    if url.port:
+        args += ['-p', str(url.port)]
+    if url.username:
+        args += ['-U', url.username]
+    env = os.environ.copy()
+    if url.password:
+        env['PGPASSWORD'] = url.password
+    return args, env
+
+def dump_database(db_url, target, jobs=4, compress=6):
+    """Dump the database in directory format with ``jobs`` parallel workers.
+    
+    Writes to ``<target>.partial`` and renames it to ``target`` on success.
+    
+    Raises:
+        RuntimeError: If pg_dump fails
+    """
+    target = Path(target)
+    partial = target.with_name(target.name + '.partial')
+    if partial.exists():
+        shutil.rmtree(partial)
+    args, env = _pg_connection_args(db_url)
+    result = subprocess.run(
+        ['pg_dump', *args, '-Fd', '-j', str(jobs), '-Z', str(compress), '-f', str(partial)],
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise RuntimeError(f"pg_dump failed: {result.stderr.strip()}")
+    partial.rename(target)
+    return target
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_manifest(backup_path, info, workers=8):
+    """Checksum every file of a backup into its manifest.json."""
+    backup_path = Path(backup_path)
+    paths = sorted(p for p in backup_path.rglob('*') if p.is_file() and p.name != MANIFEST)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = list(pool.map(file_sha256, paths))
+    files = {
+        str(path.relative_to(backup_path)): {'size': path.stat().st_size, 'sha256': digest}
+        for path, digest in zip(paths, digests)
+    }
+    manifest = dict(info, created_at=datetime.now().isoformat(timespec='seconds'),
+                    bytes=sum(f['size'] for f in files.values()), files=files)
+    with open(backup_path / MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def list_backups(database_dir):
+    """Completed backups as ``(created_at, path)``, oldest first."""
+    backups = []
+    for manifest_path in Path(database_dir).glob(f'*/{MANIFEST}'):
+        try:
+            with open(manifest_path) as f:
+                created = datetime.fromisoformat(json.load(f)['created_at'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring backup with unreadable manifest {manifest_path}: {e}")
+            continue
+        backups.append((created, manifest_path.parent))
+    return sorted(backups)
+
+def _started_at(backup_path):
+    with open(Path(backup_path) / MANIFEST) as f:
+        return datetime.fromisoformat(json.load(f)['started_at'])
+
+def latest_backup(database_dir, exclude=None):
+    backups = [path for _, path in list_backups(database_dir) if path != exclude]
+    return backups[-1] if backups else None
+
+def select_expired(backups, keep_daily=7, keep_weekly=4):
+    """Paths of backups outside the retention policy.
+    
+    The newest backup of each of the last ``keep_daily`` days that have one
+    is kept, and the newest of each of the last ``keep_weekly`` ISO weeks.
+    """
+    keep = set()
+    days, weeks = set(), set()
+    for created, path in sorted(backups, reverse=True):
+        day, week = created.date(), created.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(path)
+    return [path for _, path in sorted(backups) if path not in keep]
+
+class UploadStore:
+    """Content-addressed store of upload files: ``objects/<ab>/<sha256>``."""
+    
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / 'objects'
+    
+    def object_path(self, digest):
+        return self.objects / digest[:2] / digest
+    
+    def backup(self, uploads_dir, manifest_path, previous=None, workers=8):
+        """Store new upload files and write the path -> hash manifest.
+        
+        Files whose path, size and mtime match ``previous`` reuse its hash
+        without being read; only content not already in the store is copied.
+        
+        Returns:
+            dict: ``files``, ``bytes``, ``new_files`` and ``new_bytes``
+        """
+        known = {}
+        if previous and Path(previous).exists():
+            for record in _read_ndjson(previous):
+                known[record['path']] = (record['size'], record['mtime_ns'], record['sha256'])
+        
+        stats = {'files': 0, 'bytes': 0, 'new_files': 0, 'new_bytes': 0}
+        uploads_dir = Path(uploads_dir)
+        
+        def store(entry):
+            stat = entry.stat(follow_symlinks=False)
+            path = os.path.relpath(entry.path, uploads_dir)
+            cached = known.get(path)
+            if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                digest = cached[2]
+            else:
+                digest = file_sha256(entry.path)
+            target = self.object_path(digest)
+            try:
+                # Touching existing objects is what keeps prune() from removing them
+                os.utime(target)
+                added = False
+            except FileNotFoundError:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                temporary = target.with_name(f'{digest}.{os.getpid()}.{threading.get_ident()}.tmp')
+                shutil.copyfile(entry.path, temporary)
+                os.replace(temporary, target)
+                added = True
+            return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}, added
+        
+        partial = Path(f'{manifest_path}.partial')
+        with gzip.open(partial, 'wt', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            for record, added in _bounded_map(pool, store, iter_upload_files(uploads_dir)):
+                out.write(json.dumps(record) + '\n')
+                stats['files'] += 1
+                stats['bytes'] += record['size']
+                if added:
+                    stats['new_files'] += 1
+                    stats['new_bytes'] += record['size']
+        os.replace(partial, manifest_path)
+        return stats
+    
+    def prune(self, cutoff):
+        """Delete objects not touched since ``cutoff`` (a datetime).
+        
+        Every backup touches the objects it references, so with ``cutoff``
+        set to the start of the oldest retained backup, whatever is older
+        belongs only to expired backups.
+        """
+        cutoff = cutoff.timestamp()
+        removed = 0
+        for entry in iter_upload_files(self.objects):
+            if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} upload objects no retained backup references")
+        return removed
+
+def _bounded_map(pool, fn, iterable, chunk_size=1000):
+    """``pool.map`` over ``iterable`` a chunk at a time, so only one chunk
+    of inputs and results is held in memory."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield from pool.map(fn, chunk)
+
+def _read_ndjson(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def report_backup_metrics(metrics, textfile=None, pushgateway=None):
+    """Publish backup metrics for Prometheus.
+    
+    A cron job cannot be scraped, so the metrics are written for the node
+    exporter's textfile collector and/or pushed to a Pushgateway.
+    """
+    if not textfile and not pushgateway:
+        return
+    from prometheus_client import CollectorRegistry, Gauge, write_to_textfile, push_to_gateway
+    
+    registry = CollectorRegistry()
+    Gauge('backup_success', 'Whether the last backup succeeded', registry=registry).set(metrics['success'])
+    Gauge('backup_duration_seconds', 'Duration of the last backup', registry=registry).set(metrics['seconds'])
+    duration = Gauge('backup_component_duration_seconds', 'Duration of each part of the last backup',
+                     ['component'], registry=registry)
+    size = Gauge('backup_size_bytes', 'Size of the last backup', ['component'], registry=registry)
+    if metrics['success']:
+        duration.labels('database').set(metrics['database_seconds'])
+        duration.labels('uploads').set(metrics['uploads_seconds'])
+        size.labels('database').set(metrics['database_bytes'])
+        size.labels('uploads_new').set(metrics['uploads_new_bytes'])
+        Gauge('backup_uploads_files', 'Upload files covered by the last backup',
+              registry=registry).set(metrics['uploads_files'])
+        Gauge('backup_last_success_timestamp_seconds', 'When the last successful backup finished',
+              registry=registry).set_to_current_time()
+    try:
+        if textfile:
+            write_to_textfile(textfile, registry)
+        if pushgateway:
+            push_to_gateway(pushgateway, job='gate_of_memory_backup', registry=registry)
+    except Exception as e:
+        logger.warning(f"Could not publish backup metrics: {e}")
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Gate of Memory Maintenance Script')
@@ -255,14 +992,37 @@ def parse_arguments():
     parser.add_argument('--rotate-logs', action='store_true', help='Rotate log files')
     parser.add_argument('--cleanup', action='store_true', help='Clean up orphaned files')
     parser.add_argument('--check-db', action='store_true', help='Check database integrity')
+    parser.add_argument('--reconcile-counters', action='store_true',
+                        help='Recompute memorial memory/image counts and repair drift')
     parser.add_argument('--all', action='store_true', help='Run all maintenance tasks')
     
     # Options
     parser.add_argument('--fix-issues', action='store_true', help='Fix found issues')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report orphaned files and counter drift without changing anything')
+    parser.add_argument('--file-check', choices=['list', 'stat', 'skip'], default='list',
+                        help='How --check-db verifies upload files: list the directory or stat each file')
+    parser.add_argument('--max-missing-fraction', type=float, default=MAX_MISSING_FRACTION,
+                        help='With --fix-issues, delete rows without a file only if at most this '
+                             'fraction of the checked rows is missing')
+    parser.add_argument('--sample-rate', type=float,
+                        help='With --file-check stat, check only this random fraction of rows')
+    parser.add_argument('--report', help="Write the integrity report as JSON to this file ('-' for stdout)")
+    parser.add_argument('--min-age-hours', type=float, default=24,
+                        help='Only delete orphaned files older than this')
+    parser.add_argument('--workers', type=int, default=8, help='Threads for parallel file operations')
     parser.add_argument('--backup-dir', default='backups', help='Backup directory')
     parser.add_argument('--logs-dir', default='logs', help='Logs directory')
-    parser.add_argument('--uploads-dir', default='uploads', help='Uploads directory')
+    parser.add_argument('--uploads-dir', help="Uploads directory (default: the app's UPLOAD_FOLDER)")
     parser.add_argument('--days', type=int, default=30, help='Days of logs to keep')
+    parser.add_argument('--log-compression', choices=['gzip', 'zstd'], default='gzip',
+                        help='Codec for rotated logs (zstd needs the zstandard package)')
+    parser.add_argument('--jobs', type=int, default=4, help='Parallel pg_dump jobs')
+    parser.add_argument('--keep-daily', type=int, default=7, help='Daily backups to keep')
+    parser.add_argument('--keep-weekly', type=int, default=4, help='Weekly backups to keep')
+    parser.add_argument('--metrics-file', help='Write backup metrics for the node exporter textfile collector')
+    parser.add_argument('--pushgateway', default=os.getenv('PROMETHEUS_PUSHGATEWAY'),
+                        help='Push backup metrics to this Prometheus Pushgateway')
     
     return parser.parse_args()
 
@@ -275,13 +1035,26 @@ def main():
         'backup_dir': args.backup_dir,
         'logs_dir': args.logs_dir,
         'uploads_dir': args.uploads_dir,
-        'fix_issues': args.fix_issues
+        'fix_issues': args.fix_issues,
+        'dry_run': args.dry_run,
+        'workers': args.workers,
+        'file_check': args.file_check,
+        'sample_rate': args.sample_rate,
+        'max_missing_fraction': args.max_missing_fraction,
+        'report_file': args.report,
+        'log_compression': args.log_compression,
+        'backup_jobs': args.jobs,
+        'keep_daily': args.keep_daily,
+        'keep_weekly': args.keep_weekly,
+        'metrics_file': args.metrics_file,
+        'pushgateway': args.pushgateway
     }
     
     manager = MaintenanceManager(config)
     
     # Run selected tasks
-    if args.all or not any([args.backup, args.rotate_logs, args.cleanup, args.check_db]):
+    if args.all or not any([args.backup, args.rotate_logs, args.cleanup, args.check_db,
+                            args.reconcile_counters]):
         # Run all tasks if no specific task is selected
         manager.run_all_tasks()
     else:
@@ -290,9 +1063,11 @@ def main():
         if args.rotate_logs:
             manager.rotate_logs(days_to_keep=args.days)
         if args.cleanup:
-            manager.cleanup_orphaned_files()
+            manager.cleanup_orphaned_files(min_age_hours=args.min_age_hours)
         if args.check_db:
             manager.check_database_integrity()
+        if args.reconcile_counters:
+            manager.reconcile_counters()
     
     return 0
 
@@ -0,0 +1,167 @@
+"""
+Full-text search over memorials and memories.
+
+On both backends every word of the query must match, as a prefix of a word
+in the document.
+
+PostgreSQL uses the trigger-maintained ``search_vector`` columns and their
+GIN indexes (see models.py). About ``MAX_CANDIDATES`` matches are taken
+from the index (``gin_fuzzy_search_limit``) and at most that many are
+ranked with ``ts_rank_cd``; ``ts_headline``, the expensive part, only runs
+on the page being returned. This bounds the ranking work for a common word,
+at a cost in recall: when more rows match, the ranking only sees a random
+sample of about ``MAX_CANDIDATES`` of them, so the best match can be
+missed, results stop at that many, and repeated searches may differ. A
+query that broad needs another word to be useful anyway. Reading the GIN
+posting list still grows with the number of matches; see
+scripts/benchmark_search.py for measurements.
+SQLite uses the FTS5 tables with bm25 ranking and ``snippet()``.
+
+Snippets are HTML-escaped, with matches wrapped in ``<mark>``.
+"""
+import re
+from html import escape
+from sqlalchemy import text
+from models import db
+
+# Highlight markers that cannot appear in user text; swapped for <mark> after escaping
+_START, _STOP = '\x02', '\x03'
+
+_HEADLINE_OPTIONS = f'StartSel={_START}, StopSel={_STOP}, MaxFragments=2, MaxWords=20, MinWords=5'
+
+# Matches ranked per query on PostgreSQL
+MAX_CANDIDATES = 5000
+
+# Caps what the GIN scan returns for a word found in many rows (a soft limit:
+# PostgreSQL drops matches at random to stay near it)
+_SET_GIN_LIMIT = text("SELECT set_config('gin_fuzzy_search_limit', :limit, true)")
+
+# At most MAX_CANDIDATES matches are ranked, and only the page's ids leave
+# the top-N sort; the row bodies are read and ts_headline runs for that page
+# alone
+_POSTGRESQL_QUERIES = {
+    'memorial': """
+        WITH q AS (SELECT to_tsquery('simple', :query) AS query),
+        candidates AS (
+            SELECT m.id, m.search_vector
+            FROM memorial m, q
+            WHERE m.search_vector @@ q.query AND m.is_public
+            LIMIT :max_candidates
+        ),
+        page AS (
+            SELECT c.id, ts_rank_cd(c.search_vector, q.query) AS rank
+            FROM candidates c, q
+            ORDER BY rank DESC, c.id DESC
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT m.id, m.name, m.title, page.rank,
+               ts_headline('simple', coalesce(m.biography, ''), q.query, :headline_options) AS snippet
+        FROM page JOIN memorial m ON m.id = page.id, q
+        ORDER BY page.rank DESC, page.id DESC
+    """,
+    'memory': """
+        WITH q AS (SELECT to_tsquery('simple', :query) AS query),
+        candidates AS (
+            SELECT m.id, m.search_vector
+            FROM memory m, q
+            WHERE m.search_vector @@ q.query
+              AND EXISTS (SELECT 1 FROM memorial_memories mm
+                          JOIN memorial ON memorial.id = mm.memorial_id
+                          WHERE mm.memory_id = m.id AND memorial.is_public)
+            LIMIT :max_candidates
+        ),
+        page AS (
+            SELECT c.id, ts_rank_cd(c.search_vector, q.query) AS rank
+            FROM candidates c, q
+            ORDER BY rank DESC, c.id DESC
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT m.id, m.title, page.rank,
+               ts_headline('simple', m.content, q.query, :headline_options) AS snippet
+        FROM page JOIN memory m ON m.id = page.id, q
+        ORDER BY page.rank DESC, page.id DESC
+    """,
+}
+
+_SQLITE_QUERIES = {
+    # bm25() column weights follow the tsvector weights: name, title, subtitle, biography
+    'memorial': f"""
+        SELECT m.id, m.name, m.title, -bm25(memorial_fts, 10.0, 4.0, 4.0, 1.0) AS rank,
+               snippet(memorial_fts, 3, '{_START}', '{_STOP}', '...', 20) AS snippet
+        FROM memorial_fts JOIN memorial m ON m.id = memorial_fts.rowid
+        WHERE memorial_fts MATCH :query AND m.is_public = 1
+        ORDER BY rank DESC, m.id DESC
+        LIMIT :limit OFFSET :offset
+    """,
+    'memory': f"""
+        SELECT m.id, m.title, -bm25(memory_fts, 10.0, 4.0) AS rank,
+               snippet(memory_fts, 1, '{_START}', '{_STOP}', '...', 20) AS snippet
+        FROM memory_fts JOIN memory m ON m.id = memory_fts.rowid
+        WHERE memory_fts MATCH :query
+          AND EXISTS (SELECT 1 FROM memorial_memories mm
+                      JOIN memorial ON memorial.id = mm.memorial_id
+                      WHERE mm.memory_id = m.id AND memorial.is_public = 1)
+        ORDER BY rank DESC, m.id DESC
+        LIMIT :limit OFFSET :offset
+    """,
+}
+
+
+def _words(query):
+    return re.findall(r'\w+', query, flags=re.UNICODE)
+
+
+def _tsquery(query):
+    """Turn free text into a tsquery: every word must match, as a prefix."""
+    return ' & '.join(f"'{word}':*" for word in _words(query))
+
+
+def _fts5_query(query):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    return ' '.join(f'"{word}"*' for word in _words(query))
+
+
+def _highlight(snippet):
+    """Escape a snippet and convert the sentinel markers to <mark> tags."""
+    return escape(snippet or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def search(kind, query, limit=20, offset=0):
+    """Search public memorials or memories.
+
+    Args:
+        kind: ``'memorial'`` or ``'memory'``
+        query: Free text; punctuation is ignored
+        limit: Maximum number of results
+        offset: Number of results to skip
+
+    Returns:
+        list: Result dicts, best match first, each with a ``rank`` and a
+        highlighted ``snippet``
+    """
+    if db.engine.dialect.name == 'postgresql':
+        sql = _POSTGRESQL_QUERIES[kind]
+        params = {'query': _tsquery(query), 'headline_options': _HEADLINE_OPTIONS,
+                  'max_candidates': MAX_CANDIDATES}
+    else:
+        sql = _SQLITE_QUERIES[kind]
+        params = {'query': _fts5_query(query)}
+    if not params['query']:
+        return []
+    params.update(limit=limit, offset=offset)
+
+    postgresql = 'max_candidates' in params
+    if postgresql:
+        db.session.execute(_SET_GIN_LIMIT, {'limit': str(MAX_CANDIDATES)})
+    rows = db.session.execute(text(sql), params).mappings().all()
+    if postgresql:
+        # Back to unlimited for the rest of the transaction
+        db.session.execute(_SET_GIN_LIMIT, {'limit': '0'})
+
+    results = []
+    for row in rows:
+        result = dict(row)
+        result['rank'] = round(float(result['rank']), 6)
+        result['snippet'] = _highlight(result['snippet'])
+        results.append(result)
+    return results
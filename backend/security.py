@@ -62,17 +62,33 @@ def decode_token(token):
     except jwt.InvalidTokenError:
         return None  # Invalid token
 
+def _bearer_token():
+    """Return the token from the Authorization header, or None."""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.split(" ")[1]
+    return None
+
+def _current_user(data):
+    return {
+        'id': data['user_id'],
+        'username': data['username'],
+        'is_admin': data.get('is_admin', False)
+    }
+
+def optional_user():
+    """Return the user of a valid token on the request, or None for anonymous
+    requests and invalid tokens."""
+    token = _bearer_token()
+    data = decode_token(token) if token else None
+    return _current_user(data) if data else None
+
 def token_required(f):
     """Decorator to require a valid JWT token for a route."""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
         # Check for token in Authorization header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(" ")[1]
+        token = _bearer_token()
         
         if not token:
             return jsonify({
@@ -89,11 +105,7 @@ def token_required(f):
             }), 401
             
         # Add user info to the request context
-        request.current_user = {
-            'id': data['user_id'],
-            'username': data['username'],
-            'is_admin': data.get('is_admin', False)
-        }
+        request.current_user = _current_user(data)
         
         return f(*args, **kwargs)
     return decorated
@@ -163,3 +175,8 @@ auth_limiter = limiter.limit(
     "5 per minute",
     error_message={"error": "too_many_attempts", "message": "Too many login attempts. Please try again later."}
 )
+
+export_limiter = limiter.limit(
+    lambda: current_app.config.get('EXPORT_RATE_LIMIT', '5 per hour'),
+    error_message={"error": "rate_limit_exceeded", "message": "Too many exports. Please try again later."}
+)
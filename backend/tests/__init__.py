@@ -23,7 +23,7 @@ def app():
     db_fd, db_path = tempfile.mkstemp()
     
     # Create the app with test config
-    app = create_app(TEST_CONFIG)
+    app = create_app('testing', TEST_CONFIG)
     
     # Create the database and load test data
     with app.app_context():
@@ -0,0 +1,86 @@
+"""
+Shared fixtures for the Gate of Memory backend tests.
+"""
+import os
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from models import db, User
+from app import create_app
+from autocomplete import refresher
+from counters import flusher
+from scans import writer
+
+@pytest.fixture
+def app_config():
+    """Extra configuration for ``app``; override it in a test module."""
+    return {}
+
+@pytest.fixture
+def postgres_app(app_config):
+    """Run ``app`` on TEST_DATABASE_URL, in a schema of its own; skips the
+    test unless that is a PostgreSQL database."""
+    url = os.getenv('TEST_DATABASE_URL', '')
+    if not url.startswith('postgresql'):
+        pytest.skip('TEST_DATABASE_URL is not a PostgreSQL database')
+    schema = f'test_{os.getpid()}'
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE SCHEMA {schema}'))
+    app_config.update(SQLALCHEMY_DATABASE_URI=url,
+                      SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'options': f'-csearch_path={schema}'}})
+    yield
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA {schema} CASCADE'))
+    engine.dispose()
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    """A bare Flask app on a fresh SQLite file with every table created and
+    one user, ``owner`` (``app.owner_id``). The app context stays pushed for
+    the test.
+
+    Test modules seed their own data by overriding this fixture with one that
+    takes ``app`` as its argument.
+    """
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}")
+    app.config.update(app_config)
+    db.init_app(app)
+
+    with app.app_context():
+        db.metadata.create_all(db.engine)
+        owner = User(username='owner', email='owner@example.com', password_hash='x')
+        db.session.add(owner)
+        db.session.commit()
+        app.owner_id = owner.id
+
+        yield app
+
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def api_app(tmp_path, app_config):
+    """The full application from ``create_app('testing')`` on a fresh SQLite
+    file, with every table created and the app context pushed."""
+    uploads = tmp_path / 'uploads'
+    app = create_app('testing', dict({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'api.db'}",
+        'UPLOAD_FOLDER': str(uploads),
+    }, **app_config))
+
+    with app.app_context():
+        db.metadata.create_all(db.engine)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+    # Background threads must not outlive the app they work for
+    for worker in (flusher, writer, refresher, app.extensions['health'].refresher):
+        worker.stop()
+
+@pytest.fixture
+def client(api_app):
+    """A test client for ``api_app``."""
+    return api_app.test_client()
@@ -5,7 +5,8 @@ import json
 import pytest
 from datetime import datetime
 from flask import url_for
-from models import db, User, Memorial, Memory, Image
+from models import db, User, Memorial, Memory, MemoryImage, Image
+from security import generate_token
 
 # Test data
 TEST_USER = {
@@ -178,3 +179,132 @@ def test_add_memory_to_memorial(client, db):
     assert data['content'] == memory_data['content']
     assert data['memorial_id'] == memorial.id
     assert data['user_id'] == user.id
+
+def make_owner():
+    user = User(username=TEST_USER['username'], email=TEST_USER['email'])
+    user.set_password(TEST_USER['password'])
+    return user
+
+# The tests below use the conftest fixtures: ``client`` on the app from
+# create_app(), and the models' ``db`` directly.
+
+def test_add_memories_in_batch(client):
+    """Test creating several memories for several memorials in one request."""
+    user = make_owner()
+    first = Memorial(title=TEST_MEMORIAL['title'], name=TEST_MEMORIAL['name'], creator=user)
+    second = Memorial(title=TEST_MEMORIAL['title'], name='Jane Doe', creator=user)
+    db.session.add_all([user, first, second])
+    db.session.commit()
+    
+    memories = [
+        {'title': f'Guestbook entry {i}', 'content': 'We remember', 'memorial_ids': [first.id, second.id]}
+        for i in range(50)
+    ]
+    response = client.post(
+        '/api/v1/memories',
+        data=json.dumps({'memories': memories}),
+        content_type='application/json'
+    )
+    
+    assert response.status_code == 201
+    data = json.loads(response.data)['data']
+    assert len(data) == 50
+    assert data[0]['title'] == 'Guestbook entry 0'
+    assert data[0]['memorial_ids'] == [first.id, second.id]
+    assert len(db.session.get(Memorial, first.id).memories) == 50
+    assert len(db.session.get(Memorial, second.id).memories) == 50
+
+def test_add_memories_with_unknown_memorial(client):
+    """Test that a batch referencing a missing memorial creates nothing."""
+    response = client.post(
+        '/api/v1/memories',
+        data=json.dumps({'memories': [
+            {'title': 'Entry', 'content': 'We remember', 'memorial_ids': [12345]}
+        ]}),
+        content_type='application/json'
+    )
+    
+    assert response.status_code == 404
+    data = json.loads(response.data)
+    assert data['errors']['memorial_ids'] == [12345]
+    assert Memory.query.count() == 0
+
+@pytest.mark.parametrize('body', ['42', '"memories"', 'null', 'true'])
+def test_add_memories_rejects_non_object_bodies(client, body):
+    """Test that JSON bodies other than an object or array are a 400, not a 500."""
+    response = client.post('/api/v1/memories', data=body, content_type='application/json')
+    
+    assert response.status_code == 400
+
+def test_get_memorials_by_ids(client):
+    """Test fetching several memorials by ID in request order."""
+    user = make_owner()
+    first = Memorial(title=TEST_MEMORIAL['title'], name='John Doe', creator=user)
+    second = Memorial(title=TEST_MEMORIAL['title'], name='Jane Doe', creator=user)
+    hidden = Memorial(title=TEST_MEMORIAL['title'], name='Private', creator=user, is_public=False)
+    db.session.add_all([user, first, second, hidden])
+    db.session.commit()
+    
+    response = client.get(f'/api/v1/memorials?ids={second.id},12345,{first.id},{hidden.id}')
+    
+    assert response.status_code == 200
+    data = json.loads(response.data)['data']
+    assert [item['id'] for item in data['items']] == [second.id, 12345, first.id, hidden.id]
+    assert data['items'][0]['name'] == 'Jane Doe'
+    assert data['items'][1] == {'id': 12345, 'status': 'not_found'}
+    assert data['items'][3] == {'id': hidden.id, 'status': 'not_found'}
+    assert data['found'] == 2
+
+def test_get_memorial_with_includes(client):
+    """Test embedding images and memories in the memorial detail response."""
+    user = make_owner()
+    memorial = Memorial(title=TEST_MEMORIAL['title'], name=TEST_MEMORIAL['name'], creator=user)
+    db.session.add_all([user, memorial])
+    db.session.flush()
+    db.session.add_all([
+        Image(filename='profile.jpg', memorial_id=memorial.id, is_profile=True),
+        Image(filename='family.jpg', memorial_id=memorial.id),
+        Image(filename='garden.jpg', memorial_id=memorial.id),
+    ])
+    memorial.memories.extend(Memory(title=f'Memory {i}', content='We remember') for i in range(3))
+    memorial.memories[0].images.extend(MemoryImage(filename=f'beach-{i}.jpg') for i in range(3))
+    db.session.commit()
+    
+    response = client.get(f'/api/v1/memorials/{memorial.id}?include=images,memories'
+                          '&images_limit=2&memories_limit=5&memory_images_limit=2')
+    
+    assert response.status_code == 200
+    data = json.loads(response.data)['data']
+    assert data['profile_image']['filename'] == 'profile.jpg'
+    assert len(data['images']) == 2
+    assert data['images'][0]['filename'] == 'profile.jpg'
+    assert len(data['memories']) == 3
+    with_images = [memory for memory in data['memories'] if memory['images']]
+    assert len(with_images) == 1
+    assert len(with_images[0]['images']) == 2
+    assert with_images[0]['has_more_images'] is True
+    assert data['included'] == {
+        'images': {'limit': 2, 'has_more': True},
+        'memories': {'limit': 5, 'has_more': False, 'images_limit': 2}
+    }
+    
+    response = client.get(f'/api/v1/memorials/{memorial.id}?include=comments')
+    assert response.status_code == 400
+
+def test_private_memorial_includes_need_the_owner(client):
+    """Test that a private memorial's images and memories are only embedded for its owner."""
+    user = make_owner()
+    memorial = Memorial(title=TEST_MEMORIAL['title'], name='Private', creator=user, is_public=False)
+    memorial.memories.append(Memory(title='A quiet day', content='We remember'))
+    db.session.add_all([user, memorial])
+    db.session.commit()
+    url = f'/api/v1/memorials/{memorial.id}?include=memories'
+    
+    assert client.get(url).status_code == 404
+    stranger = generate_token(user.id + 1, 'stranger')
+    assert client.get(url, headers={'Authorization': f'Bearer {stranger}'}).status_code == 404
+    
+    owner = generate_token(user.id, user.username)
+    response = client.get(url, headers={'Authorization': f'Bearer {owner}'})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['data']['memories']) == 1
@@ -0,0 +1,118 @@
+"""
+Tests for memorial name autocomplete.
+"""
+from datetime import timedelta
+import pytest
+from sqlalchemy import text
+from models import db, User, Memorial
+from autocomplete import name_index, normalize, suggest
+
+@pytest.fixture
+def app(app):
+    """The shared app with a few public memorials and one private one, indexed."""
+    name_index.reset()
+    for name, is_public in [('Ahmed Mohammed', True), ('Mohammed Ali', True),
+                            ('أحمد محمد', True), ('José Álvarez', True),
+                            ('Ahmed Private', False)]:
+        db.session.add(Memorial(title='In loving memory', name=name,
+                                is_public=is_public, user_id=app.owner_id))
+    db.session.commit()
+    name_index.refresh()
+    yield app
+    name_index.reset()
+
+def names(query, limit=10):
+    return [result['name'] for result in suggest(query, limit)]
+
+def test_normalize_folds_case_accents_and_arabic_variants():
+    """Case, accents, tashkeel, tatweel and alef/ta marbuta variants fold away."""
+    assert normalize('José  ÁLVAREZ') == 'jose alvarez'
+    assert normalize('أَحْمَد') == normalize('احمد') == 'احمد'
+    assert normalize('فاطمـــة') == 'فاطمه'
+
+def test_prefix_matches_any_word_start_of_name_first(app):
+    """Any word can match; names that start with the query rank first."""
+    assert names('moh') == ['Mohammed Ali', 'Ahmed Mohammed']
+    assert names('ahmed mo') == ['Ahmed Mohammed']
+    assert names('moh', limit=1) == ['Mohammed Ali']
+
+def test_tables_are_created_without_pg_trgm(postgres_app, app):
+    """create_all() succeeds on a PostgreSQL server that does not ship pg_trgm,
+    and names are still suggested; where it is shipped the trigram index is built."""
+    available = bool(db.session.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar())
+    indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('memorial')}
+    assert ('idx_memorial_name_trgm' in indexes) == available
+    assert names('moh') == ['Mohammed Ali', 'Ahmed Mohammed']
+
+def test_arabic_and_accented_names(app):
+    """Arabic names match without hamza, and accents are optional."""
+    assert names('احم') == ['أحمد محمد']
+    assert names('محمد') == ['أحمد محمد']
+    assert names('alva') == ['José Álvarez']
+
+def test_private_memorials_are_not_suggested(app):
+    """Only public memorials are indexed."""
+    assert names('ahmed') == ['Ahmed Mohammed']
+
+def test_index_follows_committed_changes(app):
+    """Inserts, renames, privacy changes and deletes apply on commit."""
+    user = User.query.first()
+    db.session.add(Memorial(title='Remembering', name='Fatima Zahra', user_id=user.id))
+    renamed = Memorial.query.filter_by(name='Mohammed Ali').one()
+    renamed.name = 'Muhammad Ali'
+    Memorial.query.filter_by(name='Ahmed Private').one().is_public = True
+    db.session.commit()
+
+    assert names('fat') == ['Fatima Zahra']
+    assert names('muh') == ['Muhammad Ali']
+    assert names('mohammed') == ['Ahmed Mohammed']
+    assert names('ahmed') == ['Ahmed Private', 'Ahmed Mohammed']
+
+    db.session.delete(Memorial.query.filter_by(name='Fatima Zahra').one())
+    db.session.commit()
+    assert names('fat') == []
+
+def test_rolled_back_changes_are_ignored(app):
+    """Flushed but rolled back writes never reach the index."""
+    user = User.query.first()
+    db.session.add(Memorial(title='Remembering', name='Yusuf Rollback', user_id=user.id))
+    db.session.flush()
+    db.session.rollback()
+    assert names('yusuf') == []
+
+def test_changes_from_other_processes_are_loaded(app):
+    """Rows written outside this process's session appear on the next refresh,
+    including ones committed after a newer row was already loaded."""
+    newest = db.session.query(db.func.max(Memorial.updated_at)).scalar()
+    with db.engine.begin() as conn:
+        conn.execute(Memorial.__table__.insert(), [
+            {'title': 'Remembering', 'name': 'Grace Wanjiru', 'user_id': 1, 'is_public': True},
+            # Flushed before the newest row but committed after it
+            {'title': 'Remembering', 'name': 'Grace Late', 'user_id': 1, 'is_public': True,
+             'updated_at': newest - timedelta(seconds=5)},
+        ])
+    assert names('grace') == []
+    assert name_index.refresh()
+    assert names('grace') == ['Grace Late', 'Grace Wanjiru']
+
+def test_prefix_query_until_the_index_is_built(app):
+    """Requests never build the index; they query the table until it is ready."""
+    name_index.reset()
+    assert names('moh') == ['Ahmed Mohammed', 'Mohammed Ali']
+    assert names('50%') == []
+    assert not name_index.built
+
+def test_autocomplete_endpoint_reads_the_query_string(client):
+    """GET /api/v1/search/autocomplete takes its parameters from the URL."""
+    owner = User(username='owner', email='owner@example.com', password_hash='x')
+    owner.memorials.extend(Memorial(title='In loving memory', name=name)
+                           for name in ('Mohammed Ali', 'Ahmed Mohammed'))
+    db.session.add(owner)
+    db.session.commit()
+
+    response = client.get('/api/v1/search/autocomplete?q=moh')
+    assert response.status_code == 200
+    assert sorted(s['name'] for s in response.get_json()['data']) == ['Ahmed Mohammed', 'Mohammed Ali']
+    assert len(client.get('/api/v1/search/autocomplete?q=moh&limit=1').get_json()['data']) == 1
+    assert client.get('/api/v1/search/autocomplete').get_json()['data'] == []
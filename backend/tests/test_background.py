@@ -0,0 +1,37 @@
+"""
+Tests for the shared background worker.
+"""
+import logging
+import threading
+from flask import Flask
+from background import BackgroundWorker
+
+def test_failures_are_logged_and_the_thread_keeps_running(caplog):
+    """A task that raises is logged and retried on the next interval."""
+    calls = []
+    done = threading.Event()
+
+    def task():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('database unavailable')
+        done.set()
+
+    worker = BackgroundWorker('test-worker', task, interval=0.01)
+    worker.init_app(Flask(__name__))
+    with caplog.at_level(logging.WARNING, logger='background'):
+        worker.start()
+        worker.start()  # once per process
+        assert done.wait(5)
+    assert 'test-worker failed: database unavailable' in caplog.text
+    assert [t.name for t in threading.enumerate()].count('test-worker') == 1
+
+def test_run_reports_failure():
+    """run() returns False instead of raising."""
+    def task():
+        raise ValueError('boom')
+
+    worker = BackgroundWorker('test-run', task)
+    worker.init_app(Flask(__name__))
+    assert worker.run() is False
+    assert worker.run(lambda: None) is True
@@ -0,0 +1,92 @@
+"""
+Tests for the denormalized memorial counters.
+"""
+import pytest
+from models import db, Memorial, Memory, Image
+from counters import counter_buffer, reconcile, record_view, track
+
+@pytest.fixture
+def app(app):
+    """The shared app with two memorials and an empty counter buffer."""
+    counter_buffer.reset()
+    db.session.add_all([Memorial(title='In loving memory', name=name, user_id=app.owner_id)
+                        for name in ('Ahmed Mohammed', 'Grace Wanjiru')])
+    db.session.commit()
+    yield app
+    counter_buffer.reset()
+
+def counts(memorial_id):
+    counter_buffer.flush(db.engine)
+    db.session.expire_all()
+    memorial = db.session.get(Memorial, memorial_id)
+    return memorial.memory_count, memorial.image_count, memorial.qr_view_count
+
+def test_views_are_aggregated_into_one_update_per_memorial(app):
+    """Many increments to one memorial flush as a single row change."""
+    for _ in range(250):
+        record_view(1)
+    record_view(2, count=3)
+    assert len(counter_buffer) == 2
+    assert counter_buffer.flush(db.engine) == 2
+    assert counter_buffer.flush(db.engine) == 0
+    assert counts(1) == (0, 0, 250)
+    assert counts(2) == (0, 0, 3)
+
+def test_committed_orm_writes_are_counted(app):
+    """Memory links from either side and image adds/deletes are counted on commit."""
+    first, second = db.session.get(Memorial, 1), db.session.get(Memorial, 2)
+    memory = Memory(title='A day at the sea', content='...')
+    memory.memorials.extend([first, second])
+    second.memories.append(Memory(title='Graduation', content='...'))
+    db.session.add_all([memory, Image(filename='a.jpg', memorial_id=1),
+                        Image(filename='b.jpg', memorial_id=1)])
+    assert len(counter_buffer) == 0  # nothing before commit
+    db.session.commit()
+    assert counts(1) == (1, 2, 0)
+    assert counts(2) == (2, 0, 0)
+
+    first = db.session.get(Memorial, 1)
+    first.memories.remove(memory)
+    db.session.delete(first.images[0])
+    db.session.delete(Memory.query.filter_by(title='Graduation').one())
+    db.session.commit()
+    assert counts(1) == (0, 1, 0)
+    assert counts(2) == (1, 0, 0)
+
+def test_rolled_back_writes_are_not_counted(app):
+    """Changes flushed inside a rolled-back transaction are dropped."""
+    db.session.add(Image(filename='a.jpg', memorial_id=1))
+    db.session.flush()
+    track(db.session, 2, 'memory_count')
+    db.session.rollback()
+    assert counts(1) == (0, 0, 0)
+    assert counts(2) == (0, 0, 0)
+
+def test_failed_flush_keeps_increments(app):
+    """Increments survive a failed flush and are written by the next one."""
+    record_view(1, count=5)
+
+    class BrokenEngine:
+        def begin(self):
+            raise RuntimeError('database unavailable')
+
+    with pytest.raises(RuntimeError):
+        counter_buffer.flush(BrokenEngine())
+    record_view(1)
+    assert counts(1) == (0, 0, 6)
+
+def test_reconcile_repairs_drift(app):
+    """Counts written around the buffer are detected and recomputed."""
+    db.session.add(Image(filename='a.jpg', memorial_id=1))
+    db.session.commit()
+    counter_buffer.flush(db.engine)
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('UPDATE memorial SET memory_count = 7, qr_view_count = 4 WHERE id = 2')
+        conn.exec_driver_sql("INSERT INTO image (filename, memorial_id, is_profile) VALUES ('b.jpg', 1, false)")
+
+    assert reconcile(db.engine, batch_size=1, fix=False) == {'checked': 2, 'drifted': 2}
+    assert counts(1) == (0, 1, 0)
+    assert reconcile(db.engine, batch_size=1) == {'checked': 2, 'drifted': 2}
+    assert counts(1) == (0, 2, 0)
+    assert counts(2) == (0, 0, 4)
+    assert reconcile(db.engine)['drifted'] == 0
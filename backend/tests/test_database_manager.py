@@ -0,0 +1,188 @@
+"""
+Tests for the database manager script.
+"""
+import os
+import time
+import signal
+import importlib
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+@pytest.fixture
+def database_manager(tmp_path, monkeypatch):
+    """The database manager module, imported with its log file kept in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('scripts.database_manager')
+
+@pytest.fixture
+def postgres(database_manager):
+    """A DatabaseManager on TEST_DATABASE_URL."""
+    url = os.getenv('TEST_DATABASE_URL', '')
+    if not url.startswith('postgresql'):
+        pytest.skip('TEST_DATABASE_URL is not a PostgreSQL database')
+    manager = database_manager.DatabaseManager(url)
+    if not manager.connect():
+        pytest.skip('PostgreSQL is not reachable')
+    yield manager
+    with manager.engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS advisor_probe, maintenance_probe'))
+    manager.engine.dispose()
+
+def snapshot(ts, samples):
+    return {'ts': ts, 'seconds': 0.1, 'errors': [],
+            'samples': [(metric, tuple(sorted(labels.items())), value) for metric, labels, value in samples]}
+
+def test_health_history_diffs_and_prunes(database_manager, tmp_path):
+    """Series are stored once; diffs compare the first and last snapshot of the window."""
+    history = database_manager.HealthHistory(str(tmp_path / 'health.sqlite'))
+    history.add(snapshot(100, [('db_table_bytes', {'table': 'image'}, 8192),
+                               ('db_table_bytes', {'table': 'memory'}, 100)]))
+    history.add(snapshot(200, [('db_table_bytes', {'table': 'image'}, 16384),
+                               ('db_table_bytes', {'table': 'memory'}, 100)]))
+    history.add(snapshot(300, [('db_table_bytes', {'table': 'image'}, 24576),
+                               ('db_blocked_sessions', {}, 2)]))
+    history.close()
+
+    history = database_manager.HealthHistory(str(tmp_path / 'health.sqlite'))
+    assert history.conn.execute('SELECT count(*) FROM series').fetchone()[0] == 3
+    rows = {(row['metric'], tuple(row['labels'].values())): row for row in history.diff(150)}
+    assert rows['db_table_bytes', ('image',)]['change'] == 8192
+    assert rows['db_table_bytes', ('memory',)]['after'] is None
+    assert rows['db_blocked_sessions', ()]['before'] is None
+    assert history.diff(100, until=200)[0]['change'] == 8192
+
+    assert history.prune(250) == 2
+    assert history.snapshot_times() == [300]
+    assert history.conn.execute('SELECT count(*) FROM sample').fetchone()[0] == 2
+
+def test_snapshot_collector_exposes_latest_samples(database_manager):
+    """The latest snapshot is served as labelled gauges; stale series disappear."""
+    from prometheus_client import CollectorRegistry, generate_latest
+    collector = database_manager.SnapshotCollector()
+    registry = CollectorRegistry()
+    registry.register(collector)
+    collector.samples = snapshot(0, [('db_table_dead_rows', {'table': 'image'}, 12),
+                                     ('db_table_dead_rows', {'table': 'memory'}, 3)])['samples']
+    collector.samples = snapshot(0, [('db_table_dead_rows', {'table': 'image'}, 40)])['samples']
+    output = generate_latest(registry).decode()
+    assert '# HELP db_table_dead_rows Estimated dead rows' in output
+    assert 'db_table_dead_rows{table="image"} 40.0' in output
+    assert 'memory' not in output
+
+def test_predicate_columns_of_normalized_statements(database_manager):
+    """Only columns of the table compared in the WHERE clause are picked up."""
+    query = ('SELECT memorial.id FROM memorial JOIN "user" ON "user".id = memorial.user_id '
+             'WHERE memorial.is_public = $1 AND "user".username IN ($2, $3) '
+             'AND memorial.religion IS NOT NULL ORDER BY memorial.created_at DESC LIMIT $4')
+    assert database_manager.predicate_columns(query, 'memorial') == ['is_public', 'religion']
+    assert database_manager.predicate_columns(query, 'user') == ['username']
+    assert database_manager.predicate_columns('SELECT 1', 'memorial') == []
+
+def test_statement_report_and_index_advice(postgres):
+    """Statements are ranked with their call site; the filtered column is suggested."""
+    from monitoring.querytags import _tag_statement
+    try:
+        with postgres.engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_stat_statements'))
+            conn.execute(text('SELECT pg_stat_statements_reset()'))
+    except Exception:
+        pytest.skip('pg_stat_statements is not in shared_preload_libraries')
+    with postgres.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE advisor_probe (id serial PRIMARY KEY, kind integer)'))
+        conn.execute(text('INSERT INTO advisor_probe (kind) SELECT g % 100 FROM generate_series(1, 20000) g'))
+
+    def lookup(conn, kind):
+        return conn.execute(text('SELECT id FROM advisor_probe WHERE advisor_probe.kind = :kind'),
+                            {'kind': kind}).all()
+
+    event.listen(Engine, 'before_cursor_execute', _tag_statement, retval=True)
+    try:
+        with postgres.engine.connect() as conn:
+            for kind in range(120):
+                lookup(conn, kind)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', _tag_statement)
+
+    report = postgres.get_statement_report(limit=50, min_calls=100)
+    row = next(row for row in report['by_mean'] if 'advisor_probe.kind' in row['query'])
+    assert row['calls'] == 120
+    assert row['callsite'].startswith('tests.test_database_manager:') and ':lookup:' in row['callsite']
+    assert 'callsite' not in row['query']
+
+    # Table statistics reach the shared view asynchronously
+    for _ in range(50):
+        advice = {table['table_name']: table for table in postgres.get_index_advice(10000, 100)}
+        if 'advisor_probe' in advice:
+            break
+        time.sleep(0.1)
+    assert advice['advisor_probe']['suggestion'] == \
+        'CREATE INDEX CONCURRENTLY idx_advisor_probe_kind ON "advisor_probe" (kind)'
+
+def test_maintenance_vacuums_dead_tables_and_backs_off_on_locks(postgres):
+    """Only the table with dead rows and its bloated indexes are planned; held locks skip tasks."""
+    with postgres._autocommit() as conn:
+        conn.execute(text('CREATE TABLE maintenance_probe (id serial PRIMARY KEY, value text)'))
+        conn.execute(text('INSERT INTO maintenance_probe (value) SELECT md5(g::text) FROM generate_series(1, 50000) g'))
+        conn.execute(text('ANALYZE maintenance_probe'))
+        conn.execute(text('DELETE FROM maintenance_probe WHERE id % 10 <> 0'))
+        conn.execute(text('ANALYZE maintenance_probe'))
+    postgres.engine.dispose()  # backends report their table statistics on disconnect
+
+    def planned():
+        return [(task['action'], task['target']) for task in postgres.plan_maintenance(min_index_bytes=0)
+                if task['table'] == 'maintenance_probe']
+
+    for _ in range(50):
+        tasks = planned()
+        if tasks:
+            break
+        time.sleep(0.1)
+    assert tasks == [('vacuum', 'maintenance_probe'), ('reindex', 'maintenance_probe_pkey')]
+
+    with postgres.engine.connect() as holder:
+        holder.execute(text('LOCK TABLE maintenance_probe IN SHARE UPDATE EXCLUSIVE MODE'))
+        [task] = postgres.run_maintenance([{'action': 'vacuum', 'target': 'maintenance_probe',
+                                            'reason': 'test'}], lock_timeout='200ms')
+        assert (task['status'], task['error']) == ('skipped', 'lock timeout')
+        holder.rollback()
+
+    results = postgres.run_maintenance([task for task in postgres.plan_maintenance(min_index_bytes=0)
+                                        if task['table'] == 'maintenance_probe'])
+    assert [task['status'] for task in results] == ['done', 'done']
+    postgres.engine.dispose()
+    time.sleep(0.5)
+    assert planned() == []
+
+def test_maintenance_resets_session_timeouts_on_the_pooled_connection(postgres):
+    """lock_timeout set for a task does not follow the connection back into the pool."""
+    with postgres.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE maintenance_probe (id serial PRIMARY KEY)'))
+    postgres.engine.dispose()
+    [task] = postgres.run_maintenance([{'action': 'analyze', 'target': 'maintenance_probe', 'reason': 'test'}],
+                                      lock_timeout='200ms')
+    assert task['status'] == 'done'
+    with postgres.engine.connect() as conn:
+        assert postgres.engine.pool.checkedin() == 0  # the connection the task used
+        assert conn.execute(text('SHOW lock_timeout')).scalar() == '0'
+
+def test_maintain_loop_survives_a_failed_run(database_manager, monkeypatch):
+    """In --every mode an error is logged and the next interval runs again."""
+    manager = database_manager.DatabaseManager('sqlite://')
+    handlers, calls = {}, []
+    monkeypatch.setattr(database_manager.signal, 'signal', handlers.__setitem__)
+
+    def plan_maintenance(**thresholds):
+        calls.append(thresholds)
+        if len(calls) == 1:
+            raise RuntimeError('database is unreachable')
+        handlers[signal.SIGTERM](signal.SIGTERM, None)
+        return [{'action': 'analyze', 'target': 'memorial', 'table': 'memorial', 'reason': 'test'}]
+
+    monkeypatch.setattr(manager, 'plan_maintenance', plan_maintenance)
+    tasks = manager.maintain(interval=0.01, dry_run=True)
+    assert len(calls) == 2 and [task['target'] for task in tasks] == ['memorial']
+
+    calls.clear()
+    with pytest.raises(RuntimeError):
+        manager.maintain(dry_run=True)  # a one-off run still fails loudly
@@ -0,0 +1,69 @@
+"""
+Tests for the streaming account export.
+"""
+import io
+import json
+import zipfile
+import pytest
+from models import db, User, Memorial, Memory, Image, MemoryImage
+from exporter import export_user, acquire_slot
+
+@pytest.fixture
+def app_config(tmp_path):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    return {'UPLOAD_FOLDER': str(uploads), 'EXPORT_MAX_BYTES_PER_SECOND': 0, 'EXPORT_MAX_CONCURRENT': 1}
+
+@pytest.fixture
+def app(app, tmp_path):
+    """The owner's memorials, a memory shared by two of them, image files, and
+    another user's memorial."""
+    uploads = tmp_path / 'uploads'
+    other = User(username='other', email='other@example.com', password_hash='x')
+    db.session.add(other)
+
+    shared = Memory(title='Shared', content='We remember')
+    for i in range(2):
+        memorial = Memorial(title='In loving memory', name=f'Person {i}', user_id=app.owner_id)
+        memorial.memories.append(shared)
+        db.session.add(memorial)
+        db.session.flush()
+        db.session.add(Image(filename=f'{i}.jpg', memorial_id=memorial.id, is_profile=True))
+        (uploads / f'{i}.jpg').write_bytes(bytes([i]) * 1000)
+    db.session.flush()
+    db.session.add(MemoryImage(filename='shared.jpg', memory_id=shared.id))
+    (uploads / 'shared.jpg').write_bytes(b'shared')
+    db.session.add(Memorial(title='In loving memory', name='Not mine', user_id=other.id))
+    db.session.commit()
+    return app
+
+def test_ndjson_export_contains_only_the_users_records(app):
+    """Every record of the user is exported once per memorial, and nothing else."""
+    lines = b''.join(export_user(app.owner_id, 'ndjson')).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+
+    assert records[0]['type'] == 'user' and records[0]['username'] == 'owner'
+    assert [r['name'] for r in records if r['type'] == 'memorial'] == ['Person 0', 'Person 1']
+    assert len([r for r in records if r['type'] == 'image']) == 2
+    assert [r['memorial_id'] for r in records if r['type'] == 'memory'] == [1, 2]
+    assert [r['filename'] for r in records if r['type'] == 'memory_image'] == ['shared.jpg']
+
+def test_zip_export_includes_image_files(app):
+    """The ZIP holds data.ndjson and the original image files."""
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(export_user(app.owner_id, 'zip'))))
+
+    assert archive.testzip() is None
+    assert archive.namelist() == ['data.ndjson', 'images/0.jpg', 'images/1.jpg',
+                                  'memory_images/shared.jpg']
+    assert archive.read('images/1.jpg') == b'\x01' * 1000
+    assert b'"type": "memorial"' in archive.read('data.ndjson')
+
+def test_concurrent_exports_are_limited(app):
+    """Only EXPORT_MAX_CONCURRENT export slots are handed out per process."""
+    slot = acquire_slot()
+    assert slot is not None
+    assert acquire_slot() is None
+    slot.release()
+    second = acquire_slot()
+    assert second is not None
+    second.release()
@@ -0,0 +1,52 @@
+"""
+Tests for the liveness and readiness probes.
+"""
+import time
+import pytest
+from models import db
+from monitoring.health import HealthMonitor
+
+@pytest.fixture
+def app_config():
+    return {'HEALTH_REFRESH_INTERVAL': 0.05}
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_first_ready_probe_finds_a_snapshot(app):
+    """Once started, the refresher has a snapshot ready for the first probe."""
+    monitor = HealthMonitor(app, db)
+    monitor.start()
+    wait_for(lambda: monitor.snapshot is not None)
+
+    response = app.test_client().get('/health/ready')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ready'
+    assert response.get_json()['database'] == 'connected'
+    assert app.test_client().get('/health/live').get_json()['status'] == 'alive'
+
+def test_building_the_app_starts_no_refresher(api_app):
+    """create_app() may run in the Gunicorn master: the refresher waits for
+    post_fork or the first probe."""
+    monitor = api_app.extensions['health']
+    assert monitor.refresher._pid is None
+    api_app.test_client().get('/health/live')
+    assert monitor.refresher._pid is not None
+
+def test_unreachable_or_stale_database_is_not_ready(app):
+    """A failed check or a snapshot older than HEALTH_STALE_AFTER answers 503."""
+    monitor = HealthMonitor(app, db)
+    monitor.start = lambda: None  # no refresher: the test sets the snapshot
+    client = app.test_client()
+    assert client.get('/api/health/ready').status_code == 503  # never refreshed: 'starting'
+
+    monitor.snapshot = {'database': 'connected', 'message': '', 'pool': {},
+                        'checked_at': time.time() - monitor.stale_after - 1}
+    body = client.get('/health/ready')
+    assert body.status_code == 503 and body.get_json()['status'] == 'not_ready'
+
+    monitor.snapshot = dict(monitor.snapshot, database='disconnected', checked_at=time.time())
+    assert client.get('/health/ready').status_code == 503
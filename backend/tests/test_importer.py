@@ -0,0 +1,72 @@
+"""
+Tests for bulk memorial import.
+"""
+import io
+import json
+import pytest
+from models import Memorial
+from importer import import_memorials, validate_row, RowError
+
+CSV = """title,name,birth_date,death_date,religion,is_public,user_id
+In loving memory,Ahmed Mohammed,1950-01-01,2020-05-01,muslim,true,
+Remembering,,1950-01-01,2020-01-01,christian,true,
+Remembering,Grace Wanjiru,1950-01-01,1940-01-01,christian,true,
+Remembering,John Doe,not-a-date,,christian,yes,
+Remembering,Jane Doe,,,christian,false,999
+Remembering,Mary Doe,,,,no,
+"""
+
+def test_validate_row_normalizes_values():
+    """Blank optional fields become NULL and defaults apply."""
+    values = validate_row({'title': ' Remembering ', 'name': 'Ahmed', 'subtitle': '',
+                           'is_public': 'No', 'birth_date': '1950-01-01'}, user_id='3')
+    assert values['title'] == 'Remembering'
+    assert values['subtitle'] is None
+    assert values['is_public'] is False
+    assert values['religion'] == 'christian'
+    assert values['user_id'] == 3
+    assert str(values['birth_date']) == '1950-01-01'
+
+    with pytest.raises(RowError, match='user_id is required'):
+        validate_row({'title': 'Remembering', 'name': 'Ahmed'})
+
+def test_csv_import_reports_bad_rows_and_keeps_good_ones(app):
+    """Invalid rows are reported by line; the rest of the batch is imported."""
+    result = import_memorials(io.StringIO(CSV), 'csv', user_id=1, batch_size=2).to_dict()
+
+    assert result['imported'] == 2
+    assert [error['line'] for error in result['errors']] == [3, 4, 5, 6]
+    assert 'name is required' in result['errors'][0]['error']
+    assert 'death_date is before birth_date' in result['errors'][1]['error']
+    assert 'birth_date must be an ISO date' in result['errors'][2]['error']
+    assert 'user 999 does not exist' in result['errors'][3]['error']
+
+    memorials = {m.name: m for m in Memorial.query}
+    assert set(memorials) == {'Ahmed Mohammed', 'Mary Doe'}
+    assert memorials['Ahmed Mohammed'].religion == 'muslim'
+    assert memorials['Mary Doe'].is_public is False
+    assert memorials['Mary Doe'].created_at is not None
+
+def test_ndjson_import_and_dry_run(app):
+    """NDJSON lines are imported; a dry run validates without writing."""
+    lines = [json.dumps({'title': 'Remembering', 'name': f'Person {i}', 'user_id': 1})
+             for i in range(5)]
+    lines.insert(2, '{not json')
+    body = '\n'.join(lines) + '\n'
+
+    dry = import_memorials(io.StringIO(body), 'ndjson', dry_run=True).to_dict()
+    assert dry['imported'] == 5 and dry['failed'] == 1
+    assert Memorial.query.count() == 0
+
+    result = import_memorials(io.StringIO(body), 'ndjson', batch_size=2).to_dict()
+    assert result['imported'] == 5
+    assert result['errors'][0]['line'] == 3
+    assert Memorial.query.count() == 5
+
+def test_error_report_is_capped(app):
+    """Every failure is counted but only max_errors are listed."""
+    body = 'title,name\n' + 'Remembering,\n' * 10
+    result = import_memorials(io.StringIO(body), 'csv', user_id=1, max_errors=3).to_dict()
+    assert result['failed'] == 10
+    assert len(result['errors']) == 3
+    assert result['errors_truncated'] is True
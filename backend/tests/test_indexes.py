@@ -0,0 +1,107 @@
+"""
+Tests that the list endpoint filters are served by indexes.
+
+Runs EXPLAIN QUERY PLAN on SQLite against the schema declared in models.py,
+and applies the index migration to a schema created without indexes.
+"""
+import importlib.util
+import os
+import pytest
+from sqlalchemy import create_engine, select, inspect
+from alembic.runtime.migration import MigrationContext
+from alembic.operations import Operations
+from models import db, Memorial, Image, MemoryImage, memorial_memories
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations',
+                         'versions', 'a1f3c9d2e7b4_add_filter_indexes.py')
+
+@pytest.fixture
+def engine(tmp_path):
+    """SQLite engine with the full schema, including indexes."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'plan.db'}")
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def query_plan(engine, statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement."""
+    sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+def test_memorials_by_user_use_index(engine):
+    """MemorialListResource.get?user_id= uses idx_memorial_user_id."""
+    plan = query_plan(engine, select(Memorial).where(Memorial.user_id == 1))
+    assert any('idx_memorial_user_id' in step for step in plan), plan
+
+def test_public_memorials_use_composite_index(engine):
+    """Filtering on is_public and ordering by created_at needs no sort step."""
+    plan = query_plan(engine, select(Memorial)
+                      .where(Memorial.is_public == True)  # noqa: E712
+                      .order_by(Memorial.created_at.desc()))
+    assert any('idx_memorial_is_public_created_at' in step for step in plan), plan
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+def test_memorials_by_religion_use_composite_index(engine):
+    """Filtering on religion and ordering by created_at needs no sort step."""
+    plan = query_plan(engine, select(Memorial)
+                      .where(Memorial.religion == 'muslim')
+                      .order_by(Memorial.created_at.desc()))
+    assert any('idx_memorial_religion_created_at' in step for step in plan), plan
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+def test_images_by_memorial_use_index(engine):
+    """ImageListResource.get?memorial_id= uses an image memorial_id index."""
+    plan = query_plan(engine, select(Image).where(Image.memorial_id == 1))
+    assert any('idx_image_memorial_id' in step for step in plan), plan
+
+def test_profile_image_uses_partial_index(engine):
+    """The profile image lookup can use the partial index."""
+    plan = query_plan(engine, select(Image).where(Image.memorial_id == 1,
+                                                  Image.is_profile == True))  # noqa: E712
+    assert any('idx_image_memorial_id' in step for step in plan), plan
+
+def test_memory_associations_use_index(engine):
+    """Looking up a memory's memorials uses idx_memorial_memories_memory_id."""
+    plan = query_plan(engine, select(memorial_memories.c.memorial_id)
+                      .where(memorial_memories.c.memory_id == 1))
+    assert any('idx_memorial_memories_memory_id' in step for step in plan), plan
+
+def test_memory_images_use_index(engine):
+    """Loading a memory's images uses idx_memory_image_memory_id."""
+    plan = query_plan(engine, select(MemoryImage).where(MemoryImage.memory_id == 1))
+    assert any('idx_memory_image_memory_id' in step for step in plan), plan
+
+def test_migration_creates_and_drops_indexes(tmp_path):
+    """The migration adds every declared index to an unindexed schema and removes them again."""
+    spec = importlib.util.spec_from_file_location('add_filter_indexes', MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            indexes = set(table.indexes)
+            table.indexes.clear()
+            try:
+                table.create(conn)
+            finally:
+                table.indexes.update(indexes)
+
+    def index_names():
+        inspector = inspect(engine)
+        return {ix['name'] for table in inspector.get_table_names()
+                for ix in inspector.get_indexes(table)}
+
+    expected = {name for name, _, _, _ in migration.INDEXES}
+    assert not expected & index_names()
+
+    for step in (migration.upgrade, migration.upgrade):  # idempotent
+        with engine.begin() as conn, Operations.context(MigrationContext.configure(conn)):
+            step()
+    assert expected <= index_names()
+
+    with engine.begin() as conn, Operations.context(MigrationContext.configure(conn)):
+        migration.downgrade()
+    assert not expected & index_names()
+    engine.dispose()
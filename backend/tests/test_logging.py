@@ -0,0 +1,86 @@
+"""
+Tests for the queued logging pipeline.
+"""
+import time
+import queue
+import logging
+import threading
+from monitoring import BatchingQueueListener, DroppingQueueHandler, InfoSamplingFilter
+
+class RecordingHandler(logging.Handler):
+    """Collects records and counts batch flushes."""
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.flushes = 0
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+    def flush_batch(self):
+        self.flushes += 1
+
+def make_record(msg, level=logging.INFO, name='app'):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+def test_listener_flushes_once_per_batch():
+    """Queued records are written in order, with one flush per drained batch."""
+    log_queue = queue.Queue()
+    for i in range(10):
+        log_queue.put(make_record(f'record {i}'))
+    handler = RecordingHandler()
+    listener = BatchingQueueListener(log_queue, handler, batch_size=4)
+    listener.start()
+    listener.stop()
+    assert handler.records == [f'record {i}' for i in range(10)]
+    assert handler.flushes == 3 + 1  # 4 + 4 + 2 records, then the sentinel's batch
+    log_queue.join()  # every item was marked done
+
+def test_full_queue_drops_records_and_still_stops():
+    """A full queue drops new records instead of blocking, and stop() waits for room."""
+    gate = threading.Event()
+
+    class SlowHandler(RecordingHandler):
+        def emit(self, record):
+            gate.wait()
+            super().emit(record)
+
+    log_queue = queue.Queue(maxsize=2)
+    queue_handler = DroppingQueueHandler(log_queue)
+    handler = SlowHandler()
+    listener = BatchingQueueListener(log_queue, handler, batch_size=1)
+    listener.start()
+    queue_handler.handle(make_record('record 0'))
+    while not log_queue.empty():  # the writer is now stuck on record 0
+        time.sleep(0.001)
+    for i in range(1, 6):
+        queue_handler.handle(make_record(f'record {i}'))
+    assert queue_handler.dropped == 3
+
+    errors = []
+    def stop():
+        try:
+            listener.stop()  # the stock stop() raised queue.Full here
+        except Exception as e:
+            errors.append(e)
+    stopper = threading.Thread(target=stop)
+    stopper.start()
+    time.sleep(0.05)
+    gate.set()
+    stopper.join(5)
+    assert not stopper.is_alive() and errors == []
+    assert handler.records == ['record 0', 'record 1', 'record 2']
+
+def test_info_sampling():
+    """Sampling keeps warnings, applies per-logger rates and defaults to keeping everything."""
+    assert all(InfoSamplingFilter().filter(make_record('x', name='werkzeug')) for _ in range(100))
+
+    sampled = InfoSamplingFilter(rates={'werkzeug': 0.0})
+    assert not sampled.filter(make_record('GET /', name='werkzeug'))
+    assert not sampled.filter(make_record('GET /', name='werkzeug.serving'))
+    assert sampled.filter(make_record('GET /', logging.WARNING, name='werkzeug'))
+    assert sampled.filter(make_record('startup', name='werkzeugish'))
+
+    half = InfoSamplingFilter(default_rate=0.5)
+    kept = sum(half.filter(make_record('x')) for _ in range(2000))
+    assert 800 < kept < 1200
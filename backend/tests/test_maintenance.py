@@ -0,0 +1,197 @@
+"""
+Tests for the maintenance script.
+"""
+import os
+import time
+import importlib
+import pytest
+from models import db, Memorial, Memory, Image, MemoryImage
+
+@pytest.fixture
+def maintenance(tmp_path, monkeypatch):
+    """The maintenance module, imported with its log file kept in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('scripts.maintenance')
+
+@pytest.fixture
+def app(app):
+    """The shared app with a memorial, a memory and one image of each kind."""
+    memorial = Memorial(title='In loving memory', name='Grace Wanjiru', user_id=app.owner_id)
+    memory = Memory(title='Graduation', content='...')
+    memory.images.append(MemoryImage(filename='b2_memory.jpg'))
+    memorial.memories.append(memory)
+    db.session.add_all([memorial, Image(filename='a1_portrait.jpg', memorial=memorial)])
+    db.session.commit()
+    return app
+
+def make_file(path, age_hours=48, size=10):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+    mtime = time.time() - age_hours * 3600
+    os.utime(path, (mtime, mtime))
+
+def test_referenced_names_merge_sorted_runs(maintenance, app):
+    """Names from both tables are found, across several sorted runs."""
+    with db.engine.connect() as conn:
+        referenced = maintenance.load_referenced_names(conn, run_size=1)
+    assert len(referenced) == 2
+    assert list(referenced.keys) == sorted(referenced.keys)
+    assert maintenance._name_key('a1_portrait.jpg') in referenced
+    assert maintenance._name_key('b2_memory.jpg') in referenced
+    assert maintenance._name_key('c3_orphan.jpg') not in referenced
+
+def test_orphaned_files_are_removed(maintenance, app, tmp_path):
+    """Memory images and thumbnails of referenced files are kept; recent files too."""
+    uploads = tmp_path / 'uploads'
+    for name in ('a1_portrait.jpg', 'a1_portrait_thumb.jpg', 'b2_memory.jpg', '.gitkeep'):
+        make_file(uploads / name)
+    make_file(uploads / 'c3_orphan.jpg', size=100)
+    make_file(uploads / 'c3_orphan_thumb.jpg', size=20)
+    make_file(uploads / 'old' / 'd4_orphan.png', size=5)
+    make_file(uploads / 'e5_uploading.jpg', age_hours=0)
+
+    with db.engine.connect() as conn:
+        referenced = maintenance.load_referenced_names(conn)
+
+    dry = maintenance.remove_orphaned_files(uploads, referenced, dry_run=True, workers=2)
+    assert dry == {'scanned': 7, 'orphaned': 3, 'bytes': 125, 'deleted': 0, 'dry_run': True}
+    assert (uploads / 'c3_orphan.jpg').exists()
+
+    report = maintenance.remove_orphaned_files(uploads, referenced, workers=2, batch_size=1)
+    assert report['deleted'] == 3
+    remaining = sorted(p.name for p in uploads.rglob('*') if p.is_file())
+    assert remaining == ['.gitkeep', 'a1_portrait.jpg', 'a1_portrait_thumb.jpg',
+                         'b2_memory.jpg', 'e5_uploading.jpg']
+
+def test_integrity_checks_report_ids_and_missing_files(maintenance, app, tmp_path):
+    """Anti-join checks count and sample offenders; files are matched by name or stat."""
+    db.session.add_all([Memory(title='Draft', content=''), Memory(title='Draft 2', content='')])
+    db.session.commit()
+    uploads = tmp_path / 'uploads'
+    make_file(uploads / 'nested' / 'a1_portrait.jpg')
+    make_file(uploads / 'b2_memory_thumb.jpg')
+
+    with db.engine.connect() as conn:
+        checks = {name: maintenance.run_check(conn, statement, sample_size=1)
+                  for name, statement in maintenance.integrity_checks()}
+        present = maintenance.load_upload_names(uploads)
+        listed, _ = maintenance.check_files(conn, Image, uploads, present)
+        memory_listed, (ids, parents) = maintenance.check_files(conn, MemoryImage, uploads, present)
+        stat, _ = maintenance.check_files(conn, Image, uploads, workers=2)
+    assert checks['users_without_memorials'] == {'count': 0, 'sample_ids': []}
+    assert checks['memorials_without_images'] == {'count': 0, 'sample_ids': []}
+    assert checks['memories_without_memorials'] == {'count': 2, 'sample_ids': [2]}
+    assert checks['empty_memories'] == {'count': 2, 'sample_ids': [2]}
+    assert listed == {'count': 0, 'sample_ids': [], 'checked': 1}
+    assert memory_listed == {'count': 1, 'sample_ids': [1], 'checked': 1}
+    assert dict(parents) == {1: 1}
+    # stat looks for the file where the app writes it, not in subdirectories
+    assert stat['count'] == 1
+
+    assert maintenance.delete_rows(db.engine, MemoryImage, ids, chunk_size=1) == 1
+    assert MemoryImage.query.count() == 0
+
+def test_file_check_refuses_a_missing_or_wrong_uploads_directory(maintenance, app, tmp_path):
+    """A missing directory is an error, not "every file is missing", and fix
+    refuses to delete when most checked rows have no file."""
+    with db.engine.connect() as conn:
+        with pytest.raises(FileNotFoundError, match='does not exist'):
+            maintenance.load_upload_names(tmp_path / 'uploads')
+        with pytest.raises(FileNotFoundError, match='does not exist'):
+            maintenance.check_files(conn, Image, tmp_path / 'uploads', workers=2)
+        (tmp_path / 'elsewhere').mkdir()
+        result, _ = maintenance.check_files(conn, Image, tmp_path / 'elsewhere',
+                                            maintenance.load_upload_names(tmp_path / 'elsewhere'))
+    assert result['count'] == result['checked'] == 1
+    assert not maintenance.safe_to_fix(result)
+    assert maintenance.safe_to_fix({'count': 1, 'checked': 10})
+    assert maintenance.safe_to_fix({'count': 0, 'checked': 0})
+
+    # Without --uploads-dir the check looks where the app writes uploads
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'static' / 'uploads')
+    manager = maintenance.MaintenanceManager({'backup_dir': str(tmp_path / 'b')})
+    assert manager._uploads_dir(app) == tmp_path / 'static' / 'uploads'
+
+def test_retention_keeps_daily_and_weekly_backups(maintenance):
+    """The newest backup of each recent day and ISO week survives."""
+    from datetime import datetime, timedelta
+    start = datetime(2024, 1, 1, 2)  # a Monday
+    backups = [(start + timedelta(days=d, hours=h), f'{d}-{h}') for d in range(21) for h in (0, 12)]
+    expired = set(maintenance.select_expired(backups, keep_daily=3, keep_weekly=2))
+    kept = {path for _, path in backups} - expired
+    # last three days, plus the newest of the previous week (Sunday 14th)
+    assert kept == {'20-12', '19-12', '18-12', '13-12'}
+
+def test_failed_backup_leaves_no_unmanifested_dump(maintenance, app, tmp_path, monkeypatch):
+    """A dump whose uploads backup fails is removed, since retention only sees manifested backups."""
+    import app as app_module
+
+    def dump_database(db_url, target, jobs=4, compress=6):
+        make_file(target / 'toc.dat')
+        return target
+
+    make_file(tmp_path / 'uploads' / 'a1_portrait.jpg')
+    app.config.update(SQLALCHEMY_DATABASE_URI='postgresql://localhost/gom',
+                      UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    monkeypatch.setattr(app_module, 'create_app', lambda: app)
+    monkeypatch.setattr(maintenance, 'dump_database', dump_database)
+    manager = maintenance.MaintenanceManager({'backup_dir': str(tmp_path / 'b')})
+    (tmp_path / 'b' / 'uploads').write_text('not a directory')  # the upload store cannot be written
+    assert manager.backup_database('nightly') is False
+    assert list((tmp_path / 'b' / 'database').iterdir()) == []
+
+def test_upload_store_is_incremental(maintenance, tmp_path):
+    """Unchanged and duplicate files are stored once; untouched objects are pruned."""
+    from datetime import datetime, timedelta
+    uploads = tmp_path / 'uploads'
+    make_file(uploads / 'a.jpg', size=10)
+    (uploads / 'copy_of_a.jpg').write_bytes(b'x' * 10)
+    make_file(uploads / 'b.jpg', size=20)
+    store = maintenance.UploadStore(tmp_path / 'store')
+
+    first = store.backup(uploads, tmp_path / 'first.ndjson.gz', workers=1)
+    assert first == {'files': 3, 'bytes': 40, 'new_files': 2, 'new_bytes': 30}
+
+    two_days_ago = time.time() - 2 * 86400
+    for path in (tmp_path / 'store' / 'objects').rglob('*'):
+        if path.is_file():
+            os.utime(path, (two_days_ago, two_days_ago))
+    (uploads / 'b.jpg').unlink()
+    (uploads / 'c.jpg').write_bytes(b'new photo')
+    second = store.backup(uploads, tmp_path / 'second.ndjson.gz', previous=tmp_path / 'first.ndjson.gz',
+                          workers=1)
+    assert second == {'files': 3, 'bytes': 29, 'new_files': 1, 'new_bytes': 9}
+
+    # b.jpg's object is only referenced by the first backup, which expired
+    assert store.prune(datetime.now() - timedelta(days=1)) == 1
+    assert {p.name for p in (tmp_path / 'store' / 'objects').rglob('*') if p.is_file()} == {
+        maintenance.file_sha256(uploads / 'a.jpg'), maintenance.file_sha256(uploads / 'c.jpg')}
+
+def test_rotate_logs_compresses_closed_logs(maintenance, tmp_path):
+    """Numbered backups and idle traces are compressed and verified; logs that
+    handlers hold open are left alone, however long they have been idle."""
+    import gzip
+    logs = tmp_path / 'logs'
+    make_file(logs / 'app.log', age_hours=0)
+    make_file(logs / 'error.log', age_hours=48)
+    make_file(logs / 'app.log.1', age_hours=0, size=1000)
+    make_file(logs / 'app.json.2', age_hours=0, size=500)
+    make_file(logs / 'traces.jsonl', age_hours=48, size=300)
+    make_file(logs / 'app.log.20200101-000000.gz', age_hours=24 * 60)
+    make_file(logs / 'notes.txt', age_hours=48)
+    manager = maintenance.MaintenanceManager({'logs_dir': str(logs), 'backup_dir': str(tmp_path / 'b'),
+                                              'workers': 2})
+
+    stats = manager.rotate_logs(days_to_keep=30)
+    assert (stats['files'], stats['failed'], stats['bytes_in'], stats['expired']) == (3, 0, 1800, 1)
+    names = sorted(p.name for p in logs.iterdir())
+    assert [n for n in names if not n.endswith('.gz')] == ['app.log', 'error.log', 'notes.txt']
+    archives = [n for n in names if n.endswith('.gz')]
+    assert len(archives) == 3 and any(n.startswith('app.log.') for n in archives)
+    restored = gzip.decompress(next(logs.glob('app.json.*.gz')).read_bytes())
+    assert restored == b'x' * 500
+
+    # the handler rotates again: the new app.log.1 gets its own archive
+    make_file(logs / 'app.log.1', age_hours=0, size=10)
+    assert manager.rotate_logs()['files'] == 1
+    assert len(list(logs.glob('app.log.*.gz'))) == 2
@@ -0,0 +1,65 @@
+"""
+Tests for connection pool sizing and telemetry.
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from config import engine_options, BACKGROUND_CONNECTIONS
+from prometheus_client import REGISTRY
+from monitoring.pool import instrument_engine
+
+@pytest.fixture
+def env(monkeypatch):
+    for name in ('WEB_CONCURRENCY', 'GUNICORN_THREADS', 'EXPORT_MAX_CONCURRENT', 'DB_MAX_CONNECTIONS',
+                 'DB_RESERVED_CONNECTIONS', 'DB_POOL_SIZE', 'DB_MAX_OVERFLOW'):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+def sizing():
+    options = engine_options()
+    return options['pool_size'], options['max_overflow']
+
+def test_pool_covers_request_and_background_threads(env):
+    """Defaults: 4 workers share 90 connections; each pools its threads and background threads."""
+    assert sizing() == (1 + BACKGROUND_CONNECTIONS, 2 + 1)
+    env.setenv('GUNICORN_THREADS', '8')
+    assert sizing() == (8 + BACKGROUND_CONNECTIONS, 2 + 8)
+
+def test_pool_never_exceeds_the_per_worker_share(env):
+    """Overflow, then the pool itself, shrink to fit (max - reserved) // workers."""
+    env.setenv('WEB_CONCURRENCY', '8')
+    env.setenv('GUNICORN_THREADS', '4')
+    assert sizing() == (8, 3)  # 90 // 8 = 11 per worker
+    env.setenv('GUNICORN_THREADS', '8')
+    assert sizing() == (11, 0)
+    env.setenv('DB_MAX_CONNECTIONS', '12')
+    assert sizing() == (1, 0)  # never below one connection
+
+def test_explicit_pool_settings_win(env):
+    """DB_POOL_SIZE and DB_MAX_OVERFLOW override the derived values."""
+    env.setenv('DB_POOL_SIZE', '3')
+    env.setenv('DB_MAX_OVERFLOW', '0')
+    assert sizing() == (3, 0)
+
+def sample(name):
+    return REGISTRY.get_sample_value(name, {'pool': 'dispose-test'})
+
+def test_instrumentation_survives_dispose(tmp_path):
+    """Forked workers dispose the engine; the new pool is still measured."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=2)
+    instrument_engine(engine, 'dispose-test')
+    instrument_engine(engine, 'dispose-test')  # idempotent
+
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert sample('db_pool_checkout_wait_seconds_count') == 1
+    assert sample('db_pool_connections_opened_total') == 1
+
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        assert sample('db_pool_checked_out') == 1
+    assert sample('db_pool_checkout_wait_seconds_count') == 2
+    assert sample('db_pool_connections_opened_total') == 2
+    assert sample('db_pool_checkout_held_seconds_count') == 2
+    assert sample('db_pool_checked_out') == 0
+    engine.dispose()
@@ -0,0 +1,69 @@
+"""
+Tests for the sampling profiler.
+"""
+import time
+import signal
+import threading
+import pytest
+from flask import Flask
+from monitoring.profiler import init_profiler
+
+def burn(seconds):
+    """Spend ``seconds`` of CPU time (ITIMER_PROF only ticks on the CPU)."""
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, PROFILER_ENABLED=True, PROFILER_INTERVAL=0.001,
+                      PROFILER_THRESHOLD_MS=50, PROFILER_ENDPOINT_THRESHOLDS={'fast': 1000})
+
+    @app.route('/slow')
+    def slow():
+        burn(0.2)
+        return 'ok'
+
+    @app.route('/fast')
+    def fast():
+        burn(0.1)
+        return 'ok'
+
+    previous = signal.getsignal(signal.SIGPROF)
+    yield app
+    signal.setitimer(signal.ITIMER_PROF, 0)
+    signal.signal(signal.SIGPROF, previous)
+
+def test_slow_requests_keep_their_stacks(app):
+    """Requests over their endpoint threshold keep collapsed stacks; others are dropped."""
+    profiler = init_profiler(app)
+    client = app.test_client()
+    assert client.get('/fast').status_code == 200  # 100 ms, under its 1 s threshold
+    assert client.get('/slow').status_code == 200
+    assert signal.getitimer(signal.ITIMER_PROF) == (0.0, 0.0)  # disarmed when idle
+
+    [profile] = profiler.profiles
+    assert profile['endpoint'] == 'slow' and profile['duration_ms'] >= 200
+    assert profile['sample_count'] > 20
+    assert profile['captured_at'].endswith('+00:00')
+    assert any(':slow;' in stack and stack.endswith(':burn') for stack in profile['stacks'])
+
+def test_profiles_are_admin_only(app):
+    init_profiler(app)
+    assert app.test_client().get('/admin/profiles').status_code == 401
+
+def test_not_started_off_the_main_thread(app):
+    """signal.signal() raises outside the main thread; the profiler stays off instead."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(init_profiler(app)))
+    thread.start()
+    thread.join()
+    assert result == [None]
+    assert 'profiler' not in app.extensions
+
+def test_warns_with_request_threads(app, caplog, monkeypatch):
+    """Samples are only taken on the main thread, which gthread workers do not serve requests on."""
+    monkeypatch.setenv('GUNICORN_THREADS', '4')
+    assert init_profiler(app) is not None
+    assert 'GUNICORN_THREADS > 1' in caplog.text
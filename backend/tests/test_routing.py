@@ -0,0 +1,168 @@
+"""
+Tests for read-replica session routing.
+
+Uses two SQLite files as a stand-in primary and replica, seeded with
+different rows, so each response shows which database served it.
+"""
+import time
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import text
+from models import db, User
+from routing import init_routing, replica_binds, use_primary, STICKY_COOKIE, STICKY_HEADER
+
+def _seed(engine, username):
+    with engine.begin() as conn:
+        conn.execute(
+            text('INSERT INTO "user" (username, email, password_hash, is_admin) '
+                 "VALUES (:u, :e, 'x', 0)"),
+            {'u': username, 'e': f'{username}@example.com'}
+        )
+
+def _usernames(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text('SELECT username FROM "user" ORDER BY id'))]
+
+@pytest.fixture
+def routed_app(tmp_path):
+    """An app with a primary and one replica that start with different data."""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS=replica_binds([f"sqlite:///{tmp_path / 'replica.db'}"]),
+        READ_YOUR_WRITES_WINDOW=5
+    )
+    db.init_app(app)
+    init_routing(app)
+
+    @app.route('/users', methods=['GET'])
+    def list_users():
+        return jsonify([u.username for u in User.query.order_by(User.id)])
+
+    @app.route('/users/primary', methods=['GET'])
+    def list_users_primary():
+        with use_primary():
+            return jsonify([u.username for u in User.query.order_by(User.id)])
+
+    @app.route('/users', methods=['POST'])
+    def create_user():
+        user = User(username='new-user', email='new@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        # Read back within the same request: must see the write
+        return jsonify([u.username for u in User.query.order_by(User.id)]), 201
+
+    with app.app_context():
+        app.primary = db.engines[None]
+        app.replica = db.engines['replica_0']
+        for engine in (app.primary, app.replica):
+            db.metadata.create_all(engine)
+        _seed(app.primary, 'primary-user')
+        _seed(app.replica, 'replica-user')
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def test_get_reads_from_replica(routed_app):
+    """GET requests are served by the replica."""
+    response = routed_app.test_client().get('/users')
+    assert response.status_code == 200
+    assert response.get_json() == ['replica-user']
+
+def test_writes_go_to_primary(routed_app):
+    """POST requests write to the primary and read their own write back."""
+    response = routed_app.test_client().post('/users')
+
+    assert response.status_code == 201
+    assert response.get_json() == ['primary-user', 'new-user']
+    assert _usernames(routed_app.primary) == ['primary-user', 'new-user']
+    assert _usernames(routed_app.replica) == ['replica-user']
+
+def test_reads_stick_to_primary_after_write(routed_app):
+    """A client's reads stay on the primary for a short window after it writes."""
+    client = routed_app.test_client()
+    client.post('/users')
+
+    response = client.get('/users')
+    assert response.get_json() == ['primary-user', 'new-user']
+
+    # Other clients keep reading from the replica
+    assert routed_app.test_client().get('/users').get_json() == ['replica-user']
+
+def test_header_keeps_api_clients_on_primary(routed_app):
+    """Clients without cookies echo the X-Primary-Until header instead."""
+    client = routed_app.test_client(use_cookies=False)
+    primary_until = client.post('/users').headers[STICKY_HEADER]
+
+    assert client.get('/users').get_json() == ['replica-user']
+    response = client.get('/users', headers={STICKY_HEADER: primary_until})
+    assert response.get_json() == ['primary-user', 'new-user']
+    # A deadline we could not have issued is ignored
+    far_future = f'{time.time() + 3600:.3f}'
+    assert client.get('/users', headers={STICKY_HEADER: far_future}).get_json() == ['replica-user']
+
+def test_sticky_window_expires(routed_app):
+    """Once the window has passed, reads return to the replica."""
+    client = routed_app.test_client()
+    client.set_cookie(STICKY_COOKIE, f'{time.time() - 1:.3f}')
+
+    assert client.get('/users').get_json() == ['replica-user']
+
+def test_use_primary_overrides_replica(routed_app):
+    """use_primary() forces reads inside a GET handler to the primary."""
+    response = routed_app.test_client().get('/users/primary')
+    assert response.get_json() == ['primary-user']
+
+def test_one_replica_per_request(tmp_path):
+    """Every read in a request goes to the replica picked for its first read."""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS=replica_binds([f"sqlite:///{tmp_path / f'replica{i}.db'}" for i in range(3)])
+    )
+    db.init_app(app)
+    init_routing(app)
+
+    @app.route('/users')
+    def list_users():
+        reads = []
+        for _ in range(10):
+            reads.extend(u.username for u in User.query)
+            db.session.commit()  # each read in its own transaction
+        return jsonify(sorted(set(reads)))
+
+    with app.app_context():
+        for i in range(3):
+            engine = db.engines[f'replica_{i}']
+            db.metadata.create_all(engine)
+            _seed(engine, f'replica-{i}')
+
+    client = app.test_client()
+    for _ in range(5):
+        assert len(client.get('/users').get_json()) == 1
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+def test_reads_use_primary_without_replicas(tmp_path):
+    """With no replicas configured every read goes to the primary."""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'only.db'}")
+    db.init_app(app)
+    init_routing(app)
+
+    @app.route('/users')
+    def list_users():
+        return jsonify([u.username for u in User.query])
+
+    with app.app_context():
+        db.metadata.create_all(db.engine)
+        _seed(db.engine, 'primary-user')
+
+    assert app.test_client().get('/users').get_json() == ['primary-user']
@@ -0,0 +1,70 @@
+"""
+Tests for QR scan recording and hourly aggregation.
+"""
+from datetime import datetime
+import pytest
+from models import db, Memorial, QrScan, QrScanHourly
+from counters import counter_buffer
+from scans import ScanLog, aggregate, record_scan, scan_log
+
+@pytest.fixture
+def app(app):
+    """The shared app with two memorials."""
+    db.session.add_all([Memorial(title='In loving memory', name=name, user_id=app.owner_id)
+                        for name in ('Ahmed Mohammed', 'Grace Wanjiru')])
+    db.session.commit()
+    return app
+
+def test_full_buffer_drops_instead_of_blocking():
+    """Scans beyond capacity are refused, never queued behind the database."""
+    log = ScanLog(capacity=2)
+    assert log.record(1) and log.record(1)
+    assert log.record(1) is False
+    assert len(log) == 2
+
+def test_dropped_scan_is_not_counted_as_a_view(app, monkeypatch):
+    """The memorial's view count only includes scans that were recorded."""
+    monkeypatch.setattr(scan_log, 'capacity', len(scan_log) + 1)
+    counter_buffer.reset()
+    try:
+        assert record_scan(1) is True
+        assert record_scan(1) is False
+        assert counter_buffer.take()[1]['qr_view_count'] == 1
+    finally:
+        counter_buffer.reset()
+        scan_log.flush(db.engine)
+
+def test_scans_are_rolled_up_into_hourly_buckets(app):
+    """Staged scans become per-memorial hourly counts and leave the staging table."""
+    log = ScanLog()
+    for minute in (1, 30, 59):
+        log.record(1, datetime(2024, 5, 1, 10, minute))
+    log.record(1, datetime(2024, 5, 1, 11, 5))
+    log.record(2, datetime(2024, 5, 1, 10, 15))
+    log.record(999, datetime(2024, 5, 1, 10, 15))  # unknown memorial
+    assert log.flush(db.engine) == 6
+    assert len(log) == 0
+
+    assert aggregate(db.engine) == 6
+    log.record(1, datetime(2024, 5, 1, 10, 45))
+    log.flush(db.engine)
+    assert aggregate(db.engine) == 1
+    assert aggregate(db.engine) == 0
+
+    assert QrScan.query.count() == 0
+    buckets = {(b.memorial_id, b.hour.hour): b.scans for b in QrScanHourly.query}
+    assert buckets == {(1, 10): 4, (1, 11): 1, (2, 10): 1}
+
+def test_failed_write_keeps_scans(app):
+    """Scans survive a failed write and go out with the next flush."""
+    log = ScanLog()
+    log.record(1)
+
+    class BrokenEngine:
+        def begin(self):
+            raise RuntimeError('database unavailable')
+
+    with pytest.raises(RuntimeError):
+        log.flush(BrokenEngine())
+    log.record(2)
+    assert log.flush(db.engine) == 2
@@ -0,0 +1,113 @@
+"""
+Tests for full-text search.
+
+Every test runs against SQLite, which uses the FTS5 tables and triggers
+declared in models.py, and against PostgreSQL's tsvector columns when
+TEST_DATABASE_URL points at a PostgreSQL server.
+"""
+import pytest
+import search as search_module
+from models import db, User, Memorial, Memory
+from search import search
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def backend(request):
+    """The database the module's ``app`` runs on."""
+    if request.param == 'postgresql':
+        request.getfixturevalue('postgres_app')
+    return request.param
+
+@pytest.fixture
+def app(backend, app):
+    """The shared app with a few memorials and memories indexed for search."""
+    teacher = Memorial(title='In loving memory', name='Ahmed Mohammed', user_id=app.owner_id,
+                       biography='A devoted teacher and father who loved gardening')
+    gardener = Memorial(title='Gardening teacher', name='Grace Wanjiru', user_id=app.owner_id,
+                        biography='She taught <b>everyone</b> to grow roses')
+    arabic = Memorial(title='Remembering', name='أحمد محمد', user_id=app.owner_id,
+                      biography='معلم محبوب', religion='muslim')
+    private = Memorial(title='Private', name='Hidden Teacher', user_id=app.owner_id,
+                       biography='A teacher', is_public=False)
+    shared = Memory(title='Garden days', content='We spent summers gardening together')
+    secret = Memory(title='Secret garden', content='Only family knew about the gardening')
+    teacher.memories.append(shared)
+    private.memories.append(secret)
+    db.session.add_all([teacher, gardener, arabic, private])
+    db.session.commit()
+    return app
+
+def test_ranks_title_matches_above_biography(app):
+    """A match in a higher-weighted column ranks first."""
+    results = search('memorial', 'teacher')
+    assert [r['name'] for r in results] == ['Grace Wanjiru', 'Ahmed Mohammed']
+    assert results[0]['rank'] > results[1]['rank']
+
+def test_snippet_highlights_and_escapes(backend, app):
+    """Snippets wrap matches in <mark> and never pass stored HTML through as
+    markup: SQLite escapes it, ts_headline drops the tags."""
+    [result] = search('memorial', 'roses')
+    assert '<mark>roses</mark>' in result['snippet']
+    assert '<b>' not in result['snippet'] and 'everyone' in result['snippet']
+    if backend == 'sqlite':
+        assert '&lt;b&gt;everyone&lt;/b&gt;' in result['snippet']
+
+def test_prefix_and_arabic_queries(app):
+    """Words match as prefixes, and Arabic names are searchable."""
+    assert [r['name'] for r in search('memorial', 'garden')] == ['Grace Wanjiru', 'Ahmed Mohammed']
+    assert [r['name'] for r in search('memorial', 'أحمد')] == ['أحمد محمد']
+
+def test_private_memorials_and_their_memories_are_excluded(app):
+    """Only public memorials, and memories attached to them, are returned."""
+    assert 'Hidden Teacher' not in [r['name'] for r in search('memorial', 'teacher')]
+    assert [r['title'] for r in search('memory', 'gardening')] == ['Garden days']
+
+def test_index_follows_updates_and_deletes(app):
+    """The FTS triggers keep the index in step with the memorial table."""
+    memorial = Memorial.query.filter_by(name='Ahmed Mohammed').one()
+    memorial.biography = 'A celebrated painter'
+    db.session.commit()
+    assert [r['name'] for r in search('memorial', 'painter')] == ['Ahmed Mohammed']
+    assert [r['name'] for r in search('memorial', 'father')] == []
+
+    db.session.delete(Memorial.query.filter_by(name='Grace Wanjiru').one())
+    db.session.commit()
+    assert search('memorial', 'roses') == []
+
+def test_query_without_words_returns_nothing(app):
+    """Punctuation-only input does not reach FTS5 as a syntax error."""
+    assert search('memorial', '"*()') == []
+
+def test_search_endpoint_reads_the_query_string(client):
+    """GET /api/v1/search takes its parameters from the URL, with no JSON body."""
+    owner = User(username='owner', email='owner@example.com', password_hash='x')
+    owner.memorials.append(Memorial(title='Gardening teacher', name='Grace Wanjiru',
+                                    biography='She taught everyone to grow roses'))
+    db.session.add(owner)
+    db.session.commit()
+
+    response = client.get('/api/v1/search?q=roses&type=memorials&limit=5')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert [r['name'] for r in data['memorials']] == ['Grace Wanjiru']
+    assert 'memories' not in data
+    assert client.get('/api/v1/search').status_code == 400
+    assert client.get('/api/v1/search?q=roses&type=people').status_code == 400
+
+def test_postgres_ranks_up_to_max_candidates(backend, app, monkeypatch):
+    """The best match is found however many weaker matches were stored before
+    it, as long as there are no more than MAX_CANDIDATES; beyond that the
+    results stop."""
+    if backend != 'postgresql':
+        pytest.skip('candidates are only capped on PostgreSQL')
+    db.session.add_all([Memorial(title='Remembering', name=f'Person {i}', user_id=app.owner_id,
+                                 biography='A teacher') for i in range(1500)])
+    db.session.add(Memorial(title='Teacher', name='Best Teacher', user_id=app.owner_id,
+                            biography='A teacher'))
+    db.session.commit()
+    results = search('memorial', 'teacher', limit=3)
+    assert results[0]['name'] == 'Best Teacher'
+    assert '<mark>teacher</mark>' in results[0]['snippet']
+    assert len(search('memorial', 'teacher', limit=20, offset=1490)) == 13  # with the two seeded
+    monkeypatch.setattr(search_module, 'MAX_CANDIDATES', 100)
+    assert search('memorial', 'teacher', limit=20)
+    assert search('memorial', 'teacher', limit=20, offset=100) == []
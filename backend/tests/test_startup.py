@@ -0,0 +1,72 @@
+"""
+Tests for application startup cost.
+"""
+import os
+import sys
+import json
+import importlib
+import subprocess
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from models import db
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_importing_the_app_builds_nothing_and_defers_heavy_modules():
+    """``import app`` only defines the factory; endpoint-only libraries load on first use."""
+    benchmark = importlib.import_module('scripts.benchmark_startup')
+    statement = ("import sys, json, app; print(json.dumps({'built': hasattr(app, 'app'), "
+                 f"'eager': [m for m in {benchmark.LAZY_MODULES!r} if m in sys.modules]}}))")
+    result = subprocess.run([sys.executable, '-c', statement], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == {'built': False, 'eager': []}
+
+def test_importtime_output_is_parsed():
+    """Header lines are skipped; self and cumulative times are read per module."""
+    benchmark = importlib.import_module('scripts.benchmark_startup')
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   _io\n"
+              "import time:      2048 |      30511 | flask\n"
+              "Traceback (most recent call last):\n")
+    assert benchmark.parse_importtime(stderr) == [(120, 120, '_io'), (2048, 30511, 'flask')]
+
+def test_schema_gate_refuses_stale_databases(tmp_path):
+    """Serving stops unless alembic_version matches the migration head; warn mode only logs."""
+    from database import check_schema, migration_heads, SchemaOutOfDate
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'schema.db'}", SCHEMA_CHECK='strict')
+    db.init_app(app)
+    with pytest.raises(SchemaOutOfDate, match='no revision'):
+        check_schema(app)
+
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)'))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('a1f3c9d2e7b4')"))
+    with pytest.raises(SchemaOutOfDate, match='a1f3c9d2e7b4'):
+        check_schema(app)
+    app.config['SCHEMA_CHECK'] = 'warn'
+    assert check_schema(app) == {'a1f3c9d2e7b4'}
+
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(text('UPDATE alembic_version SET version_num = :head'),
+                     {'head': migration_heads().pop()})
+    app.config['SCHEMA_CHECK'] = 'strict'
+    assert check_schema(app) == migration_heads()
+
+def test_migrations_build_an_empty_database(tmp_path):
+    """``flask db upgrade`` on an empty database creates the models' schema and passes the gate."""
+    from flask_migrate import Migrate, upgrade
+    from alembic.autogenerate import compare_metadata
+    from alembic.runtime.migration import MigrationContext
+    from database import check_schema, migration_heads, MIGRATIONS_DIR
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'migrated.db'}", SCHEMA_CHECK='strict')
+    db.init_app(app)
+    Migrate(app, db, directory=MIGRATIONS_DIR)
+    with app.app_context():
+        upgrade()
+        with db.engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), db.metadata) == []
+    assert check_schema(app) == migration_heads()
+
@@ -0,0 +1,108 @@
+"""
+Tests for request tracing.
+"""
+import queue
+import threading
+import contextvars
+import pytest
+from flask import Flask
+from monitoring.tracing import Tracer, _parse_traceparent, _current_span, SPAN_KIND_SERVER
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+class CollectingExporter:
+    def __init__(self):
+        self.payloads = queue.Queue()
+
+    def export(self, payload):
+        self.payloads.put(payload)
+
+    def spans(self, timeout=5):
+        payload = self.payloads.get(timeout=timeout)
+        return payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+@pytest.fixture
+def traced(tmp_path):
+    """A tracer and an app with one endpoint that opens a child span."""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, TRACING_ENABLED=True, TRACING_FILE=str(tmp_path / 'traces.jsonl'))
+    tracer = Tracer()
+    tracer.init_app(app)
+    tracer.exporter = CollectingExporter()
+
+    @app.route('/memorials/<int:memorial_id>')
+    def memorial(memorial_id):
+        with tracer.span('render', memorial_id=memorial_id):
+            return 'ok'
+
+    return tracer, app.test_client()
+
+def test_traceparent_parsing():
+    assert _parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01') == (TRACE_ID, PARENT_ID, True)
+    assert _parse_traceparent(f'00-{TRACE_ID.upper()}-{PARENT_ID}-00') == (TRACE_ID, PARENT_ID, False)
+    for invalid in (None, '', 'garbage', f'00-{"0" * 32}-{PARENT_ID}-01', f'00-{TRACE_ID}-{PARENT_ID}-zz',
+                    f'ff-{TRACE_ID}-{PARENT_ID}-01', f'00-{TRACE_ID}-{PARENT_ID}-01-extra'):
+        assert _parse_traceparent(invalid) == (None, None, False)
+
+def test_request_trace_is_exported_with_the_callers_parent(traced):
+    tracer, client = traced
+    response = client.get('/memorials/7', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+    assert response.headers['traceparent'].startswith(f'00-{TRACE_ID}-')
+
+    child, server = tracer.exporter.spans()
+    assert server['kind'] == SPAN_KIND_SERVER and server['parentSpanId'] == PARENT_ID
+    assert child['name'] == 'render' and child['parentSpanId'] == server['spanId']
+    assert {child['traceId'], server['traceId']} == {TRACE_ID}
+
+def test_traces_are_dropped_while_the_exporter_is_stuck(traced):
+    """A stalled collector costs at most TRACING_QUEUE_SIZE queued traces."""
+    tracer, client = traced
+    tracer._queue = queue.Queue(maxsize=2)
+    exporting, release = threading.Event(), threading.Event()
+
+    class StuckExporter:
+        def export(self, payload):
+            exporting.set()
+            release.wait(5)
+
+    tracer.exporter = StuckExporter()
+    headers = {'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'}
+    client.get('/memorials/1', headers=headers)
+    assert exporting.wait(5)  # the exporter holds the first trace
+    for memorial_id in range(2, 7):
+        client.get(f'/memorials/{memorial_id}', headers=headers)
+    release.set()
+    assert tracer.dropped == 3
+
+def test_unsampled_traceparent_is_respected(traced):
+    tracer, client = traced
+    response = client.get('/memorials/7', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-00'})
+    assert 'traceparent' not in response.headers
+    assert tracer.exporter.payloads.empty()
+
+def test_spans_ending_after_the_root_are_dropped(traced):
+    """A late child does not touch the spans already handed to the exporter."""
+    tracer = traced[0]
+
+    def scenario():
+        root = tracer.start_span('job', trace_id=TRACE_ID)
+        background = contextvars.copy_context()
+        child = background.run(tracer.start_span, 'background')
+        tracer.end_span(root)  # the root finishes without waiting for the child
+        exported = tracer.exporter.spans()
+        background.run(tracer.end_span, child)
+        assert [s['name'] for s in exported] == ['job']
+        assert root.trace.late == 1
+    contextvars.Context().run(scenario)
+
+def test_ending_a_span_from_another_context_keeps_its_current_span(traced):
+    tracer = traced[0]
+
+    def scenario():
+        root = tracer.start_span('job', trace_id=TRACE_ID)
+        other = contextvars.copy_context()  # its current span is ``root``
+        child = tracer.start_span('query')
+        other.run(tracer.end_span, child)
+        assert other.run(_current_span.get) is root
+    contextvars.Context().run(scenario)
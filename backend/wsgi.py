@@ -2,12 +2,16 @@
 WSGI config for the Gate of Memory application.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+The app is built here, once per process; with ``preload_app`` (see
+gunicorn.conf.py) that process is the Gunicorn master and workers inherit it,
+so the schema check below runs once per deployment, not once per worker.
 """
-import os
 from app import create_app
+from database import check_schema
 
-# Create the Flask application
+# Create the Flask application, and refuse to start on a stale schema
 application = create_app('production')
+check_schema(application)
 
 if __name__ == "__main__":
     application.run()